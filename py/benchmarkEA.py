@@ -0,0 +1,278 @@
+#
+# Name: benchmarkEA.py
+#
+# Purpose: To measure how postProcessEA.py scales with the size of the EA schema.
+#
+# Synthetic EA schemas of the requested sizes (in elements) are generated, each with
+# a matching configuration file. They carry the cruft cleanUpTree() removes: elements
+# with empty names, 'Type' and 'PropertyType' complexTypes, gml:AbstractMemberType
+# extensions, gml:AbstractFeature substitution groups and gml:defaultCodeSpace
+# elements. Each stage of the post-processing is timed, with each tree backend, and the
+# time per element and the growth exponent between successive sizes are reported. Given
+# the JSON report of an earlier run, stages that have become slower are flagged.
+#
+# Examples:
+#
+#   python benchmarkEA.py --sizes 1000 10000 100000 --json bench.json
+#   python benchmarkEA.py --baseline bench.json
+#   python benchmarkEA.py --generate ../EA --sizes 50000
+#
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+
+import compileRules as cr
+import postProcessEA as pea
+import profileEA as pr
+import treeBackend as tb
+
+STAGES = ['parseAndGetNameSpaces', 'fixImports', 'cleanUpTree', 'applyRules', 'addendums',
+          'serializeTree', 'xmlpp.pprint']
+CLEANUP_STAGES = ['findCruft', 'removeAbstractMemberTypes', 'removeGMLAbstractFeatures',
+                  'pruneEmptyElements']
+#
+# Elements written per block of generateEASchema()
+BLOCK_SIZE = 35
+
+HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" xmlns:gml="http://www.opengis.net/gml/3.2" xmlns:iwxxm-us="http://nws.weather.gov/schemas/IWXXM-US/3.0" targetNamespace="http://nws.weather.gov/schemas/IWXXM-US/3.0" elementFormDefault="qualified" version="3.0">
+\t<xs:annotation>
+\t\t<xs:documentation>Synthetic EA schema of {size} elements</xs:documentation>
+\t</xs:annotation>
+\t<xs:import namespace="http://www.opengis.net/gml/3.2"/>
+\t<xs:import namespace="http://www.opengis.net/gml/3.2"/>
+'''
+
+BLOCK = '''\t<xs:element name="Feature{i}" type="iwxxm-us:Feature{i}Type" substitutionGroup="gml:AbstractFeature"/>
+\t<xs:complexType name="Feature{i}Type">
+\t\t<xs:complexContent>
+\t\t\t<xs:extension base="gml:AbstractFeatureType">
+\t\t\t\t<xs:sequence>
+\t\t\t\t\t<xs:element name="code{c}" type="gml:CodeType">
+\t\t\t\t\t\t<xs:annotation>
+\t\t\t\t\t\t\t<xs:appinfo>
+\t\t\t\t\t\t\t\t<vocabulary>http://codes.example.org/code{c}</vocabulary>
+\t\t\t\t\t\t\t</xs:appinfo>
+\t\t\t\t\t\t</xs:annotation>
+\t\t\t\t\t\t<gml:defaultCodeSpace>http://codes.example.org</gml:defaultCodeSpace>
+\t\t\t\t\t</xs:element>
+\t\t\t\t\t<xs:element name="value{i}" type="DataType{r}"/>
+\t\t\t\t\t<xs:element name="nil{r}" type="xs:string"/>
+\t\t\t\t\t<xs:element name="" type="iwxxm-us:Type"/>
+\t\t\t\t\t<xs:element name="member{i}">
+\t\t\t\t\t\t<xs:complexType>
+\t\t\t\t\t\t\t<xs:complexContent>
+\t\t\t\t\t\t\t\t<xs:extension base="gml:AbstractMemberType">
+\t\t\t\t\t\t\t\t\t<xs:sequence>
+\t\t\t\t\t\t\t\t\t\t<xs:element ref="iwxxm-us:Part{i}"/>
+\t\t\t\t\t\t\t\t\t</xs:sequence>
+\t\t\t\t\t\t\t\t</xs:extension>
+\t\t\t\t\t\t\t</xs:complexContent>
+\t\t\t\t\t\t</xs:complexType>
+\t\t\t\t\t</xs:element>
+\t\t\t\t\t<xs:annotation>
+\t\t\t\t\t\t<xs:documentation>
+\t\t\t\t\t\t</xs:documentation>
+\t\t\t\t\t</xs:annotation>
+\t\t\t\t</xs:sequence>
+\t\t\t\t<xs:attribute name="flag{r}" type="xs:boolean"/>
+\t\t\t</xs:extension>
+\t\t</xs:complexContent>
+\t</xs:complexType>
+\t<xs:complexType name="Type">
+\t\t<xs:sequence/>
+\t</xs:complexType>
+\t<xs:complexType name="PropertyType">
+\t\t<xs:sequence>
+\t\t\t<xs:element ref="gml:AbstractObject"/>
+\t\t</xs:sequence>
+\t</xs:complexType>
+\t<xs:element name="Part{i}" type="iwxxm-us:Part{i}Type" substitutionGroup="Group{r}"/>
+\t<xs:complexType name="Part{i}Type">
+\t\t<xs:complexContent>
+\t\t\t<xs:extension base="Base{r}">
+\t\t\t\t<xs:sequence>
+\t\t\t\t\t<xs:element name="measure" type="gml:MeasureType"/>
+\t\t\t\t</xs:sequence>
+\t\t\t</xs:extension>
+\t\t</xs:complexContent>
+\t</xs:complexType>
+'''
+
+def generateEASchema(fname, size, rules=100):
+    #
+    # Writes an EA-style schema of about 'size' elements; block i refers to rule i % rules.
+    with open(fname, 'w') as fh:
+        fh.write(HEADER.format(size=size))
+        for i in range(max(1, size // BLOCK_SIZE)):
+            fh.write(BLOCK.format(i=i, c=i % rules, r=i % rules))
+        fh.write('</xs:schema>\n')
+
+def generateConfig(fname, name, rules=100):
+    #
+    # Writes a configuration file with 'rules' entries in each rule section, a tenth of them
+    # matching nothing in the schema.
+    matched = rules - rules // 10
+    lines = ['[location]', 'EADirectory=EA', 'ReleaseDirectory=schemas', '',
+             '[schema]', 'defaultNamespace=http://www.w3.org/2001/XMLSchema', 'name=%s' % name, '',
+             '[imports]', 'gml=http://www.opengis.net/gml/3.2 http://schemas.opengis.net/gml/3.2.1/gml.xsd', '',
+             '[dataTypes]']
+    lines.extend('dataType%d=DataType%d iwxxm-us:Data%dPropertyType' % (r, r if r < matched else r + rules, r)
+                 for r in range(rules))
+    lines.extend(['', '[codeLists]'])
+    lines.extend('code%d=iwxxm-us:Code%dType' % (r if r < matched else r + rules, r) for r in range(rules))
+    lines.extend(['', '[substitutionGroups]'])
+    lines.extend('Group%d=iwxxm-us:NewGroup%d' % (r if r < matched else r + rules, r)
+                 for r in range(rules))
+    lines.extend(['', '[baseExtensions]'])
+    lines.extend('Base%d=gml:Base%dType' % (r if r < matched else r + rules, r) for r in range(rules))
+    lines.extend(['', '[setNilAttribute]',
+                  'names=%s' % ','.join('nil%d' % (r if r < matched else r + rules) for r in range(rules)),
+                  '', '[attributeDocStrings]'])
+    lines.extend('flag%d=Documentation of flag %d.' % (r if r < matched else r + rules, r) for r in range(rules))
+    lines.extend(['', '[adjustments]', 'number=%d' % rules])
+    for r in range(rules):
+        lines.extend(['', '[adjustment%d' % r + ']', 'kind=name',
+                      'value=value%d' % (r if r < matched else -r), 'attributes=minOccurs', 'values=0'])
+    lines.extend(['', '[addendums]', 'number=1', '', '[addendum0]',
+                  'code=root.set(\'version\', \'3.0.1\')', ''])
+
+    with open(fname, 'w') as fh:
+        fh.write('\n'.join(lines))
+
+def timeStages(EASchemaFile, plan, backend=tb.ETREE):
+    #
+    # Runs postProcessEA's stages as main() does; returns {stage: seconds}, with the whole
+    # run as 'total'. The stages within cleanUpTree are included.
+    profiler = pr.Profiler(elements=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        with profiler.product(EASchemaFile):
+            pea.processSchema(plan, EASchemaFile, profiler, backend)
+
+    record = profiler.products[EASchemaFile]
+    times = dict((stage['name'], stage['wall']) for stage in record['stages'])
+    times['total'] = record['wall']
+
+    return times
+
+def runBenchmark(sizes, rules=100, repeat=1, backends=['etree']):
+
+    report = {'rules': rules, 'results': []}
+    tmpdir = tempfile.mkdtemp(prefix='benchmarkEA')
+    try:
+        cfgfile = os.path.join(tmpdir, 'benchmark.cfg')
+        generateConfig(cfgfile, 'benchmark.xsd', rules)
+        plan = cr.compileConfig(cr.readConfig(cfgfile), cfgfile)
+
+        for size in sizes:
+            EASchemaFile = os.path.join(tmpdir, 'benchmark%d.xsd' % size)
+            generateEASchema(EASchemaFile, size, rules)
+            elements = sum(1 for event, element in ET.iterparse(EASchemaFile))
+            for backend in backends:
+                best = {}
+                for attempt in range(max(1, repeat)):
+                    for stage, seconds in timeStages(EASchemaFile, plan, tb.BACKENDS[backend]).items():
+                        best[stage] = min(best.get(stage, seconds), seconds)
+
+                report['results'].append({'size': size, 'elements': elements, 'backend': backend,
+                                          'times': best})
+            os.remove(EASchemaFile)
+
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return report
+
+def printReport(report, output=sys.stdout):
+    #
+    # For each backend, milliseconds per stage, microseconds per element and, from the second
+    # size on, the exponent k of time ~ elements**k since the previous size. With more than one
+    # backend, their total times are compared to the first one's.
+    backends = []
+    for r in report['results']:
+        if r['backend'] not in backends:
+            backends.append(r['backend'])
+
+    for backend in backends:
+        results = [r for r in report['results'] if r['backend'] == backend]
+        output.write('\n%-28s' % ('[%s]' % backend) +
+                     ''.join('%32s' % ('%d elements' % r['elements']) for r in results) + '\n')
+        stages = STAGES[:3] + ['  %s' % stage for stage in CLEANUP_STAGES] + STAGES[3:] + ['total']
+        for stage in stages:
+            line = '%-28s' % stage
+            stage = stage.strip()
+            previous = None
+            for r in results:
+                t = r['times'].get(stage, 0.0)
+                cell = '%.1f ms %.2f us/el' % (1000 * t, 1e6 * t / r['elements'])
+                if previous is not None and previous[1] > 0 and t > 0 and r['elements'] != previous[0]:
+                    cell += ' k=%.2f' % (math.log(t / previous[1]) / math.log(r['elements'] / previous[0]))
+                line += '%32s' % cell
+                previous = (r['elements'], t)
+            output.write(line + '\n')
+
+    first = dict((r['size'], r['times']['total']) for r in report['results'] if r['backend'] == backends[0])
+    for backend in backends[1:]:
+        output.write('\n%s/%s total time:' % (backend, backends[0]) +
+                     ''.join(' %.2f (%d)' % (r['times']['total'] / first[r['size']], r['size'])
+                             for r in report['results'] if r['backend'] == backend) + '\n')
+
+def compareReports(report, baseline, tolerance=1.5, floor=0.005):
+    #
+    # Stages, at sizes and backends present in both reports, that take more than 'tolerance'
+    # times as long as in the baseline. Times under 'floor' seconds are too noisy to judge.
+    before = dict(((r.get('backend', 'etree'), r['size']), r['times']) for r in baseline['results'])
+    regressions = []
+    for r in report['results']:
+        for stage, t in r['times'].items():
+            old = before.get((r['backend'], r['size']), {}).get(stage)
+            if old is not None and t > floor and t > tolerance * old:
+                regressions.append((r['backend'], r['size'], stage, old, t))
+
+    return regressions
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark postProcessEA.py on synthetic EA schemas.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 4000, 16000, 64000],
+                        help='schema sizes in elements (default: 1000 4000 16000 64000)')
+    parser.add_argument('--rules', type=int, default=100,
+                        help='entries in each rule section of the configuration (default: 100)')
+    parser.add_argument('--backends', nargs='+', choices=sorted(tb.BACKENDS), default=['etree', 'lxml'],
+                        help='tree backends to compare (default: etree lxml)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per size; the fastest counts')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--baseline', help='report of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='slow-down factor over the baseline that counts as a regression (default: 1.5)')
+    parser.add_argument('--generate', metavar='DIR',
+                        help='only write benchmark<size>.xsd and benchmark.cfg into DIR')
+    args = parser.parse_args()
+
+    if args.generate:
+        generateConfig(os.path.join(args.generate, 'benchmark.cfg'), 'benchmark.xsd', args.rules)
+        for size in args.sizes:
+            generateEASchema(os.path.join(args.generate, 'benchmark%d.xsd' % size), size, args.rules)
+        sys.exit(0)
+
+    report = runBenchmark(args.sizes, args.rules, args.repeat, args.backends)
+    printReport(report)
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(report, fh, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compareReports(report, json.load(fh), args.tolerance)
+        for backend, size, stage, old, new in regressions:
+            print('Regression: %s (%s) at %d elements took %.1f ms, was %.1f ms' %
+                  (stage, backend, size, 1000 * new, 1000 * old))
+        sys.exit(1 if regressions else 0)
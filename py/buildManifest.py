@@ -0,0 +1,99 @@
+#
+# Name: buildManifest.py
+#
+# Purpose: To record, for each schema written to the release directory, content hashes
+#          of everything it was built from, so that up-to-date schemas need not be
+#          post-processed again.
+#
+# The manifest is a JSON file in the release directory:
+#
+#   {"version": 1,
+#    "products": {"taf.xsd": {"schema": <hash of EA schema>,
+#                             "config": <hash of configuration>,
+#                             "code": <hash of post-processing code>,
+#                             "includes": {"common.xsd": <hash of released common.xsd>},
+#                             "output": <hash of released taf.xsd>}}}
+#
+import hashlib
+import json
+import os
+
+MANIFEST = '.manifest.json'
+VERSION = 1
+
+def dataDigest(data):
+
+    return hashlib.sha256(data).hexdigest()
+
+def fileDigest(fname):
+    #
+    # None for a file that does not exist
+    try:
+        with open(fname,'rb') as fh:
+            return dataDigest(fh.read())
+
+    except (IOError, OSError):
+        return None
+
+def filesDigest(fnames):
+
+    digest = hashlib.sha256()
+    for fname in fnames:
+        with open(fname,'rb') as fh:
+            digest.update(dataDigest(fh.read()).encode('ascii'))
+
+    return digest.hexdigest()
+
+def configDigest(config,omit=()):
+    #
+    # Hash of the configuration's content, independent of comments and layout, less the
+    # sections in 'omit'
+    content = [(section, sorted(config.items(section, raw=True))) for section in config.sections()
+               if section not in omit]
+    return dataDigest(json.dumps(content).encode('UTF-8'))
+
+def readManifest(manifestFile):
+
+    try:
+        with open(manifestFile) as fh:
+            manifest = json.load(fh)
+
+    except (IOError, OSError, ValueError):
+        return {}
+
+    if manifest.get('version') != VERSION:
+        return {}
+
+    return manifest.get('products',{})
+
+def isUpToDate(manifestFile,name,inputs,outputfile):
+    #
+    # A schema is up to date when it was built from the same inputs and nobody has touched
+    # the released file since.
+    try:
+        record = readManifest(manifestFile)[name]
+
+    except KeyError:
+        return False
+
+    for key, value in inputs.items():
+        if record.get(key) != value:
+            return False
+
+    return record.get('output') is not None and record.get('output') == fileDigest(outputfile)
+
+def updateManifest(manifestFile,records):
+    #
+    # Merge the new records into the manifest, replacing it atomically.
+    products = readManifest(manifestFile)
+    products.update(records)
+
+    tmpfile = '%s.%d.tmp' % (manifestFile,os.getpid())
+    try:
+        with open(tmpfile,'w') as fh:
+            json.dump({'version': VERSION, 'products': products}, fh, indent=1, sort_keys=True)
+        os.replace(tmpfile,manifestFile)
+
+    finally:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
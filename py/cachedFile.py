@@ -0,0 +1,63 @@
+#
+# Name: cachedFile.py
+#
+# Purpose: To keep what is made from a file -- a configuration file's rule plan, the XMI
+#          export's index -- in the __pycache__ directory next to it, so that it is only
+#          made again when the file changes.
+#
+# The cache is marshalled, with the file's modification time and size and the hash of its
+# content. It is used if the file has the same modification time and size as when it was
+# made or, failing that, the same content, and if it was made by the same Python and the
+# same version of what it holds.
+#
+import hashlib
+import importlib.util
+import marshal
+import os
+
+def cachePath(sourceFile, extension):
+    #
+    # e.g. py/__pycache__/taf.cfg.plan for py/taf.cfg
+    directory, name = os.path.split(os.path.abspath(sourceFile))
+    return os.path.join(directory, '__pycache__', '%s.%s' % (name, extension))
+
+def loadCached(sourceFile, cacheFile, version, build):
+    #
+    # Returns what build(sourceFile) returns, from the cache if it is up to date
+    stat = os.stat(sourceFile)
+    stamp = [importlib.util.MAGIC_NUMBER, version, stat.st_mtime_ns, stat.st_size]
+    cached = None
+    try:
+        with open(cacheFile, 'rb') as fh:
+            cached = marshal.load(fh)
+        if cached['stamp'] == stamp:
+            return cached['value']
+
+    except (IOError, OSError, EOFError, ValueError, TypeError, KeyError):
+        cached = None
+
+    with open(sourceFile, 'rb') as fh:
+        sha = hashlib.sha256(fh.read()).hexdigest()
+
+    if cached is not None and cached.get('sha') == sha and cached['stamp'][:2] == stamp[:2]:
+        value = cached['value']
+    else:
+        value = build(sourceFile)
+    #
+    # Cache it; not being able to is no reason to fail.
+    tmpfile = '%s.%d.tmp' % (cacheFile, os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(cacheFile)):
+            os.makedirs(os.path.dirname(cacheFile), exist_ok=True)
+        with open(tmpfile, 'wb') as fh:
+            marshal.dump({'stamp': stamp, 'sha': sha, 'value': value}, fh)
+        os.replace(tmpfile, cacheFile)
+
+    except (IOError, OSError):
+        pass
+
+    finally:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
+    return value
@@ -0,0 +1,250 @@
+#
+# Purpose: To verify that the code registers referred to by <vocabulary> elements in
+#          the EA schemas are reachable.
+#
+# The URLs of all selected schemas are collected and checked once each, several at a
+# time. Each worker thread keeps one connection per host open for reuse. The proxies in
+# the http_proxy, https_proxy and no_proxy environment variables are used, as urlopen()
+# would: an https register is reached through a CONNECT tunnel. Reachable registers are
+# remembered in a cache file for a day, so that subsequent runs, or runs without internet
+# access ('offline'), need not ask again.
+#
+import base64
+import concurrent.futures
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+
+DEFAULT_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.vocabularyCache.json')
+DEFAULT_TTL = 86400
+REDIRECTS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+
+def getVocabularies(schemaFiles):
+    #
+    # Vocabulary URLs in the schemas, without duplicates, in order of first appearance
+    urls = {}
+    for schemaFile in schemaFiles:
+        tree = ET.parse(schemaFile)
+        for element in tree.findall('.//vocabulary'):
+            if element.text is not None and element.text.strip() != '':
+                urls.setdefault(element.text.strip(), schemaFile)
+
+    return list(urls)
+
+class ConnectionPool:
+    #
+    # One open connection per (scheme, host, port) for each thread. 'proxies' are as
+    # urllib.request.getproxies() returns them, by default from the environment.
+    def __init__(self, timeout, proxies=None):
+
+        self.timeout = timeout
+        self.proxies = urllib.request.getproxies() if proxies is None else proxies
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.opened = []
+
+    def proxy(self, scheme, netloc):
+        #
+        # The proxy's URL parts for the register, or None if it is reached directly
+        proxy = self.proxies.get(scheme)
+        if not proxy or urllib.request.proxy_bypass_environment(netloc, self.proxies):
+            return None
+
+        return urllib.parse.urlsplit(proxy if '//' in proxy else '//%s' % proxy)
+
+    def get(self, scheme, netloc):
+        #
+        # Returns the connection, what goes before the path in the request line and the
+        # headers to send: through a proxy, plain http requests give the whole URL.
+        connections = self.local.__dict__.setdefault('connections', {})
+        try:
+            return connections[(scheme, netloc)]
+        except KeyError:
+            pass
+
+        proxy = self.proxy(scheme, netloc)
+        headers = {}
+        if proxy is not None and proxy.username is not None:
+            credentials = '%s:%s' % (urllib.parse.unquote(proxy.username),
+                                     urllib.parse.unquote(proxy.password or ''))
+            headers['Proxy-Authorization'] = 'Basic %s' % base64.b64encode(credentials.encode('UTF-8')).decode()
+
+        host = netloc if proxy is None else '%s:%d' % (proxy.hostname, proxy.port or 80)
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(host, timeout=self.timeout)
+            if proxy is not None:
+                connection.set_tunnel(netloc, headers=headers)
+            entry = connection, '', {}
+        else:
+            connection = http.client.HTTPConnection(host, timeout=self.timeout)
+            entry = (connection, '', {}) if proxy is None else (connection, 'http://%s' % netloc, headers)
+
+        connections[(scheme, netloc)] = entry
+        with self.lock:
+            self.opened.append(connection)
+        return entry
+
+    def discard(self, scheme, netloc):
+
+        entry = self.local.__dict__.get('connections', {}).pop((scheme, netloc), None)
+        if entry is not None:
+            entry[0].close()
+
+    def close(self):
+        #
+        # Once the worker threads are done, close every connection they opened.
+        with self.lock:
+            for connection in self.opened:
+                connection.close()
+            self.opened = []
+
+def checkURL(url, pool):
+    #
+    # Returns the final HTTP status, following redirects, and an error message if the
+    # register could not be reached at all.
+    for redirect in range(MAX_REDIRECTS + 1):
+
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            return None, 'unsupported URL scheme'
+
+        path = urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+        #
+        # A kept-alive connection may have been closed by the server in the meantime; try
+        # once more with a new one.
+        for attempt in range(2):
+            connection, prefix, headers = pool.get(parts.scheme, parts.netloc)
+            try:
+                connection.request('GET', prefix + path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                break
+
+            except (http.client.HTTPException, ConnectionError) as err_msg:
+                pool.discard(parts.scheme, parts.netloc)
+                if attempt:
+                    return None, str(err_msg) or err_msg.__class__.__name__
+
+            except OSError as err_msg:
+                pool.discard(parts.scheme, parts.netloc)
+                return None, str(err_msg) or err_msg.__class__.__name__
+
+        if response.will_close:
+            pool.discard(parts.scheme, parts.netloc)
+
+        location = response.getheader('Location')
+        if response.status not in REDIRECTS or location is None:
+            return response.status, None
+
+        url = urllib.parse.urljoin(url, location)
+
+    return response.status, 'too many redirects'
+
+def readCache(cacheFile):
+
+    try:
+        with open(cacheFile) as fh:
+            return json.load(fh)
+
+    except (OSError, ValueError):
+        return {}
+
+def writeCache(cacheFile, cache):
+
+    tmpfile = '{}.{}.tmp'.format(cacheFile, os.getpid())
+    try:
+        with open(tmpfile, 'w') as fh:
+            json.dump(cache, fh, indent=1, sort_keys=True)
+        os.replace(tmpfile, cacheFile)
+
+    except OSError as err_msg:
+        print('Vocabulary cache not saved: {}'.format(err_msg))
+
+    finally:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
+def checkVocabularies(urls, jobs=8, timeout=10, cacheFile=DEFAULT_CACHE, ttl=DEFAULT_TTL,
+                      offline=False, proxies=None):
+    #
+    # Returns {url: (status, error)}. Registers found reachable within the last 'ttl' seconds
+    # are not checked again. Offline, only the cache is consulted; a status of None with no
+    # error means the register was not checked. 'proxies' default to the environment's.
+    #
+    now = time.time()
+    cache = readCache(cacheFile) if cacheFile else {}
+    results = {}
+    pending = []
+    for url in urls:
+        try:
+            if now - cache[url] < ttl:
+                results[url] = (200, None)
+                continue
+        except (KeyError, TypeError):
+            pass
+
+        if offline:
+            results[url] = (None, None)
+        else:
+            pending.append(url)
+
+    if pending:
+        pool = ConnectionPool(timeout, proxies)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            for url, result in zip(pending, executor.map(lambda url: checkURL(url, pool), pending)):
+                results[url] = result
+                if result[0] == 200:
+                    cache[url] = now
+
+        pool.close()
+
+        if cacheFile:
+            writeCache(cacheFile, dict((url, checked) for url, checked in cache.items()
+                                       if now - checked < ttl))
+
+    return dict((url, results[url]) for url in urls)
+
+def reportVocabularies(results):
+    #
+    # Print the registers that need attention and return how many there are.
+    problems = 0
+    for url, (status, error) in results.items():
+        if error is not None:
+            print('{} resulted in {}. Please investigate.'.format(url, error))
+        elif status is None:
+            print('{} not checked (offline, not in cache).'.format(url))
+        elif status != 200:
+            print('{} not reachable ({}). Please investigate.'.format(url, status))
+        else:
+            continue
+        problems += 1
+
+    return problems
+
+if __name__ == '__main__':
+
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Check that the vocabularies in schemas are reachable.')
+    parser.add_argument('schemas', nargs='+', help='schema files')
+    parser.add_argument('-j', '--jobs', type=int, default=8,
+                        help='number of registers to check at the same time (default: 8)')
+    parser.add_argument('--timeout', type=float, default=10,
+                        help='seconds to wait for a register to respond (default: 10)')
+    parser.add_argument('--cache', default=DEFAULT_CACHE,
+                        help='cache file of reachable registers (default: %(default)s)')
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL,
+                        help='seconds a reachable register stays in the cache (default: %(default)s)')
+    parser.add_argument('--offline', action='store_true', help='consult only the cache')
+    args = parser.parse_args()
+
+    results = checkVocabularies(getVocabularies(args.schemas), args.jobs, args.timeout,
+                                args.cache, args.ttl, args.offline)
+    sys.exit(1 if reportVocabularies(results) else 0)
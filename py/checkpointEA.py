@@ -0,0 +1,119 @@
+#
+# Name: checkpointEA.py
+#
+# Purpose: To resume the post-processing of a schema after the last stage whose inputs have
+#          not changed since the previous run.
+#
+# After each of the stages below, the tree and the schema's namespaces are saved, compressed,
+# as a checkpoint (see treeBackend.py's snapshot()). A checkpoint's key is a hash of the key
+# of the stage before and what the stage reads:
+#
+#   parseAndGetNameSpaces   the EA schema, the post-processing code, the tree backend, [imports]
+#   fixImports              [imports]
+#   fixIncludes             [includes]
+#   cleanUpTree             [allowedGMLAbstractFeatures]
+#   applyRules              [codeLists], [dataTypes], [adjustmentN] and the other rules
+#
+# so that a change to the rules, say, makes the checkpoints from applyRules on, but not those
+# before, out of date. postProcessEA.processSchema() starts from the latest checkpoint whose
+# key is right, and only the addendums and serialization, which are never checkpointed, are
+# sure to run again. The checkpoints are kept in __pycache__/checkpoints next to this file,
+# the last of each stage of each EA schema only.
+#
+import hashlib
+import json
+import marshal
+import os
+
+STAGES = ['parseAndGetNameSpaces', 'fixImports', 'fixIncludes', 'cleanUpTree', 'applyRules']
+VERSION = 1
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'checkpoints')
+
+class NullCheckpoints:
+    #
+    # Stands in for Checkpoints when none are kept.
+    def resume(self):
+        return None
+
+    def done(self, stage):
+        return False
+
+    def save(self, stage, root, nameSpaces):
+        pass
+
+NULL = NullCheckpoints()
+
+def stageKeys(plan, schemaDigest, codeDigest, backend):
+
+    inputs = [(schemaDigest, codeDigest, backend.name, plan.get('imports')), plan.get('imports'),
+              plan.get('includes'), plan['ignoreElementNames'], plan['rules']]
+    keys = []
+    key = ''
+    for stage, value in zip(STAGES, inputs):
+        key = hashlib.sha256(('%s %s %s' % (key, stage, json.dumps(value, sort_keys=True))).encode('UTF-8')).hexdigest()
+        keys.append(key)
+
+    return keys
+
+class Checkpoints:
+
+    def __init__(self, plan, EASchemaFile, schemaDigest, codeDigest, backend, directory=DEFAULT_DIRECTORY):
+        #
+        # EA schemas of the same name in different directories have checkpoints of their own
+        self.keys = stageKeys(plan, schemaDigest, codeDigest, backend)
+        self.backend = backend
+        self.prefix = os.path.join(directory, '%s-%s' % (plan['schema']['name'],
+                                                          hashlib.sha256(os.path.abspath(EASchemaFile).encode('UTF-8')).hexdigest()[:12]))
+        self.resumed = -1
+
+    def _file(self, num):
+
+        return '%s.%d.%s' % (self.prefix, num, STAGES[num])
+
+    def resume(self):
+        #
+        # (stage, tree, namespaces) of the latest valid checkpoint, or None
+        for num in reversed(range(len(STAGES))):
+            try:
+                with open(self._file(num), 'rb') as fh:
+                    checkpoint = marshal.load(fh)
+                if checkpoint['version'] != VERSION or checkpoint['key'] != self.keys[num]:
+                    continue
+
+                root = self.backend.restore(checkpoint['tree'])
+
+            except (IOError, OSError, EOFError, ValueError, TypeError, KeyError):
+                continue
+
+            self.resumed = num
+            return STAGES[num], root, checkpoint['nameSpaces']
+
+        return None
+
+    def done(self, stage):
+        #
+        # Whether the stage's result has been restored
+        return STAGES.index(stage) <= self.resumed
+
+    def save(self, stage, root, nameSpaces):
+
+        num = STAGES.index(stage)
+        if num <= self.resumed:
+            return
+
+        fname = self._file(num)
+        tmpfile = '%s.%d.tmp' % (fname, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(fname)):
+                os.makedirs(os.path.dirname(fname), exist_ok=True)
+            with open(tmpfile, 'wb') as fh:
+                marshal.dump({'version': VERSION, 'key': self.keys[num], 'nameSpaces': nameSpaces,
+                              'tree': self.backend.snapshot(root)}, fh)
+            os.replace(tmpfile, fname)
+
+        except (IOError, OSError) as err:
+            print('Checkpoint %s not saved: %s' % (os.path.basename(fname), err))
+
+        finally:
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
@@ -0,0 +1,188 @@
+#
+# Name: compileRules.py
+#
+# Purpose: To turn a product's configuration file into a rule plan for postProcessEA.py,
+#          checking every rule before any XML is parsed.
+#
+# In the plan, the rule sections are split into lookup tables and the addendums are
+# compiled into code objects, with the configuration file's name and line numbers for
+# tracebacks. loadPlan() keeps plans in the __pycache__ directory next to the
+# configuration file (see cachedFile.py), so a configuration file is only read and
+# compiled again when it changes.
+#
+import re
+try:
+    import configparser as cp
+except ImportError:
+    import ConfigParser as cp
+
+import buildManifest as bm
+import cachedFile as cf
+
+PLAN_VERSION = 3
+
+class ConfigurationError(ValueError):
+    pass
+
+def readConfig(cfgfile):
+
+    config = cp.ConfigParser()
+    config.optionxform = str
+    config.read(cfgfile)
+
+    return config
+
+def _codeLines(cfgfile):
+    #
+    # Line number of each addendum's 'code' key in the configuration file
+    lines = {}
+    section = None
+    try:
+        with open(cfgfile) as fh:
+            for lineno, line in enumerate(fh, 1):
+                header = re.match(r'\[(?P<section>[^\]]+)\]', line)
+                if header:
+                    section = header.group('section')
+                elif re.match(r'code\s*[=:]', line) and section is not None:
+                    lines.setdefault(section, lineno)
+
+    except (IOError, OSError):
+        pass
+
+    return lines
+
+def compileConfig(config, cfgfile='<config>'):
+    #
+    # Returns the rule plan of the configuration, or raises ConfigurationError listing all
+    # malformed entries.
+    errors = []
+    plan = {'version': PLAN_VERSION, 'digest': bm.configDigest(config)}
+    #
+    # The same rules, wherever the schema is read from and written to
+    plan['rulesDigest'] = bm.configDigest(config, omit=['location'])
+
+    def items(section):
+        try:
+            return config.items(section)
+        except cp.NoSectionError:
+            return None
+        except cp.Error as err:
+            errors.append(str(err))
+            return None
+
+    def get(section, option, required=True):
+        try:
+            return config.get(section, option)
+        except (cp.NoSectionError, cp.NoOptionError) as err:
+            if required:
+                errors.append(str(err))
+            return None
+        except cp.Error as err:
+            errors.append(str(err))
+            return None
+
+    def number(section):
+        value = get(section, 'number')
+        try:
+            return int(value) if value is not None else 0
+        except ValueError:
+            errors.append('[%s] number is not an integer: %s' % (section, value))
+            return 0
+    #
+    # Locations and schema. A missing [location] section is reported by postProcessEA.main().
+    if config.has_section('location'):
+        plan['location'] = {'EADirectory': get('location', 'EADirectory'),
+                            'ReleaseDirectory': get('location', 'ReleaseDirectory')}
+    else:
+        plan['location'] = None
+        plan['locationError'] = str(cp.NoSectionError('location'))
+
+    plan['schema'] = {'name': get('schema', 'name'),
+                      'defaultNamespace': get('schema', 'defaultNamespace')}
+    #
+    # prefix=uri schemaLocation
+    imports = items('imports')
+    if imports is not None:
+        for key, value in imports:
+            if len(value.split()) != 2:
+                errors.append('[imports] %s must be "uri schemaLocation": %s' % (key, value))
+        plan['imports'] = dict(imports)
+
+    includes = items('includes')
+    if includes is not None:
+        plan['includes'] = [x[1] for x in includes]
+
+    if config.has_section('allowedGMLAbstractFeatures'):
+        plan['ignoreElementNames'] = get('allowedGMLAbstractFeatures', 'names')
+    else:
+        plan['ignoreElementNames'] = []
+    #
+    # Report, or remove, the components that nothing reachable refers to
+    if config.has_section('pruneUnreachable'):
+        mode = get('pruneUnreachable', 'mode', required=False) or 'report'
+        if mode not in ('report', 'remove'):
+            errors.append('[pruneUnreachable] mode must be report or remove: %s' % mode)
+        keep = get('pruneUnreachable', 'keep', required=False)
+        plan['pruneUnreachable'] = {'mode': mode, 'keep': keep.replace(',', ' ').split() if keep else []}
+    #
+    # Rules applied in one pass by postProcessEA.applyRules()
+    rules = {}
+    dataTypes = items('dataTypes')
+    if dataTypes is not None:
+        for key, value in dataTypes:
+            if len(value.split()) != 2:
+                errors.append('[dataTypes] %s must be "type newType": %s' % (key, value))
+        rules['dataTypes'] = dict([tuple(x[1].split()) for x in dataTypes if len(x[1].split()) == 2])
+
+    for section in ['codeLists', 'substitutionGroups', 'baseExtensions', 'attributeDocStrings']:
+        entries = items(section)
+        if entries is not None:
+            rules[section] = dict(entries)
+
+    if config.has_section('setNilAttribute'):
+        names = get('setNilAttribute', 'names')
+        if names is not None:
+            rules['setNilAttribute'] = names.split(',')
+
+    if config.has_section('adjustments'):
+        rules['adjustments'] = []
+        for num in range(number('adjustments')):
+            section = 'adjustment%d' % num
+            kind, value, attributes, values = [get(section, option)
+                                               for option in ['kind', 'value', 'attributes', 'values']]
+            if None in (kind, value, attributes, values):
+                continue
+
+            attributes, values = attributes.split(','), values.split(',')
+            if len(attributes) != len(values):
+                errors.append('[%s] has %d attributes but %d values' % (section, len(attributes), len(values)))
+            rules['adjustments'].append((kind, value, list(zip(attributes, values))))
+
+    plan['rules'] = rules
+    #
+    # One-off python code, compiled so that tracebacks point into the configuration file
+    plan['addendums'] = []
+    if config.has_section('addendums'):
+        lines = _codeLines(cfgfile)
+        for num in range(number('addendums')):
+            section = 'addendum%d' % num
+            code = get(section, 'code')
+            if code is None:
+                continue
+
+            source = '\n' * (lines.get(section, 1) - 1) + code
+            try:
+                plan['addendums'].append(compile(source, cfgfile, 'exec'))
+            except SyntaxError as err:
+                errors.append('[%s] %s (%s, line %s)' % (section, err.msg, cfgfile, err.lineno))
+
+    if errors:
+        raise ConfigurationError('%s:\n    %s' % (cfgfile, '\n    '.join(errors)))
+
+    return plan
+
+def loadPlan(cfgfile):
+    #
+    # The plan, compiled again only if the configuration file has changed
+    return cf.loadCached(cfgfile, cf.cachePath(cfgfile, 'plan'), PLAN_VERSION,
+                         lambda x: compileConfig(readConfig(x), x))
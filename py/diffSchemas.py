@@ -0,0 +1,275 @@
+#
+# Purpose: To compare newly post-processed schemas with the ones staged for the website,
+#          component by component.
+#
+# The named components of a schema -- its top-level elements, complexTypes, simpleTypes,
+# attributes, groups and attributeGroups -- are compared, as is the rest of the schema
+# element: its attributes, namespace declarations, imports, includes and annotations.
+# Every element is hashed, Merkle-style, from its tag, its attributes in sorted order, its
+# text and tail with whitespace collapsed, and the hashes of its children in order. So the
+# order of attributes and changes in whitespace alone make no difference, and components
+# with the same hash are known to be unchanged without looking further.
+#
+import hashlib
+import html
+import json
+import os
+import xml.etree.ElementTree as ET
+
+COMPONENTS = ['element', 'complexType', 'simpleType', 'attribute', 'group', 'attributeGroup']
+SCHEMA = ('schema', '')
+
+def readSchema(fname):
+    #
+    # Returns {(kind, name): element} in document order, the ('schema', '') entry standing for
+    # the schema element with everything but its named components, and the hash of each element.
+    # Only the namespaces declared on the schema element are among its attributes; those bound
+    # within it, e.g. on a component, are left out (see nameSpaceScopes.py).
+    declarations = {}
+    root = None
+    for event, elem in ET.iterparse(fname, ('start-ns', 'start')):
+        if event == 'start-ns':
+            if root is None:
+                declarations['xmlns:%s' % elem[0] if elem[0] else 'xmlns'] = elem[1]
+        elif event == 'start':
+            if root is None:
+                root = elem
+
+    schema = root.makeelement(root.tag, dict(root.attrib, **declarations))
+    schema.text = root.text
+    components = {SCHEMA: schema}
+    for child in root:
+        kind, name = _localName(child.tag), child.get('name')
+        if kind not in COMPONENTS or name is None:
+            schema.append(child)
+            continue
+        #
+        # A name used twice for the same kind of component is an error, but must not hide one
+        key, num = (kind, name), 1
+        while key in components:
+            num += 1
+            key = (kind, '%s[%d]' % (name, num))
+        components[key] = child
+
+    digests = {}
+    for element in components.values():
+        _digest(element, digests)
+
+    return components, digests
+
+def _localName(tag):
+
+    return tag.rpartition('}')[2]
+
+def _normalize(text):
+
+    return ' '.join(text.split()) if text else ''
+
+def _digest(element, digests):
+
+    h = hashlib.sha256()
+    h.update(element.tag.encode('UTF-8'))
+    for key, value in sorted(element.items()):
+        h.update(('\x00%s\x00%s' % (key, value)).encode('UTF-8'))
+    h.update(('\x01%s\x01%s\x01' % (_normalize(element.text), _normalize(element.tail))).encode('UTF-8'))
+    for child in element:
+        h.update(_digest(child, digests))
+
+    digests[element] = h.digest()
+    return digests[element]
+
+def diffSchema(oldFile, newFile):
+    #
+    # Returns the components added to, removed from and changed in the new schema. The old one
+    # need not exist; then every component is new. A schema that cannot be read is named in
+    # the result's 'error', and nothing is compared.
+    result = {'old': oldFile, 'new': newFile, 'added': [], 'removed': [], 'changed': [], 'unchanged': 0}
+    fname = newFile
+    try:
+        new, newDigests = readSchema(newFile)
+        fname = oldFile
+        if oldFile is None or not os.path.isfile(oldFile):
+            old, oldDigests = {}, {}
+        else:
+            old, oldDigests = readSchema(oldFile)
+
+    except (ET.ParseError, IOError, OSError) as err:
+        result['error'] = '%s: %s' % (fname, err)
+        return result
+
+    result['added'] = [list(key) for key in new if key not in old]
+    result['removed'] = [list(key) for key in old if key not in new]
+
+    for key, element in new.items():
+        if key not in old:
+            continue
+        if oldDigests[old[key]] == newDigests[element]:
+            result['unchanged'] += 1
+            continue
+
+        result['changed'].append({'kind': key[0], 'name': key[1],
+                                  'differences': elementDifferences(old[key], element, oldDigests,
+                                                                    newDigests, '')})
+    return result
+
+def _step(element):
+
+    step = _localName(element.tag)
+    for attribute in ['name', 'ref']:
+        if element.get(attribute) is not None:
+            return '%s[@%s="%s"]' % (step, attribute, element.get(attribute))
+
+    return step
+
+def elementDifferences(old, new, oldDigests, newDigests, path):
+    #
+    # Descends only into children that differ. Children are matched by their tag and name (or
+    # ref) and, among those alike, by position.
+    if oldDigests[old] == newDigests[new]:
+        return []
+
+    where = path or '.'
+    differences = []
+    for key in sorted(set(old.keys()) | set(new.keys())):
+        if old.get(key) != new.get(key):
+            differences.append('%s @%s: %s -> %s' % (where, _localName(key),
+                                                    _quote(old.get(key)), _quote(new.get(key))))
+
+    for text in ['text', 'tail']:
+        if _normalize(getattr(old, text)) != _normalize(getattr(new, text)):
+            differences.append('%s %s: %s -> %s' % (where, text, _quote(_normalize(getattr(old, text))),
+                                                   _quote(_normalize(getattr(new, text)))))
+
+    oldChildren, newChildren = _keyedChildren(old), _keyedChildren(new)
+    for key, child in newChildren.items():
+        step = '%s/%s' % (path, _step(child)) if path else _step(child)
+        if key not in oldChildren:
+            differences.append('%s: added' % step)
+        else:
+            differences.extend(elementDifferences(oldChildren[key], child, oldDigests, newDigests, step))
+
+    for key, child in oldChildren.items():
+        if key not in newChildren:
+            differences.append('%s: removed' % ('%s/%s' % (path, _step(child)) if path else _step(child)))
+
+    if len(differences) == 0:
+        differences.append('%s: children reordered' % where)
+
+    return differences
+
+def _keyedChildren(element):
+
+    children = {}
+    for child in element:
+        key = (child.tag, child.get('name'), child.get('ref'))
+        num = 0
+        while key + (num,) in children:
+            num += 1
+        children[key + (num,)] = child
+
+    return children
+
+def _quote(value):
+
+    return 'None' if value is None else '"%s"' % value
+
+def diffSchemas(pairs):
+    #
+    # 'pairs' are (staged schema, new schema) file names; returns {new schema's name: result}
+    return dict((os.path.basename(newFile), diffSchema(oldFile, newFile)) for oldFile, newFile in pairs)
+
+def reportDifferences(results):
+    #
+    # Print what differs in each schema and return the number of schemas that differ.
+    differ = 0
+    for name, result in results.items():
+        if 'error' in result:
+            differ += 1
+            print('{}: not compared, {}'.format(name, result['error']))
+            continue
+
+        if not (result['added'] or result['removed'] or result['changed']):
+            print('{}: no differences'.format(name))
+            continue
+
+        differ += 1
+        print('{}: {} added, {} removed, {} changed, {} unchanged'.format(name, len(result['added']),
+                                                                        len(result['removed']),
+                                                                        len(result['changed']),
+                                                                        result['unchanged']))
+        for kind, component in result['added']:
+            print('  + {}'.format(_label(kind, component)))
+        for kind, component in result['removed']:
+            print('  - {}'.format(_label(kind, component)))
+        for change in result['changed']:
+            print('  ~ {}'.format(_label(change['kind'], change['name'])))
+            for difference in change['differences']:
+                print('      {}'.format(difference))
+
+    return differ
+
+def _label(kind, name):
+
+    return '{} {}'.format(kind, name) if name else kind
+
+def writeReport(results, reportFile):
+    #
+    # One report for all schemas: HTML if the file name ends in .html or .htm, JSON otherwise.
+    with open(reportFile, 'w') as fh:
+        if os.path.splitext(reportFile)[1].lower() in ['.html', '.htm']:
+            fh.write(htmlReport(results))
+        else:
+            json.dump(results, fh, indent=1)
+
+def htmlReport(results):
+
+    lines = ['<!DOCTYPE html>', '<html><head><meta charset="UTF-8"><title>Schema differences</title>',
+             '<style>.added{color:green}.removed{color:red}.changed{color:#a60}'
+             ' ul ul{font-family:monospace}</style></head><body>', '<h1>Schema differences</h1>']
+    for name, result in results.items():
+        lines.append('<h2>{}</h2>'.format(html.escape(name)))
+        if 'error' in result:
+            lines.append('<p class="removed">Not compared: {}</p>'.format(html.escape(result['error'])))
+            continue
+
+        lines.append('<p>{} added, {} removed, {} changed, {} unchanged; compared with {}</p>'.format(
+            len(result['added']), len(result['removed']), len(result['changed']), result['unchanged'],
+            html.escape(str(result['old']))))
+        lines.append('<ul>')
+        for kind, component in result['added']:
+            lines.append('<li class="added">added {}</li>'.format(html.escape(_label(kind, component))))
+        for kind, component in result['removed']:
+            lines.append('<li class="removed">removed {}</li>'.format(html.escape(_label(kind, component))))
+        for change in result['changed']:
+            lines.append('<li class="changed">changed {}<ul>'.format(html.escape(_label(change['kind'],
+                                                                                       change['name']))))
+            lines.extend('<li>{}</li>'.format(html.escape(difference)) for difference in change['differences'])
+            lines.append('</ul></li>')
+        lines.append('</ul>')
+    lines.append('</body></html>\n')
+
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Compare schemas with earlier versions of them, component by component.')
+    parser.add_argument('old', help='earlier schema, or directory of them')
+    parser.add_argument('new', help='new schema, or directory of them')
+    parser.add_argument('schemas', nargs='*',
+                        help='schema file names to compare, if the two are directories (default: all)')
+    parser.add_argument('--report', metavar='FILE', help='also write the differences to FILE, as HTML or JSON')
+    args = parser.parse_args()
+
+    if os.path.isdir(args.new):
+        names = args.schemas or sorted(f for f in os.listdir(args.new) if f.endswith('.xsd'))
+        pairs = [(os.path.join(args.old, name), os.path.join(args.new, name)) for name in names]
+    else:
+        pairs = [(args.old, args.new)]
+
+    results = diffSchemas(pairs)
+    if args.report:
+        writeReport(results, args.report)
+    sys.exit(1 if reportDifferences(results) else 0)
@@ -0,0 +1,474 @@
+#
+# Name: generateEA.py
+#
+# Purpose: To generate the EA schemas, as Enterprise Architect's 'Generate GML Application
+#          Schema' does, from the XMI export of the model, without Enterprise Architect.
+#
+# The export is read as a stream of records (see xmiStream.py) into a model of its packages
+# and classes, which are then written out one schema per package with an xsdDocument tagged
+# value, in that package's targetNamespace, following ISO 19136 Annex E as EA implements it:
+#
+#   <<FeatureType>>   a global element in gml:AbstractFeature's substitution group, its type
+#                     extending gml:AbstractFeatureType and a property type to refer to it
+#   <<Type>>          the same, from gml:AbstractGML and gml:AbstractGMLType
+#   <<DataType>>      a global element in gml:AbstractObject's substitution group, its type
+#                     a sequence of the class' properties and an inline-only property type
+#   <<Enumeration>>   a simpleType restricting xs:string to the literals
+#   <<CodeList>>      a complexType extending gml:ReferenceType, with the vocabulary and
+#                     extensibility of the code list in its appinfo
+#
+# and so on. A class generalizing another extends the other's type and joins its element's
+# substitution group. Attributes are elements of the class' type, in sequenceNumber order
+# with the navigable association ends, unless xsdAsAttribute is set; those typed by a code
+# list are gml:CodeType, those by a data type or an enumeration refer to its type and the
+# others to the property type of their class. Types outside the model are mapped to XSD and
+# GML types as EA maps them; the rest are written as EA writes them, '<name>Type', for the
+# configuration files' [dataTypes] to replace.
+#
+# The schemas are what EA writes, shortcomings included: no nillable, and no documentation
+# of XML attributes. Those, the code list types of the properties and the rest come from the
+# configuration files, as before, by post-processing the schemas (with --post). A schema is
+# written only if it has changed, so that the build manifest (see buildManifest.py) leaves
+# the products whose part of the model has not changed alone.
+#
+import os
+import xml.sax.saxutils
+
+import xmiStream as xs
+
+GML = 'http://www.opengis.net/gml/3.2'
+GML_LOCATION = 'http://schemas.opengis.net/gml/3.2.1/gml.xsd'
+XSD = 'http://www.w3.org/2001/XMLSchema'
+#
+# The types outside the model that EA knows
+EXTERNAL_TYPES = {'Angle': 'gml:AngleType', 'Area': 'gml:AreaType', 'Boolean': 'xs:boolean',
+                  'boolean': 'xs:boolean', 'CharacterString': 'xs:string', 'Date': 'xs:date',
+                  'DateTime': 'xs:dateTime', 'Decimal': 'xs:decimal', 'Distance': 'gml:LengthType',
+                  'duration': 'xs:duration', 'GM_Curve': 'gml:CurvePropertyType',
+                  'GM_LineString': 'gml:CurvePropertyType', 'GM_Point': 'gml:PointPropertyType',
+                  'GM_Surface': 'gml:SurfacePropertyType', 'Integer': 'xs:integer', 'integer': 'xs:integer',
+                  'Length': 'gml:LengthType', 'Measure': 'gml:MeasureType', 'Number': 'xs:double',
+                  'Real': 'xs:double', 'TM_Instant': 'gml:TimeInstantPropertyType',
+                  'TM_Period': 'gml:TimePeriodPropertyType', 'URI': 'xs:anyURI', 'Velocity': 'gml:SpeedType',
+                  'Volume': 'gml:VolumeType'}
+#
+# Per stereotype: the base type and substitution group of a class generalizing none in the model
+OBJECTS = {'FeatureType': ('gml:AbstractFeatureType', 'gml:AbstractFeature'),
+           'Type': ('gml:AbstractGMLType', 'gml:AbstractGML')}
+DATATYPE = (None, 'gml:AbstractObject')
+
+def readModel(xmiFile):
+    #
+    # The packages and classes of the export, by xmi.id. A class has its properties, in order,
+    # and its supertypes; a package, its tagged values, those written after the model included.
+    packages, classes, names, tags, stereotypes = {}, {}, {}, {}, {}
+    attributes, ends, generalizations = [], {}, []
+    for record in xs.records(xmiFile):
+        if isinstance(record, xs.TaggedValue):
+            tags.setdefault(record.owner, {})[record.tag] = _tagValue(record.value)
+        elif isinstance(record, xs.StereotypeRef):
+            stereotypes.setdefault(record.owner, record.name)
+        elif isinstance(record, xs.Package):
+            packages[record.xmiId] = {'name': record.name, 'parent': record.parent}
+        elif isinstance(record, xs.Class):
+            classes[record.xmiId] = {'name': record.name, 'package': record.package, 'abstract': record.abstract,
+                                     'properties': [], 'supertypes': []}
+        elif isinstance(record, xs.Attribute):
+            attributes.append(record)
+        elif isinstance(record, xs.AssociationEnd):
+            ends.setdefault(record.association, []).append(record)
+        elif isinstance(record, xs.Generalization):
+            generalizations.append(record)
+        elif isinstance(record, (xs.DataType, xs.Stub)):
+            names[record.xmiId] = record.name
+    #
+    # EA puts the tagged values of a package's profile on the element standing for it
+    for xmiId, package in packages.items():
+        guid = xmiId.partition('_')[2]
+        package['tags'] = {}
+        for owner in [xmiId, 'EAID_' + guid, 'MX_EAID_' + guid]:
+            package['tags'].update(tags.get(owner, {}))
+
+    for xmiId, cls in classes.items():
+        cls['tags'] = tags.get(xmiId, {})
+        cls['stereotype'] = stereotypes.get(xmiId, cls['tags'].get('stereotype'))
+
+    for record in attributes:
+        if record.owner in classes:
+            recordTags = tags.get(record.xmiId, {})
+            classes[record.owner]['properties'].append(
+                _property(record.name, record.type, recordTags.get('type') or names.get(record.type),
+                          recordTags.get('lowerBound', '1'), recordTags.get('upperBound', '1'), recordTags,
+                          recordTags.get('description')))
+    #
+    # A navigable, named end of an association is a property of the class at the other end
+    for xmiId, (source, target) in [(key, value) for key, value in ends.items() if len(value) == 2]:
+        documentation = tags.get(xmiId, {}).get('documentation')
+        for end, other in [(target, source), (source, target)]:
+            if end.name and end.navigable and other.type in classes:
+                lower, dots, upper = (end.multiplicity or '1').partition('..')
+                classes[other.type]['properties'].append(
+                    _property(end.name, end.type, classes.get(end.type, {}).get('name'), lower, upper or lower,
+                              tags.get(end.xmiId, {}), documentation, association=True))
+
+    for record in generalizations:
+        if record.subtype in classes:
+            classes[record.subtype]['supertypes'].append(record.supertype)
+
+    for cls in classes.values():
+        cls['properties'] = [prop for num, prop in sorted(enumerate(cls['properties']), key=_propertyOrder)]
+
+    return {'packages': packages, 'classes': classes, 'names': names}
+
+def _tagValue(value):
+    #
+    # The tagged values of the profile carry their notes along
+    return value if value is None else value.partition('#NOTES#')[0]
+
+def _property(name, typeId, typeName, lower, upper, tags, documentation, association=False):
+
+    return {'name': name, 'type': typeId, 'typeName': typeName, 'lower': lower, 'upper': upper,
+            'tags': tags, 'documentation': documentation, 'association': association}
+
+def _propertyOrder(item):
+    #
+    # Numbered properties first, then the rest as they come
+    num, prop = item
+    try:
+        return (0, int(prop['tags']['sequenceNumber']), num)
+    except (KeyError, ValueError):
+        return (1, 0, num)
+
+def applicationSchemas(model):
+    #
+    # The packages that are written to a schema: (package id, schema file, namespace, prefix),
+    # the namespace and prefix being those of the package or the closest package above it
+    packages = model['packages']
+    schemas = []
+    for xmiId, package in packages.items():
+        document = package['tags'].get('xsdDocument')
+        if not document:
+            continue
+
+        ancestor, namespace, prefix = xmiId, None, None
+        while ancestor in packages and (namespace is None or prefix is None):
+            namespace = namespace or packages[ancestor]['tags'].get('targetNamespace')
+            prefix = prefix or packages[ancestor]['tags'].get('xmlns')
+            ancestor = packages[ancestor]['parent']
+
+        if namespace is None or prefix is None:
+            print('%s: no targetNamespace or xmlns tagged value, not generated' % document)
+            continue
+
+        schemas.append((xmiId, document.strip(), namespace.strip(), prefix.strip()))
+
+    return schemas
+
+class SchemaWriter:
+    #
+    # The schema of one package, as text, with tabs, as EA writes it
+    def __init__(self, model, packageId, namespaces):
+
+        self.model = model
+        self.packageId = packageId
+        #
+        # package id -> (schema file, namespace, prefix)
+        self.namespaces = namespaces
+        self.schemaFile, self.namespace, self.prefix = namespaces[packageId]
+        self.lines = []
+        self.includes = []
+        self.unknown = set()
+
+    def write(self):
+
+        classes = [cls for cls in self.model['classes'].values() if cls['package'] == self.packageId]
+        body = self.lines
+        for cls in classes:
+            stereotype = cls['stereotype']
+            if stereotype == 'Enumeration':
+                self.enumeration(cls)
+            elif stereotype == 'CodeList':
+                self.codeList(cls)
+            else:
+                self.objectType(cls)
+        #
+        # The schemas of the same namespace whose types are used, or, for a package with no
+        # classes of its own, those of the packages within it
+        if len(classes) == 0:
+            self.includes = [document for xmiId, (document, namespace, prefix) in self.namespaces.items()
+                             if self.model['packages'][xmiId]['parent'] == self.packageId and namespace == self.namespace]
+
+        package = self.model['packages'][self.packageId]
+        self.lines = []
+        self.line(0, '<?xml version="1.0" encoding="UTF-8"?>')
+        self.start(0, 'xs:schema', [('xmlns:xs', XSD), ('xmlns:gml', GML), ('xmlns:%s' % self.prefix, self.namespace),
+                                    ('targetNamespace', self.namespace),
+                                    ('elementFormDefault', package['tags'].get('elementFormDefault', 'qualified')),
+                                    ('attributeFormDefault', package['tags'].get('attributeFormDefault', 'unqualified')),
+                                    ('version', package['tags'].get('version', '1.0'))])
+        self.annotation(1, package['tags'].get('documentation'))
+        self.empty(1, 'xs:import', [('namespace', GML), ('schemaLocation', GML_LOCATION)])
+        for document in self.includes:
+            self.empty(1, 'xs:include', [('schemaLocation', document)])
+        self.lines.extend(body)
+        self.end(0, 'xs:schema')
+
+        if self.unknown:
+            print('%s: types not in the model, written as <name>Type: %s' % (self.schemaFile, ' '.join(sorted(self.unknown))))
+
+        return ''.join(self.lines)
+
+    def line(self, depth, text):
+
+        self.lines.append('%s%s\n' % ('\t' * depth, text))
+
+    def start(self, depth, tag, attributes=(), close='>'):
+
+        self.line(depth, '<%s%s%s' % (tag, ''.join(' %s=%s' % (name, xml.sax.saxutils.quoteattr(value))
+                                                   for name, value in attributes if value is not None), close))
+
+    def empty(self, depth, tag, attributes=()):
+
+        self.start(depth, tag, attributes, '/>')
+
+    def end(self, depth, tag):
+
+        self.line(depth, '</%s>' % tag)
+
+    def text(self, depth, tag, text):
+
+        self.line(depth, '<%s>%s</%s>' % (tag, xml.sax.saxutils.escape(text), tag))
+
+    def annotation(self, depth, documentation, appinfo=()):
+
+        if not documentation and not appinfo:
+            return
+
+        self.start(depth, 'xs:annotation')
+        if documentation:
+            self.text(depth + 1, 'xs:documentation', documentation)
+        if appinfo:
+            self.start(depth + 1, 'xs:appinfo')
+            for tag, value in appinfo:
+                self.text(depth + 2, tag, value)
+            self.end(depth + 1, 'xs:appinfo')
+        self.end(depth, 'xs:annotation')
+
+    def qualified(self, xmiId, suffix):
+        #
+        # The type of a class of the model, with the prefix of its schema's namespace
+        cls = self.model['classes'][xmiId]
+        document, namespace, prefix = self.namespaces.get(cls['package'], (None, self.namespace, self.prefix))
+        if namespace == self.namespace and document not in (self.schemaFile, None) and document not in self.includes:
+            self.includes.append(document)
+
+        return '%s:%s%s' % (prefix, cls['name'], suffix)
+
+    def external(self, name):
+
+        try:
+            return EXTERNAL_TYPES[name]
+        except KeyError:
+            self.unknown.add(name)
+            return '%sType' % name
+
+    def propertyType(self, prop):
+
+        target = self.model['classes'].get(prop['type'])
+        if target is None:
+            return self.external(prop['typeName'])
+
+        if target['stereotype'] == 'CodeList':
+            return 'gml:CodeType'
+        #
+        # An attribute is the data type's content itself; an association end, as any property
+        # of a feature or object, holds it in a property type.
+        if target['stereotype'] == 'Enumeration' or \
+           (not prop['association'] and target['stereotype'] not in OBJECTS):
+            return self.qualified(prop['type'], 'Type')
+
+        return self.qualified(prop['type'], 'PropertyType')
+
+    def supertype(self, cls):
+        #
+        # (base type, substitution group) of the class
+        base, group = OBJECTS.get(cls['stereotype'], DATATYPE)
+        for xmiId in cls['supertypes']:
+            if xmiId in self.model['classes']:
+                return self.qualified(xmiId, 'Type'), self.qualified(xmiId, '')
+            base = self.external(self.model['names'].get(xmiId) or xmiId)
+
+        return base, group
+
+    def objectType(self, cls):
+
+        name = cls['name']
+        abstract = 'true' if cls['abstract'] else None
+        base, group = self.supertype(cls)
+        elements = [prop for prop in cls['properties'] if prop['tags'].get('xsdAsAttribute') != 'true']
+        attributes = [prop for prop in cls['properties'] if prop['tags'].get('xsdAsAttribute') == 'true']
+
+        self.start(1, 'xs:element', [('name', name), ('type', '%s:%sType' % (self.prefix, name)),
+                                     ('substitutionGroup', group), ('abstract', abstract)],
+                   '>' if cls['tags'].get('documentation') else '/>')
+        if cls['tags'].get('documentation'):
+            self.annotation(2, cls['tags']['documentation'])
+            self.end(1, 'xs:element')
+
+        self.start(1, 'xs:complexType', [('name', '%sType' % name), ('abstract', abstract)])
+        depth = 2
+        if base is not None:
+            self.start(2, 'xs:complexContent')
+            self.start(3, 'xs:extension', [('base', base)])
+            depth = 4
+
+        if elements:
+            self.start(depth, 'xs:sequence')
+            for prop in elements:
+                self.propertyElement(depth + 1, prop)
+            self.end(depth, 'xs:sequence')
+        else:
+            self.empty(depth, 'xs:sequence')
+        #
+        # EA leaves out the documentation of XML attributes
+        for prop in attributes:
+            self.empty(depth, 'xs:attribute', [('name', prop['name']), ('type', self.propertyType(prop))])
+
+        if base is not None:
+            self.end(3, 'xs:extension')
+            self.end(2, 'xs:complexContent')
+        self.end(1, 'xs:complexType')
+
+        if cls['tags'].get('noPropertyType') == 'true':
+            return
+
+        self.start(1, 'xs:complexType', [('name', '%sPropertyType' % name)])
+        if cls['stereotype'] in OBJECTS and cls['tags'].get('byValuePropertyType') != 'true':
+            self.start(2, 'xs:sequence', [('minOccurs', '0')])
+            self.empty(3, 'xs:element', [('ref', '%s:%s' % (self.prefix, name))])
+            self.end(2, 'xs:sequence')
+            self.empty(2, 'xs:attributeGroup', [('ref', 'gml:AssociationAttributeGroup')])
+        else:
+            self.start(2, 'xs:sequence')
+            self.empty(3, 'xs:element', [('ref', '%s:%s' % (self.prefix, name))])
+            self.end(2, 'xs:sequence')
+        self.empty(2, 'xs:attributeGroup', [('ref', 'gml:OwnershipAttributeGroup')])
+        self.end(1, 'xs:complexType')
+
+    def propertyElement(self, depth, prop):
+        #
+        # EA does not write nillable
+        upper = 'unbounded' if prop['upper'] in ('*', 'n') else prop['upper']
+        attributes = [('name', prop['name']), ('type', self.propertyType(prop)),
+                      ('minOccurs', None if prop['lower'] == '1' else prop['lower']),
+                      ('maxOccurs', None if upper == '1' else upper)]
+        if prop['documentation']:
+            self.start(depth, 'xs:element', attributes)
+            self.annotation(depth + 1, prop['documentation'])
+            self.end(depth, 'xs:element')
+        else:
+            self.empty(depth, 'xs:element', attributes)
+
+    def enumeration(self, cls):
+
+        self.start(1, 'xs:simpleType', [('name', '%sType' % cls['name'])])
+        self.annotation(2, cls['tags'].get('documentation'))
+        self.start(2, 'xs:restriction', [('base', 'xs:string')])
+        for prop in cls['properties']:
+            self.empty(3, 'xs:enumeration', [('value', prop['name'])])
+        self.end(2, 'xs:restriction')
+        self.end(1, 'xs:simpleType')
+
+    def codeList(self, cls):
+
+        appinfo = [(tag, cls['tags'][tag].strip()) for tag in ['vocabulary', 'extensibility']
+                   if (cls['tags'].get(tag) or '').strip()]
+        self.start(1, 'xs:complexType', [('name', '%sType' % cls['name'])])
+        self.annotation(2, cls['tags'].get('documentation'), appinfo)
+        self.start(2, 'xs:complexContent')
+        self.empty(3, 'xs:extension', [('base', 'gml:ReferenceType')])
+        self.end(2, 'xs:complexContent')
+        self.end(1, 'xs:complexType')
+
+def generateSchemas(model, schemas=None):
+    #
+    # {schema file: text} of the application schemas, all of them or those named
+    namespaces = dict((xmiId, (document, namespace, prefix))
+                      for xmiId, document, namespace, prefix in applicationSchemas(model))
+    return dict((namespaces[xmiId][0], SchemaWriter(model, xmiId, namespaces).write())
+                for xmiId in namespaces if not schemas or namespaces[xmiId][0] in schemas)
+
+def writeSchemas(texts, EADirectory):
+    #
+    # Writes the schemas that differ from those in the EA directory. Returns those written.
+    if not os.path.isdir(EADirectory):
+        os.makedirs(EADirectory)
+
+    written = []
+    for schemaFile, text in sorted(texts.items()):
+        fname = os.path.join(EADirectory, schemaFile)
+        data = text.encode('UTF-8')
+        try:
+            with open(fname, 'rb') as fh:
+                if fh.read() == data:
+                    print('%s is unchanged' % schemaFile)
+                    continue
+        except FileNotFoundError:
+            pass
+
+        with open(fname, 'wb') as fh:
+            fh.write(data)
+        print('%s written' % os.path.relpath(fname))
+        written.append(schemaFile)
+
+    return written
+
+if __name__ == '__main__':
+
+    import argparse
+    import glob
+    import sys
+
+    import compileRules as cr
+    import matrixEA as me
+    import treeBackend as tb
+
+    REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Generate the EA schemas from the XMI export of the model, without Enterprise Architect.')
+    parser.add_argument('products', nargs='*', metavar='product',
+                        help='name of schema to generate, without the .xsd extension (default: all)')
+    parser.add_argument('--xmi', default=os.path.join(REPOSITORY, 'IWXXM-US-3.0.xml'),
+                        help='XMI export of the model (default: %(default)s)')
+    parser.add_argument('--ea-dir', default=os.path.join(REPOSITORY, 'EA'),
+                        help='directory to write the schemas to (default: %(default)s)')
+    parser.add_argument('--post', action='store_true',
+                        help='then post-process the schemas with their configuration files')
+    parser.add_argument('--cfg-dir', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='directory of the configuration files to post-process with (default: %(default)s)')
+    parser.add_argument('--release-dir', default=os.path.join(REPOSITORY, 'schemas'),
+                        help='directory to write the post-processed schemas to (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of rule sets to apply at the same time (default: 1)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='post-process schemas even if they are up to date')
+    parser.add_argument('--backend', choices=sorted(tb.BACKENDS), default='etree',
+                        help='XML tree implementation to post-process with (default: etree)')
+    args = parser.parse_args()
+
+    texts = generateSchemas(readModel(args.xmi), ['%s.xsd' % product for product in args.products])
+    for product in args.products:
+        if '%s.xsd' % product not in texts:
+            print('No package of the model is written to %s.xsd' % product)
+    writeSchemas(texts, args.ea_dir)
+
+    if args.post:
+        cfgfiles = [os.path.splitext(os.path.basename(cfgfile))[0]
+                    for cfgfile in glob.glob(os.path.join(args.cfg_dir, '*.cfg'))]
+        try:
+            me.runMatrix([(args.ea_dir, args.cfg_dir, args.release_dir)],
+                         [product for product in cfgfiles if '%s.xsd' % product in texts],
+                         args.jobs, args.force, tb.BACKENDS[args.backend])
+
+        except cr.ConfigurationError as err:
+            print('Malformed configuration file %s' % err)
+            sys.exit(1)
@@ -0,0 +1,216 @@
+#
+# Name: matrixEA.py
+#
+# Purpose: To post-process the EA schemas of several IWXXM-US releases in one run.
+#
+# Each release is given as its EA directory, the directory of its configuration files and
+# its release directory; the [location] sections of the configuration files are not used.
+# The releases are processed product by product, each schema after those it includes or
+# imports in any release. An EA schema that several releases share is parsed once, and each
+# release's rule set is applied to a copy-on-write copy of the tree, in a process forked
+# from the one that parsed it. Releases whose configurations of a product differ only in
+# [location], and whose released schemas that it includes or imports are the same, get the
+# same schema: it is made once and written to each release directory.
+# Where processes can not be forked (Windows), the schema is parsed again for each further
+# rule set. With --validate, the releases share the local copies of the imported schemas.
+#
+import contextlib
+import glob
+import io
+import multiprocessing
+import os
+import sys
+
+import buildManifest as bm
+import compileRules as cr
+import postProcessEA as pea
+import treeBackend as tb
+import validateSchemas as vs
+
+FORK = 'fork' in multiprocessing.get_all_start_methods()
+
+def releasePlans(EADirectory, cfgDirectory, ReleaseDirectory, products=None):
+    #
+    # The rule plans of a release's products, all of them or those named, reading from and
+    # writing to the release's directories
+    plans = []
+    for cfgfile in sorted(glob.glob(os.path.join(cfgDirectory, '*.cfg'))):
+        if products and os.path.splitext(os.path.basename(cfgfile))[0] not in products:
+            continue
+
+        plan = dict(cr.loadPlan(cfgfile))
+        plan['location'] = {'EADirectory': os.path.abspath(EADirectory),
+                            'ReleaseDirectory': os.path.abspath(ReleaseDirectory)}
+        plans.append(plan)
+
+    return plans
+
+def productOrder(releases):
+    #
+    # The schemas' names, each after those it includes or imports in any of the releases
+    names, dependencies = [], {}
+    for plans in releases:
+        for plan in plans:
+            name = plan['schema']['name']
+            if name not in dependencies:
+                names.append(name)
+                dependencies[name] = set()
+            dependencies[name].update(pea.schemaDependencies(plan))
+
+    graph = [set(names.index(x) for x in dependencies[name] if x in dependencies) for name in names]
+    levels = pea.dependencyLevels(pea.breakCycles(graph))
+    return [names[num] for num in sorted(range(len(names)), key=lambda num: (levels[num], num))]
+
+def staleVariants(plans, force=False):
+    #
+    # (plan, EA schema, output file, manifest file, manifest entry) of each plan whose schema
+    # is to be made again
+    variants = []
+    for plan in plans:
+        schemaFile = plan['schema']['name']
+        EASchemaFile = os.path.join(plan['location']['EADirectory'], schemaFile)
+        ReleaseFullPath = plan['location']['ReleaseDirectory']
+        if not os.path.isfile(EASchemaFile):
+            print('Missing schema file in EA directory, %s' % EASchemaFile)
+            continue
+
+        outputfile = os.path.join(ReleaseFullPath, schemaFile)
+        manifestFile = os.path.join(ReleaseFullPath, bm.MANIFEST)
+        inputs = pea.manifestInputs(plan, EASchemaFile, ReleaseFullPath)
+        if not force and bm.isUpToDate(manifestFile, schemaFile, inputs, outputfile):
+            print('%s is up to date' % os.path.relpath(outputfile))
+            continue
+
+        variants.append((plan, EASchemaFile, outputfile, manifestFile, inputs))
+
+    return variants
+#
+# What the forked processes share with the one that parsed the schema
+_shared = {}
+
+def _applyRuleSet(num):
+    #
+    # Returns the diagnostics and the schema made with the num'th rule set from the shared tree
+    plan, EASchemaFile = _shared['plans'][num]
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        data = pea.processSchema(plan, EASchemaFile, backend=_shared['backend'], parsed=_shared['parsed'],
+                                 releaseDirectory=plan['location']['ReleaseDirectory'])
+
+    return output.getvalue(), data
+
+def applyRuleSets(parsed, plans, jobs=1, backend=tb.ETREE):
+    #
+    # 'plans' are (plan, EA schema) pairs of the same EA schema, already parsed. Each forked
+    # process takes one rule set only, so that each starts from the tree as parsed.
+    _shared.update(parsed=parsed, plans=plans, backend=backend)
+    try:
+        if FORK and len(plans) > 1:
+            with multiprocessing.get_context('fork').Pool(min(jobs, len(plans)), maxtasksperchild=1) as pool:
+                return pool.map(_applyRuleSet, range(len(plans)), chunksize=1)
+
+        results = []
+        for num, (plan, EASchemaFile) in enumerate(plans):
+            if num > 0:
+                _shared['parsed'] = pea.parseSchema(EASchemaFile, backend)
+            results.append(_applyRuleSet(num))
+
+        return results
+
+    finally:
+        _shared.clear()
+
+def ruleSetKey(variant):
+    #
+    # Variants with the same key make the same schema from the same EA schema: the same rules,
+    # and released schemas of the same content to include and import. A plan that prunes
+    # unreachable components reads the released schemas that its includes include in turn,
+    # so its release directory is part of the key too.
+    plan, EASchemaFile, outputfile, manifestFile, inputs = variant
+    key = [plan['rulesDigest'], sorted(inputs.get('includes', {}).items()),
+           sorted(inputs.get('imports', {}).items())]
+    if 'pruneUnreachable' in plan:
+        key.append(os.path.abspath(os.path.dirname(outputfile)))
+
+    return repr(key)
+
+def buildProduct(variants, jobs=1, backend=tb.ETREE):
+    #
+    # Variants with the same EA schema share its tree; those with the same rules and released
+    # schemas as well, the schema made (see ruleSetKey()). Returns the schema files written.
+    bySchema = {}
+    for variant in variants:
+        bySchema.setdefault(variant[4]['schema'], {}).setdefault(ruleSetKey(variant), []).append(variant)
+
+    written = []
+    for ruleSets in bySchema.values():
+        groups = list(ruleSets.values())
+        EASchemaFile = groups[0][0][1]
+        parsed = pea.parseSchema(EASchemaFile, backend)
+        results = applyRuleSets(parsed, [(group[0][0], group[0][1]) for group in groups], jobs, backend)
+        for (output, data), group in zip(results, groups):
+            print('%s for %s' % (os.path.basename(EASchemaFile),
+                                 ', '.join(os.path.relpath(os.path.dirname(variant[2])) for variant in group)))
+            sys.stdout.write(output)
+            sys.stdout.flush()
+            if data is None:
+                continue
+
+            digest = bm.dataDigest(data)
+            for plan, EAFile, outputfile, manifestFile, inputs in group:
+                pea.writeSchema(outputfile, data)
+                inputs['output'] = digest
+                bm.updateManifest(manifestFile, {plan['schema']['name']: inputs})
+                written.append(outputfile)
+
+    return written
+
+def runMatrix(releases, products=None, jobs=1, force=False, backend=tb.ETREE):
+    #
+    # 'releases' are (EA directory, configuration directory, release directory) triples.
+    # All configuration files are compiled first, so a malformed rule stops the run before
+    # any schema is touched. Returns the schema files written.
+    releasePlanLists = [releasePlans(EADirectory, cfgDirectory, ReleaseDirectory, products)
+                        for EADirectory, cfgDirectory, ReleaseDirectory in releases]
+    for (EADirectory, cfgDirectory, ReleaseDirectory), plans in zip(releases, releasePlanLists):
+        if not os.path.isdir(ReleaseDirectory):
+            os.makedirs(ReleaseDirectory)
+        pea.checkDependencies(plans, [], '')
+
+    written = []
+    for name in productOrder(releasePlanLists):
+        variants = staleVariants([plan for plans in releasePlanLists for plan in plans
+                                  if plan['schema']['name'] == name], force)
+        written.extend(buildProduct(variants, jobs, backend))
+
+    return written
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Post-process the EA schemas of several releases in one run.')
+    parser.add_argument('products', nargs='*', metavar='product',
+                        help='name of product configuration file, without the .cfg extension (default: all)')
+    parser.add_argument('--release', nargs=3, action='append', required=True,
+                        metavar=('EA_DIR', 'CFG_DIR', 'RELEASE_DIR'),
+                        help='a release: its EA schemas, its configuration files and where its schemas go; repeat for each')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of rule sets to apply to a shared EA schema at the same time (default: 1)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='process products even if their schemas are up to date')
+    parser.add_argument('--backend', choices=sorted(tb.BACKENDS), default='etree',
+                        help='XML tree implementation to post-process with (default: etree)')
+    parser.add_argument('--validate', action='store_true',
+                        help='check that the schemas written compile, offline, with the imported schemas in the catalog')
+    args = parser.parse_args()
+
+    try:
+        written = runMatrix(args.release, args.products, args.jobs, args.force, tb.BACKENDS[args.backend])
+
+    except cr.ConfigurationError as err:
+        print('Malformed configuration file %s' % err)
+        sys.exit(1)
+
+    if args.validate and vs.reportValidation(vs.validateSchemas(written, vs.Catalog())):
+        sys.exit(1)
@@ -0,0 +1,118 @@
+#
+# Name: nameSpaceScopes.py
+#
+# Purpose: To follow the namespace prefixes in scope while a schema is parsed, so that the
+#          post-processing can use one prefix map for the whole schema.
+#
+# XML allows a prefix to be bound to one namespace on the schema element and to another on
+# some element within it, for that element and its descendants. The serialized schema keeps
+# only the schema element's declarations, and the fixers look QNames up in one map. So, as
+# the schema is parsed, within an element that binds a prefix other than as the schema
+# element does, the QNames in type=, ref=, base=, substitutionGroup=, itemType= and
+# memberTypes= attributes are rewritten to a prefix the schema element binds to the same
+# namespace. If there is none, the prefix is declared on the schema element after all, or,
+# if the schema element has it already, an alias (e.g. 'gml1') is.
+#
+# The document map is the schema element's declarations and those added to it. Every QName
+# in the tree resolves against it; resolveQName() gives the namespace and local name of one.
+# A default namespace anywhere is noted in the document map, as the fixers skip such schemas.
+#
+QNAMES = ['type', 'ref', 'base', 'substitutionGroup', 'itemType']
+QNAMELISTS = ['memberTypes']
+
+def resolveQName(value, nameSpaces):
+    #
+    # The QName as '{namespace}localName'. KeyError if its prefix is not bound.
+    prefix, colon, localName = value.rpartition(':')
+    uri = nameSpaces[prefix] if colon or '' in nameSpaces else None
+    return localName if uri is None else '{%s}%s' % (uri, localName)
+
+class NameSpaceScopes:
+    #
+    # Fed the parser's start-ns and end-ns events and each element as it starts.
+    def __init__(self):
+
+        self.document = {}
+        self.declared = None
+        self.aliases = {}
+        #
+        # The bindings within the schema that differ from the document map
+        self.rebound = []
+        self.pending = {}
+        #
+        # For each element that binds prefixes: the prefixes in scope, those that must be
+        # rewritten within it, and how many bindings end with it
+        self.scopes = [({}, {}, 0)]
+
+    def startNameSpace(self, prefix, uri):
+
+        self.pending[prefix] = uri
+
+    def endNameSpace(self):
+
+        bindings, renames, count = self.scopes.pop()
+        if count > 1:
+            self.scopes.append((bindings, renames, count - 1))
+
+    def start(self, element):
+        #
+        # Returns True for the schema element
+        if self.declared is None:
+            self.declared = dict(self.pending)
+            self.document.update(self.pending)
+            self.scopes.append((dict(self.pending), {}, len(self.pending)))
+            self.pending = {}
+            return True
+
+        if self.pending:
+            bindings, renames = dict(self.scopes[-1][0]), dict(self.scopes[-1][1])
+            for prefix, uri in self.pending.items():
+                bindings[prefix] = uri
+                renames.pop(prefix, None)
+                if prefix == '':
+                    self.document.setdefault(prefix, uri)
+                elif self.document.get(prefix) != uri:
+                    self.rebound.append((prefix, uri))
+                    alias = self._alias(prefix, uri)
+                    if alias != prefix:
+                        renames[prefix] = alias
+
+            self.scopes.append((bindings, renames, len(self.pending)))
+            self.pending = {}
+
+        renames = self.scopes[-1][1]
+        if renames:
+            self._rename(element, renames)
+
+        return False
+
+    def _alias(self, prefix, uri):
+        #
+        # A prefix of the document map bound to 'uri', added to it if need be
+        for other, value in self.document.items():
+            if value == uri and other != '':
+                return other
+
+        alias, num = prefix, 1
+        while alias in self.document:
+            alias, num = '%s%d' % (prefix, num), num + 1
+
+        self.document[alias] = self.aliases[alias] = uri
+        return alias
+
+    def _rename(self, element, renames):
+
+        for attribute in QNAMES:
+            value = element.get(attribute)
+            if value is not None and ':' in value:
+                element.set(attribute, _renamed(value, renames))
+
+        for attribute in QNAMELISTS:
+            value = element.get(attribute)
+            if value is not None and ':' in value:
+                element.set(attribute, ' '.join(_renamed(x, renames) for x in value.split()))
+
+def _renamed(value, renames):
+
+    prefix, colon, localName = value.partition(':')
+    return '%s:%s' % (renames[prefix], localName) if colon and prefix in renames else value
@@ -10,144 +10,323 @@
 #
 # Code prerequsites: Python version >2.7 installed on local machine
 #
-import os, re, sys
-try:
-    import configparser as cp
-except ImportError:
-    import ConfigParser as cp
-    
+import concurrent.futures, contextlib, filecmp, glob, hashlib, io, marshal, os, re, sys
 import xml.etree.ElementTree as ET
+import buildManifest as bm
+import checkpointEA as ck
+import compileRules as cr
+import profileEA as pr
+import reachability as ra
+import nameSpaceScopes as nsc
+import symbolTable as st
+import treeBackend as tb
+import validateSchemas as vs
 import xmlpp
-from lxml import etree
 #
-def parseAndGetNameSpaces(fname,References={}):
+def parseAndGetNameSpaces(fname,References={},backend=tb.ETREE):
+    #
+    root, declared, ns = parseSchema(fname,backend,References)
+    return root, ns
+
+def parseSchema(fname,backend=tb.ETREE,References=None):
     #
-    events = 'start','start-ns'
+    # Returns the tree, the namespaces to declare on the schema element and the document's
+    # prefix map (see nameSpaceScopes.py). Prefixes bound within the schema, to other
+    # namespaces than on the schema element, are followed as it is parsed. Given the required
+    # imports, References, the namespaces are declared on the schema element as soon as it
+    # has been read; otherwise nothing is changed, so that the tree may be shared by several
+    # rule plans. A schema with a default namespace is not processed, so it is not read
+    # beyond its schema element.
+    events = 'start','start-ns','end-ns'
+    scopes = nsc.NameSpaceScopes()
     root = None
-    ns = {}
-    requiredNS = list(References)
     #
-    for event, elem in ET.iterparse(fname,events):
+    for event, elem in backend.iterparse(fname,events):
         if event == 'start-ns':
-            if elem[0] in ns and ns[elem[0]] != elem[1]:
-                #
-                # NOTE: It is perfectly valid to have the same prefix refer
-                #       to different URI namespaces in different parts of the
-                #       document. This exception serves as a reminder that
-                #       this solution is not robust.
-                raise KeyError("Duplicate prefix with different URI found.")
+            scopes.startNameSpace(*elem)
             
-            ns[elem[0]] = elem[1]
+        elif event == 'end-ns':
+            scopes.endNameSpace()
             
-        elif event == 'start' and root == None:
+        elif scopes.start(elem):
             root = elem
-            for prefix, uri in ns.items():
-                if prefix not in ['xs','']:
-                    root.set('xmlns:%s' % prefix, uri)
+            if '' in scopes.document:
+                break
+            if References is not None:
+                declareNameSpaces(root,scopes.declared,References,backend)
+                
+    for prefix, uri in scopes.rebound:
+        print('Prefix "%s" bound to %s within %s' % (prefix,uri,os.path.basename(fname)))
+        
+    declared = dict(scopes.declared)
+    declared.update(scopes.aliases)
+    if References is not None:
+        for prefix, uri in scopes.aliases.items():
+            backend.declareNamespace(root,prefix,uri)
+            
+    return root, declared, scopes.document
 
-                try:
-                    requiredNS.pop(requiredNS.index(prefix))
-                except ValueError:
-                    pass                    
+def declareNameSpaces(root,ns,References,backend=tb.ETREE):
+    #
+    # The schema element's own namespaces, then those of the required imports it lacks
+    requiredNS = list(References)
+    for prefix, uri in ns.items():
+        if prefix not in ['xs','']:
+            backend.declareNamespace(root,prefix,uri)
+
+        try:
+            requiredNS.pop(requiredNS.index(prefix))
+        except ValueError:
+            pass                    
 
     while True:
         try:
             key = requiredNS.pop()
             uri = References[key].split()[0]
-            root.set("xmlns:%s" % key, uri)
+            backend.declareNamespace(root,key,uri)
 
         except IndexError:
             break
-
-    return root, ns
     
 def fixCodeLists(root,nameSpaces,codeListsDic):
     #
     # Construct attribute string in element
-    codeListList=[(x.get('name'),x) for x in root.iterfind('.//xs:element[@type="gml:CodeType"]', nameSpaces)]
-    codeListElements = {}
-
-    for key, value in codeListList:
-        codeListElements.setdefault(key, []).append(value)
-        
-    allCodeListNames=list(codeListElements.keys())
-    
-    for key,value in codeListsDic.items():
-        try:
-            for m in codeListElements[key]:
-                m.attrib['type'] = value
-                
-            allCodeListNames.pop(allCodeListNames.index(key))
-            
-        except KeyError:
-            print('fixCodeLists: No match for code list KVP: %s,%s' % (key,value))
-            
-    if len(allCodeListNames) > 0:
-        print('fixCodeLists: Unprocessed gml:CodeType(s) in schema: %s' % ' '.join(allCodeListNames))
+    applyRules(root,nameSpaces,{'codeLists':codeListsDic})
               
 def changeElement(root,nameSpaces,changeDic,attribute):
     #
     # Construct attribute string in element
-    searchString = './/xs:element[@%s="%%s"]' % attribute
-    for key,value in changeDic.items():
-        matches=[x for x in root.iterfind( searchString % key, nameSpaces)]
-        if len(matches) == 0:
-            print('changeElement: No match for %s: %s,%s' % (attribute,key,value))
-        #
-        # For any matches found, change the data type attribute
-        for m in matches:
-            m.attrib[attribute]=value
+    applyRules(root,nameSpaces,{ruleSections[attribute]:changeDic})
     
 def setNilElements(root,elementList,nameSpaces):
 
-    searchString = './/xs:element[@name="%s"]'
-    for elementName in elementList:
-        matches=[x for x in root.iterfind( searchString % elementName, nameSpaces)]
-        #
-        # For any matches found, change the data type attribute
-        if len(matches) == 0:
-            print('setNilElements: No match for %s' % (elementName))
-            
-        for m in matches:
-            m.attrib['nillable']='true'
+    applyRules(root,nameSpaces,{'setNilAttribute':elementList})
 
 def setCommentsForAttributes(root,documentation,nameSpaces):
 
-    for aName, aDocString in documentation.items():
-        searchString = './/xs:attribute[@name="%s"]' % aName
-        attribute = root.find( searchString, nameSpaces)
-        if attribute != None and len(attribute) == 0:
-            child = ET.Element('xs:annotation')
-            child1 = ET.SubElement(child, 'xs:documentation')
-            child1.text = aDocString
-            attribute.append(child)
-        elif attribute == None:
-            print('Missing attribute in schema: %s' % aName)
+    applyRules(root,nameSpaces,{'attributeDocStrings':documentation})
             
 def applyAdjustments(root,adjustmentDic,nameSpaces):
 
-    for action in adjustmentDic:
-        searchString = './/xs:element[@%s="%s"]' % (action['kind'],action['value'])
-        element = root.find( searchString, nameSpaces)
-        if element is None:
-            print('Search string failed: %s' % searchString)
-            continue
-        
-        for attrbName, attrbValue in zip(action['attributes'].split(','),
-                                         action['values'].split(',')):
-            element.attrib[attrbName] = attrbValue
+    applyRules(root,nameSpaces,{'adjustments':[(action['kind'],action['value'],
+                                                list(zip(action['attributes'].split(','),
+                                                         action['values'].split(','))))
+                                               for action in adjustmentDic]})
 
 def fixBaseExtensions(root,baseExtensionsDic,nameSpaces):
     #
     # Search schema looking for keys
-    for key,value in baseExtensionsDic.items():
-        matches=[x for x in root.iterfind('.//xs:extension[@base="%s"]'% key, nameSpaces)]
-        if len(matches) == 0:
-            print('No match for %s' % (key))
+    applyRules(root,nameSpaces,{'baseExtensions':baseExtensionsDic})
+#
+# Element attribute rewritten by each of the rename sections in the configuration file
+ruleSections = {'type':'dataTypes','substitutionGroup':'substitutionGroups'}
+
+def _chainRenames(changeDic):
+    #
+    # The rename rules were once applied one key after another over the whole schema, so
+    # a value that is also a later key gets renamed again. Resolve those chains up front:
+    # key -> (final value, keys along the way)
+    order = dict((key,num) for num, key in enumerate(changeDic))
+    chains = {}
+    for key, num in order.items():
+        value, keys = changeDic[key], [key]
+        while order.get(value,-1) > num:
+            num = order[value]
+            keys.append(value)
+            value = changeDic[value]
+            
+        chains[key] = (value, keys)
+        
+    return chains
+
+def applyRules(root,nameSpaces,rules,symbols=None):
+    #
+    # One traversal of the schema applies, in order, the [dataTypes], [codeLists],
+    # [substitutionGroups], [baseExtensions], [setNilAttribute], [attributeDocStrings]
+    # and [adjustmentN] rules to each element. Matches are tallied so that the "No match"
+    # diagnostics are reported afterwards, in the same order as before. Returns the number
+    # of matched and unmatched rules in each section. The symbol table, if any, is kept up to
+    # date with the changes.
+    #
+    engine = RuleEngine(nameSpaces,rules,symbols)
+    engine.apply(root)
+    return engine.report()
+
+class RuleEngine:
+    #
+    # The rules of applyRules(), applied to one part of the schema after another (in streaming
+    # mode, one top-level element at a time) and reported on once all parts are done.
+    def __init__(self,nameSpaces,rules,symbols=None):
+
+        self.nameSpaces = nameSpaces
+        self.rules = rules
+        self.setAttribute = _setAttribute if symbols is None else symbols.set
+        self.append = _append if symbols is None else symbols.append
+        self.elementTag = '{%s}element' % nameSpaces['xs']
+        self.extensionTag = '{%s}extension' % nameSpaces['xs']
+        self.attributeTag = '{%s}attribute' % nameSpaces['xs']
+    
+        self.renames = dict((attribute,(_chainRenames(rules[section]),set()))
+                            for attribute, section in ruleSections.items() if section in rules)
+        self.codeListsDic = rules.get('codeLists')
+        self.codeListNames = {}
+        self.baseChains = _chainRenames(rules.get('baseExtensions',{}))
+        self.baseMatched = set()
+        self.nilNames = set(rules.get('setNilAttribute',[]))
+        self.nilMatched = set()
+        self.docStrings = rules.get('attributeDocStrings',{})
+        self.docAttributes = {}
+        #
+        # Adjustments, indexed by (attribute, value). Each one is applied to the first match only.
+        self.adjustments = rules.get('adjustments',[])
+        self.adjustmentIndex = {}
+        for num, (kind, value, changes) in enumerate(self.adjustments):
+            self.adjustmentIndex.setdefault((kind,value),[]).append(num)
+        self.adjustmentKinds = set(kind for kind, value in self.adjustmentIndex)
+        self.applied = set()
+
+    def apply(self,root):
+
+        renames = self.renames
+        codeListsDic = self.codeListsDic
+        codeListNames = self.codeListNames
+        nilNames = self.nilNames
+        adjustments = self.adjustments
+        adjustmentIndex = self.adjustmentIndex
+        applied = self.applied
+        docStrings = self.docStrings
+        setAttribute = self.setAttribute
+        found = {}
+        
+        for element in root.iter():
+        
+            if element.tag == self.elementTag:
+                for attribute, (chains, matched) in renames.items():
+                    try:
+                        value, keys = chains[element.attrib[attribute]]
+                        setAttribute(element,attribute,value)
+                        matched.update(keys)
+                    except KeyError:
+                        pass
+
+                if codeListsDic is not None and element.get('type') == 'gml:CodeType':
+                    name = element.get('name')
+                    codeListNames.setdefault(name,True)
+                    try:
+                        setAttribute(element,'type',codeListsDic[name])
+                        codeListNames[name] = False
+                    except KeyError:
+                        pass
+                
+                if element.get('name') in nilNames:
+                    element.attrib['nillable'] = 'true'
+                    self.nilMatched.add(element.get('name'))
+
+                pos = -1
+                while adjustmentIndex:
+                    pending = [num for kind in self.adjustmentKinds
+                               for num in adjustmentIndex.get((kind,element.get(kind)),[])
+                               if num > pos and num not in applied]
+                    if len(pending) == 0:
+                        break
+
+                    pos = min(pending)
+                    applied.add(pos)
+                    for attrbName, attrbValue in adjustments[pos][2]:
+                        setAttribute(element,attrbName,attrbValue)
+
+            elif element.tag == self.extensionTag:
+                try:
+                    value, keys = self.baseChains[element.attrib['base']]
+                    setAttribute(element,'base',value)
+                    self.baseMatched.update(keys)
+                except KeyError:
+                    pass
+
+            elif element.tag == self.attributeTag and element.get('name') in docStrings:
+                if element.get('name') not in self.docAttributes:
+                    found.setdefault(element.get('name'),element)
+        #
+        # Attributes' documentation strings, added outside of the traversal to the first
+        # attribute of each name
+        self.docAttributes.update(found)
+        for aName, aDocString in docStrings.items():
+            attribute = found.get(aName)
+            if attribute != None and len(attribute) == 0:
+                child = attribute.makeelement('{%s}annotation' % self.nameSpaces['xs'],{})
+                child1 = child.makeelement('{%s}documentation' % self.nameSpaces['xs'],{})
+                child1.text = aDocString
+                child.append(child1)
+                self.append(attribute,child)
+
+    def report(self):
+        #
+        # Report rules that found nothing to change
+        rules = self.rules
+        renames = self.renames
+        codeListsDic = self.codeListsDic
+        codeListNames = self.codeListNames
+        _reportRenames(rules,renames,'type')
+    
+        if codeListsDic is not None:
+            for key,value in codeListsDic.items():
+                if key not in codeListNames:
+                    print('fixCodeLists: No match for code list KVP: %s,%s' % (key,value))
+
+            unprocessed = [name for name, unmatched in codeListNames.items() if unmatched]
+            if len(unprocessed) > 0:
+                print('fixCodeLists: Unprocessed gml:CodeType(s) in schema: %s' % ' '.join(unprocessed))
+
+        _reportRenames(rules,renames,'substitutionGroup')
+                        
+        for key in rules.get('baseExtensions',{}):
+            if key not in self.baseMatched:
+                print('No match for %s' % (key))
+
+        for elementName in rules.get('setNilAttribute',[]):
+            if elementName not in self.nilMatched:
+                print('setNilElements: No match for %s' % (elementName))
+
+        for aName in self.docStrings:
+            if aName not in self.docAttributes:
+                print('Missing attribute in schema: %s' % aName)
+
+        for num, (kind, value, changes) in enumerate(self.adjustments):
+            if num not in self.applied:
+                print('Search string failed: %s' % './/xs:element[@%s="%s"]' % (kind,value))
         #
-        # For any matches found, change the base value
-        for m in matches:
-            m.attrib['base']=value
+        # Tally of matched and unmatched rules, by section
+        matches = {'codeLists':[key for key in codeListsDic or {} if key in codeListNames],
+                   'baseExtensions':self.baseMatched,'setNilAttribute':self.nilMatched,
+                   'attributeDocStrings':self.docAttributes,'adjustments':self.applied}
+        for attribute, (chains, matched) in renames.items():
+            matches[ruleSections[attribute]] = matched
+        
+        tally = {}
+        for section, rule in rules.items():
+            matched = len(set(matches.get(section,[])))
+            total = len(set(rule)) if section == 'setNilAttribute' else len(rule)
+            tally[section] = {'matched':matched,'unmatched':total - matched}
+        if codeListsDic is not None:
+            tally['codeLists']['unprocessed'] = len(unprocessed)
+
+        return tally
+
+def _setAttribute(element,attribute,value):
+
+    element.attrib[attribute] = value
+
+def _append(parent,element):
+
+    parent.append(element)
+
+def _reportRenames(rules,renames,attribute):
+
+    if attribute in renames:
+        chains, matched = renames[attribute]
+        for key,value in rules[ruleSections[attribute]].items():
+            if key not in matched:
+                print('changeElement: No match for %s: %s,%s' % (attribute,key,value))
 
 def fixIncludes(root,requiredIncludes,nameSpaces):
 
@@ -174,11 +353,11 @@ def fixIncludes(root,requiredIncludes,nameSpaces):
                 break
             
         for include in requiredIncludes:
-            root.insert(pos,ET.Element('{%s}include' % nameSpaces['xs']))
+            root.insert(pos,root.makeelement('{%s}include' % nameSpaces['xs'],{}))
             root[pos].set('schemaLocation', include)
             pos += 1
    
-def fixImports(root,requiredImports,nameSpaces):
+def fixImports(root,requiredImports,nameSpaces,backend=tb.ETREE):
     #
     # Get import elements already in the document
     importDictionary = {}
@@ -216,7 +395,7 @@ def fixImports(root,requiredImports,nameSpaces):
         element.set('namespace', uri)
         element.set('schemaLocation', schemaLocation)
         if key not in nameSpaces:
-            root.set('xmlns:%s' % key, namespace)            
+            backend.declareNamespace(root,key,uri)
     #
     # If all needed and required namespaces are imported and there are extra imports, remove them
     if len(notFound) == 0 and len(delQueue) > 0:
@@ -239,7 +418,7 @@ def fixImports(root,requiredImports,nameSpaces):
             try:
                 new = delQueue.pop()
             except IndexError:
-                new = ET.Element('{%s}import' % nameSpaces['xs'])
+                new = root.makeelement('{%s}import' % nameSpaces['xs'],{})
             
             uri, schemaLocation = requiredImports[key].split()            
 
@@ -249,12 +428,13 @@ def fixImports(root,requiredImports,nameSpaces):
             root.insert(insertPoint,new)
             insertPoint += 1
             
-            root.set('xmlns:%s' % key, uri)            
+            backend.declareNamespace(root,key,uri)
     
-def removeAbstractMemberTypes(root,nameSpaces,parentChildMap):
+def removeAbstractMemberTypes(symbols,nameSpaces):
     #
     removes = []
-    matches=[x for x in root.iterfind('.//xs:extension[@base="gml:AbstractMemberType"]', nameSpaces)]
+    matches=[x for x in symbols.referrers('base','gml:AbstractMemberType')
+             if x.tag == '{%s}extension' % nameSpaces['xs']]
     #
     for abstractMemberElement in matches:
         #
@@ -264,12 +444,12 @@ def removeAbstractMemberTypes(root,nameSpaces,parentChildMap):
             newElementType = '%sType' % target.attrib.get('ref')
             #
             # Ascend the tree . . .
-            parent = parentChildMap[abstractMemberElement]
+            parent = symbols.parent(abstractMemberElement)
             while not parent.tag.endswith('element'):
-                parent = parentChildMap[parent]
+                parent = symbols.parent(parent)
             #
             # Give parent element a new attribute 'type'
-            parent.attrib['type'] = newElementType
+            symbols.set(parent,'type',newElementType)
             #
             # This <complexType> element now slated for removal.
             removes.extend([c for c in parent if c.tag.endswith('complexType')])
@@ -277,123 +457,202 @@ def removeAbstractMemberTypes(root,nameSpaces,parentChildMap):
         except KeyError:
             pass
         
-    removeChildren(removes,parentChildMap)
+    for child in removes:
+        symbols.remove(child)
 
-def removeGMLAbstractFeatures(root,nameSpaces,parentChildMap,ignoreElementNames):
+def removeGMLAbstractFeatures(symbols,nameSpaces,ignoreElementNames):
     #
-    matches=[x for x in root.iterfind('.//xs:element[@substitutionGroup="gml:AbstractFeature"]', nameSpaces)
-             if x.get('name') not in ignoreElementNames]
+    # The complexType of each feature element is looked up in the symbol table, not searched for.
+    matches=[x for x in symbols.referrers('substitutionGroup','gml:AbstractFeature')
+             if x.tag == '{%s}element' % nameSpaces['xs'] and x.get('name') not in ignoreElementNames]
     #
     for x in matches:
-        try:
-            name = x.get('type').split(':')[1]
-        except IndexError:
-            name = x.get('type')
-            
-        target = root.find('.//xs:complexType[@name="%s"]' % name,nameSpaces)
-        complexContent = list(target).pop()
-        extension = list(complexContent).pop()
-        
-        if complexContent.tag != '{%s}complexContent' % nameSpaces['xs'] or \
-           extension.tag != '{%s}extension' % nameSpaces['xs'] or \
-           extension.attrib['base'] != 'gml:AbstractFeatureType':
+        target = symbols.find('complexType',_featureTypeName(x))
+        if target is None:
+            continue
+        complexContent = _abstractFeatureContent(target,nameSpaces)
+        if complexContent is None:
             continue
         #
         # With these two lines we remove <complexContent> and <extension> elements from the parent "complexType".
         # The children of the <extension> are appended to <complexType> instead, replacing <complexContent>.
         #
-        target.remove(complexContent)
-        target.extend(list(extension))
-        del x.attrib['substitutionGroup']
-        
-def cleanUpTree(root,nameSpaces,parentChildMap,ignoreElementNames):
-    #
-    # EA generates code for class objects or instances which we don't want in the final schema.
-    badChildren = []    
-    for child in root.iterfind('.//xs:element[@name=""]', nameSpaces):
-        badChildren.append(child)
+        symbols.remove(complexContent)
+        symbols.extend(target,list(complexContent).pop())
+        symbols.set(x,'substitutionGroup',None)
+
+def _featureTypeName(x):
+    
+    try:
+        return x.get('type').split(':')[1]
+    except IndexError:
+        return x.get('type')
+
+def _abstractFeatureContent(target,nameSpaces):
     #
-    # then remove them.
-    removeChildren(badChildren,parentChildMap)
+    # The <complexContent> of a complexType that does no more than extend gml:AbstractFeatureType
+    complexContent = list(target).pop()
+    extension = list(complexContent).pop()
         
-    for child in root.iterfind('.//xs:complexType[@name="Type"]', nameSpaces):
-        badChildren.append(child)
-        
-    removeChildren(badChildren,parentChildMap)
+    if complexContent.tag != '{%s}complexContent' % nameSpaces['xs'] or \
+       extension.tag != '{%s}extension' % nameSpaces['xs'] or \
+       extension.attrib['base'] != 'gml:AbstractFeatureType':
+        return None
 
-    for child in root.iterfind('.//xs:complexType[@name="PropertyType"]', nameSpaces):
-        badChildren.append(child)
-    removeChildren(badChildren,parentChildMap)
-    #
-    # EA METCE GML Extension creates a 'gml:defaultCodeSpace' element. Not sure if this is a bug or
-    # disagreement w/ Sparx and IWXXM on how CodeLists should be implemented.
+    return complexContent
+        
+def cleanUpTree(root,nameSpaces,symbols,ignoreElementNames,profiler=pr.NULL):
     #
-    for child in root.iterfind('.//gml:defaultCodeSpace', nameSpaces):
-        badChildren.append(child)
-    removeChildren(badChildren,parentChildMap)
+    # EA generates code for class objects or instances which we don't want in the final schema.
+    # Find them all in one traversal, then remove them. The tree is changed through the symbol
+    # table (see symbolTable.py), which so stays up to date.
+    with profiler.stage('findCruft',root):
+        for child in findCruft(root,nameSpaces):
+            symbols.remove(child)
     #
     # EA METCE GML Extension creates complexTypes with 'ref'.  Remove these.
-    removeAbstractMemberTypes(root,nameSpaces,parentChildMap)
+    with profiler.stage('removeAbstractMemberTypes',root):
+        removeAbstractMemberTypes(symbols,nameSpaces)
     #
     # EA generates a number of elements that inherit from the gml AbstractFeature class. This is
     # unnecessary in most cases.
-    removeGMLAbstractFeatures(root,nameSpaces,parentChildMap,ignoreElementNames)
+    with profiler.stage('removeGMLAbstractFeatures',root):
+        removeGMLAbstractFeatures(symbols,nameSpaces,ignoreElementNames)
     #
     # Find and remove elements that do not have children, no text nor attributes.
-    while True:
-        parentChildMap = dict((c,p) for p in root.iter() for c in p)
-        empties = []
-        for child in root.iter():
-            if len(child) == 0:
-                if child.attrib == {}:
-                    if child.text == None or child.text.strip() == '':
-                        empties.append(child)
-            else:
-                if child.text != None and child.text.strip() == '':
-                    child.text = None
-            #
-            # If we find types with "xs" prefix, remove the prefix.
-            if child.attrib.get('type','')[:3] == 'xs:':
-                child.attrib['type'] = child.attrib.get('type')[3:]
-                
-        if len(empties) == 0:
+    with profiler.stage('pruneEmptyElements',root):
+        pruneEmptyElements(root,symbols)
+
+def pruneUnreachable(root,nameSpaces,plan,releaseDirectory=None):
+    #
+    # Report, or remove, the complexTypes, simpleTypes, groups, attributeGroups and attributes
+    # left that cannot be got to from the global elements, the [allowedGMLAbstractFeatures] and
+    # the names to keep (see reachability.py). The included schemas are looked for in the
+    # release directory.
+    graph = ra.ComponentGraph(nameSpaces['xs'])
+    graph.add(root,nameSpaces,own=True)
+    if 'includes' in plan and releaseDirectory is not None:
+        ra.addIncludes(graph,plan['includes'],releaseDirectory)
+
+    names = re.findall(r'[^\s,]+',plan['ignoreElementNames'] or '')
+    unreachable = graph.unreachable(names + plan['pruneUnreachable']['keep'])
+    if len(unreachable) == 0:
+        return 0
+
+    xs = len(nameSpaces['xs']) + 2
+    listed = ', '.join('%s %s' % (x.tag[xs:],x.get('name')) for x in unreachable)
+    if plan['pruneUnreachable']['mode'] == 'remove':
+        for x in unreachable:
+            root.remove(x)
+        print('pruneUnreachable: Removed unreachable component(s): %s' % listed)
+    else:
+        print('pruneUnreachable: Unreachable component(s) in schema: %s' % listed)
+
+    return len(unreachable)
+
+def findCruft(root,nameSpaces):
+    #
+    # Elements with empty names and the 'Type' and 'PropertyType' complexTypes are generated
+    # for class objects or instances. EA METCE GML Extension also creates a 'gml:defaultCodeSpace'
+    # element. Not sure if this is a bug or disagreement w/ Sparx and IWXXM on how CodeLists
+    # should be implemented.
+    #
+    isCruft = cruftTest(nameSpaces)
+    badChildren = []
+    stack = list(root)
+    while stack:
+        child = stack.pop()
+        if isCruft(child):
+            badChildren.append(child)
+        else:
+            stack.extend(child)
+
+    return badChildren
+
+def cruftTest(nameSpaces):
+    
+    elementTag = '{%s}element' % nameSpaces['xs']
+    complexTypeTag = '{%s}complexType' % nameSpaces['xs']
+    defaultCodeSpaceTag = '{%s}defaultCodeSpace' % nameSpaces.get('gml')
+
+    def isCruft(child):
+        return (child.tag == elementTag and child.get('name') == '') or \
+               (child.tag == complexTypeTag and child.get('name') in ['Type','PropertyType']) or \
+               child.tag == defaultCodeSpaceTag
+
+    return isCruft
+
+def pruneEmptyElements(root,symbols=None):
+    #
+    # One post-order sweep: an element is judged only after all of its children have been,
+    # i.e. once it may have lost its last child. Along the way, whitespace-only text is dropped
+    # from elements with children and types with the "xs" prefix lose the prefix. The symbol
+    # table, if any, is told of what changes.
+    #
+    _tidyElement(root,symbols)
+    stack = [(root, iter(list(root)), [])]
+    while stack:
+        element, children, keep = stack[-1]
+        for child in children:
+            _tidyElement(child,symbols)
+            stack.append((child, iter(list(child)), []))
             break
-        
-        badKeys = removeChildren(empties,parentChildMap)
-        for x in badKeys:
-            try:
-                del(parentChildMap[x])
-            except KeyError:
-                pass
+        else:
+            stack.pop()
+            if len(keep) != len(element):
+                if symbols is not None:
+                    kept = set(keep)
+                    for child in [child for child in element if child not in kept]:
+                        symbols.forget(child)
+                element[:] = keep
+                
+            if len(stack) == 0:
+                break
             
-def removeChildren(badChildren,parentChildMap):
+            if _isEmpty(element):
+                continue
 
-    cpy = list(badChildren)
-    while True:
-        try:
-            child = badChildren.pop()
-            parentChildMap[child].remove(child)
-            
-        except KeyError:
-            print("Should not happen")
-            pass
-        
-        except IndexError:
-            break
-        
-    return cpy
+            stack[-1][2].append(element)
 
-def main(config):
+def _isEmpty(element):
     
-    try:
-        EADirectory = config.get('location','EADirectory')
-        ReleaseDirectory = config.get('location','ReleaseDirectory')
-        
-    except cp.NoSectionError as err:
-        print(str(err))
+    return len(element) == 0 and element.attrib == {} and \
+        (element.text == None or element.text.strip() == '')
+
+def _tidyElement(element,symbols=None):
+    
+    if len(element) > 0 and element.text != None and element.text.strip() == '':
+        element.text = None
+    #
+    # If we find types with "xs" prefix, remove the prefix.
+    if element.attrib.get('type','')[:3] == 'xs:':
+        if symbols is None:
+            element.attrib['type'] = element.attrib.get('type')[3:]
+        else:
+            symbols.set(element,'type',element.attrib.get('type')[3:])
+            
+def main(config,basedir=None,force=False,manifest=True,profiler=pr.NULL,backend=tb.ETREE,stream=False,
+         checkpoints=False):
+    #
+    # 'config' is either the configuration or its rule plan from compileRules. Directories in
+    # the configuration file are relative to basedir, by default the current working directory.
+    # Unless forced, a schema is not processed again if its entry in the release directory's
+    # build manifest shows it up to date. Returns the manifest file and the new entry for it,
+    # which is written right away if 'manifest' is True. Each stage of the work is reported to
+    # the profiler (see profileEA.py). Either tree backend gives the same schema, as does
+    # streaming it (see streamSchema()) for schema exports too big to hold in memory. With
+    # 'checkpoints', the tree is saved after each stage and the next run resumes from the last
+    # stage whose inputs are the same (see checkpointEA.py).
+    plan = config if isinstance(config,dict) else cr.compileConfig(config)
+    if plan['location'] is None:
+        print(plan['locationError'])
         return
+    
+    EADirectory = plan['location']['EADirectory']
+    ReleaseDirectory = plan['location']['ReleaseDirectory']
         
-    basedir = os.getcwd()
+    if basedir is None:
+        basedir = os.getcwd()
     EADirFullPath= os.path.join(basedir,EADirectory)            
     ReleaseFullPath = os.path.join(basedir,ReleaseDirectory)
     
@@ -401,174 +660,799 @@ def main(config):
         EADirFullPath.replace('/',os.path.sep)
         ReleaseFullPath.replace('/',os.path.sep)
         
-    DefaultNamespace = config.get('schema','defaultNamespace')
     #
     # Initialization
-    schemaFile = config.get('schema','name')
+    schemaFile = plan['schema']['name']
     EASchemaFile = os.path.join(EADirFullPath,schemaFile)
     if not os.path.isfile(EASchemaFile):        
         print('Missing schema file in EA directory, %s' % EASchemaFile )
         return
     #
     outputfile = os.path.join(ReleaseFullPath,schemaFile)
-    nameSpaces = root = None
+    manifestFile = os.path.join(ReleaseFullPath,bm.MANIFEST)
+    inputs = manifestInputs(plan,EASchemaFile,ReleaseFullPath)
+    if not force and bm.isUpToDate(manifestFile,schemaFile,inputs,outputfile):
+        print('%s is up to date' % schemaFile)
+        return
+    
+    checkpoints = ck.Checkpoints(plan,EASchemaFile,inputs['schema'],codeDigest(),backend) if checkpoints else ck.NULL
+    with profiler.product(schemaFile):
+        if stream:
+            digest = streamSchema(plan,EASchemaFile,outputfile,profiler,backend,checkpoints)
+        else:
+            digest = buildSchema(plan,EASchemaFile,outputfile,profiler,backend,checkpoints)
+    
+    if digest is None:
+        return
+    
+    inputs['output'] = digest
+    if manifest:
+        bm.updateManifest(manifestFile,{schemaFile:inputs})
+        
+    return manifestFile, {schemaFile:inputs}
+
+def buildSchema(plan,EASchemaFile,outputfile,profiler=pr.NULL,backend=tb.ETREE,checkpoints=ck.NULL):
+    #
+    # Returns the digest of the schema written, or None if it is not to be released.
+    data = processSchema(plan,EASchemaFile,profiler,backend,checkpoints=checkpoints,
+                         releaseDirectory=os.path.dirname(outputfile))
+    if data is None:
+        return
+    #
+    # Write out the modified EA schema, once, and only if it changed.
+    with profiler.stage('writeSchema'):
+        writeSchema(outputfile,data)
+        
+    return bm.dataDigest(data)
+
+def processSchema(plan,EASchemaFile,profiler=pr.NULL,backend=tb.ETREE,parsed=None,checkpoints=ck.NULL,
+                  releaseDirectory=None):
+    #
+    # Returns the post-processed schema, serialized, or None if it is not to be released.
+    # The schema is held in the backend's kind of tree (see treeBackend.py). 'parsed' is the
+    # EA schema as parseSchema() returns it, if it has been read already; it is changed.
+    # With checkpoints (see checkpointEA.py), the stages done already, with the same inputs,
+    # are not done again. The schemas it includes are read from 'releaseDirectory' if it
+    # prunes unreachable components.
+    #
+    if checkpoints is not ck.NULL:
+        with profiler.stage('resumeCheckpoint'):
+            resumed = checkpoints.resume()
+        if resumed is not None:
+            stage, root, nameSpaces = resumed
+            print('%s resumed after %s' % (plan['schema']['name'],stage))
     #
     # Make required changes to EA schema files to be fully compliant.
     # Extract namespace prefixes and URIs in the EA output and check to make sure
     # the mandatory ones are included in the altered, changed schema
     #
-    try:
-        schemaNamespaces = dict(config.items('imports'))
-        root, nameSpaces = parseAndGetNameSpaces(EASchemaFile,schemaNamespaces)
-        fixImports(root,schemaNamespaces,nameSpaces)
-        
-    except cp.NoSectionError:
-        root, nameSpaces = parseAndGetNameSpaces(EASchemaFile)
-        #
-        # If a default namespace is present, then don't process further.
+    if not checkpoints.done('parseAndGetNameSpaces'):
+        with profiler.stage('parseAndGetNameSpaces'):
+            if parsed is None:
+                root, declared, nameSpaces = parseSchema(EASchemaFile,backend,plan.get('imports',{}))
+            else:
+                root, declared, nameSpaces = parsed
+                if "" not in nameSpaces:
+                    declareNameSpaces(root,declared,plan.get('imports',{}),backend)
+        checkpoints.save('parseAndGetNameSpaces',root,nameSpaces)
+    #
+    # If a default namespace is present, then don't process further.
     if "" in nameSpaces:
         return
         
-    try:
-        includeEntries = [x[1] for x in config.items('includes')]
-        fixIncludes(root,includeEntries,nameSpaces)
-
-    except cp.NoSectionError:
-        pass
+    if 'imports' in plan and not checkpoints.done('fixImports'):
+        with profiler.stage('fixImports',root):
+            fixImports(root,plan['imports'],nameSpaces,backend)
+        checkpoints.save('fixImports',root,nameSpaces)
+        
+    if 'includes' in plan and not checkpoints.done('fixIncludes'):
+        with profiler.stage('fixIncludes',root):
+            fixIncludes(root,list(plan['includes']),nameSpaces)
+        checkpoints.save('fixIncludes',root,nameSpaces)
 
-    try:
-        ignoreElementNames = config.get('allowedGMLAbstractFeatures','names')
-    except cp.NoSectionError:
-        ignoreElementNames = []
+    ignoreElementNames = plan['ignoreElementNames']
     #
-    # Important dictionary for traversing the EA schema document
-    parentChildMap = dict((c,p) for p in root.iter() for c in p)
+    # Important dictionary for traversing the EA schema document: its named components, what
+    # refers to them and the parent of each element
+    symbols = st.SymbolTable(root,nameSpaces)
 
     #
     # With instance or object diagrams in the Model, lots of cruft is generated as
     # well. Perhaps there's a way to turn this off in EA. The rest of the 'fix' routines
     # are cleaning up residual issues.
     
-    cleanUpTree(root,nameSpaces,parentChildMap,ignoreElementNames)
+    if not checkpoints.done('cleanUpTree'):
+        with profiler.stage('cleanUpTree',root):
+            cleanUpTree(root,nameSpaces,symbols,ignoreElementNames,profiler)
+        checkpoints.save('cleanUpTree',root,nameSpaces)
 
     #
-    # Fix elements' types as needed/configured
-    try:
-        dataTypesDic = dict([tuple(x[1].split()) for x in config.items('dataTypes')])
-        changeElement(root,nameSpaces,dataTypesDic,'type')
+    # Fix elements' types, code lists, substitution groups, GML base extensions, nillable
+    # attributes, attributes' documentation strings and one-off adjustments as
+    # needed/configured. EA omits nillable attributes and attributes' documentation strings.
+    if not checkpoints.done('applyRules'):
+        with profiler.stage('applyRules',root):
+            profiler.record('rules',applyRules(root,nameSpaces,plan['rules'],symbols))
+        checkpoints.save('applyRules',root,nameSpaces)
+    #
+    # One-off python code instructions for UML->XML realization, with ET being the backend's
+    with profiler.stage('addendums',root):
+        for cmd in plan['addendums']:
+            try:
+                exec(cmd,dict(globals(),ET=backend.ET),locals())
+            except (KeyError, ValueError) as err:
+                #
+                # Addendums written for ElementTree may set or pop literal 'xmlns:prefix'
+                # attributes, which lxml does not have
+                if backend is tb.ETREE or 'xmlns:' not in str(err):
+                    raise
+                raise err.__class__('%s: with --backend %s, addendums must use backend.declareNamespace() '
+                                    'and backend.undeclareNamespace() instead of xmlns: attributes' %
+                                    (err,backend.name)) from err
+    #
+    # Whatever EA, the rules and the addendums have left that nothing refers to
+    if 'pruneUnreachable' in plan:
+        with profiler.stage('pruneUnreachable',root):
+            profiler.record('unreachable',pruneUnreachable(root,nameSpaces,plan,releaseDirectory))
+    #
+    # For some reason EA does not implement tag "attributeFormDefault" as a attribute
+    # to the root element, need to add it here.
+    #
+    if root.get('attributeFormDefault') == None:
+        root.set('attributeFormDefault','unqualified')
 
-    except cp.NoSectionError:
-        pass
+    with profiler.stage('serializeTree'):
+        xmltext = serializeTree(root,plan['schema']['defaultNamespace'],backend)
+    with profiler.stage('xmlpp.pprint'):
+        return prettifySchema(xmltext)
+
+def manifestInputs(plan,EASchemaFile,ReleaseFullPath):
     #
-    # Fix elements that refer to code lists
-    try:
-        codeListsDic = dict(config.items('codeLists'))
-        fixCodeLists(root,nameSpaces,codeListsDic)
+    # What the schema is built from: the EA schema, the configuration, this code and, so that
+    # a schema is rebuilt when one of them changes, the released schemas it includes.
+    inputs = {'schema':bm.fileDigest(EASchemaFile),
+              'config':plan['digest'],
+              'code':codeDigest()}
+    if 'includes' in plan:
+        inputs['includes'] = dict((x,bm.fileDigest(os.path.join(ReleaseFullPath,x)))
+                                  for x in plan['includes'])
+    if len(localImports(plan)):
+        inputs['imports'] = dict((x,bm.fileDigest(os.path.join(ReleaseFullPath,x)))
+                                 for x in localImports(plan))
 
-    except cp.NoSectionError:
-        pass
+    return inputs
+
+_codeDigest = []
+
+def codeDigest():
+    
+    if len(_codeDigest) == 0:
+        _codeDigest.append(bm.filesDigest([os.path.abspath(__file__),cr.__file__,nsc.__file__,ra.__file__,
+                                           st.__file__,tb.__file__,xmlpp.__file__]))
+        
+    return _codeDigest[0]
+#
+# From stackoverflow 'nbolton'
+textnode_re = re.compile(r'>\n\s+([^<>\s].*?)\n\s+</', re.DOTALL)
+
+def serializeTree(root,DefaultNamespace,backend=tb.ETREE):
     #
-    # Fix substitution groups
-    try:
-        subGroupsDic = dict(config.items('substitutionGroups'))
-        changeElement(root,nameSpaces,subGroupsDic,'substitutionGroup')
+    # EA does not output the default namespace at the moment; the backend sets it.
+    return backend.serialize(root,DefaultNamespace)
 
-    except cp.NoSectionError:
-        pass
+def prettifySchema(xmltext):
+    
+    output = io.StringIO()
+    xmlpp.pprint(xmltext.replace('" />','"/>'),output,indent=4)
+    prettyXml = textnode_re.sub(r'>\g<1></',output.getvalue())
+    
+    return prettyXml.encode('UTF-8')
+
+def writeSchema(outputfile,data):
     #
-    # Fix objects that inherit/extend existing GML types
+    # Leave an up-to-date schema file alone; otherwise replace it atomically.
     try:
-        baseExtensionsDic = dict(config.items('baseExtensions'))
-        fixBaseExtensions(root,baseExtensionsDic,nameSpaces)
-
-    except cp.NoSectionError:
+        with open(outputfile,'rb') as fh:
+            if fh.read() == data:
+                return False
+            
+    except (IOError, OSError):
         pass
-    #
-    # Bug in EA: Does not insert nillable attribute when nillable='true' in EA UML model.
+
+    tmpfile = '%s.%d.tmp' % (outputfile,os.getpid())
     try:
-        nilledElements = config.get('setNilAttribute','names').split(',')
-        setNilElements(root,nilledElements,nameSpaces)
+        with open(tmpfile,'wb') as fh:
+            fh.write(data)
+        os.replace(tmpfile,outputfile)
+        
+    finally:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+    
+    return True
 
-    except cp.NoSectionError:
-        pass
+#
+# Streaming mode, for EA exports too big to hold in memory as a tree. The schema is read
+# twice. The first pass notes only what the cleanup of one part of the schema needs to
+# know of the others: the namespaces and the complexTypes that removeGMLAbstractFeatures()
+# flattens. In the second, each top-level element is cleaned up, has the rules applied
+# and is pretty-printed as soon as it has been parsed, and is then dropped. The schema is
+# the same as processSchema()'s, provided the imports and includes come before all else,
+# as EA writes them. Always done with ElementTree.
+#
+def streamSchema(plan,EASchemaFile,outputfile,profiler=pr.NULL,backend=tb.ETREE,checkpoints=ck.NULL):
+    #
+    # Returns the digest of the schema written, or None if it is not to be released. Schemas
+    # with addendums, which may change any part of the tree, are processed in memory, with
+    # the checkpoints, if any; streamed schemas have none.
+    with profiler.stage('indexFeatureTypes'):
+        nameSpaces, claimed, foreign, rebound = indexFeatureTypes(EASchemaFile,plan['ignoreElementNames'])
     #
-    # Bug in EA: Attributes' documentation strings are not inserted into schema.
+    # If a default namespace is present, then don't process further.
+    if "" in nameSpaces:
+        return
+    
+    reason = None
+    if len(plan['addendums']):
+        reason = 'has addendums'
+    elif foreign:
+        reason = 'has elements or attributes in namespace(s) %s' % ' '.join(sorted(foreign))
+    elif rebound:
+        reason = 'binds prefix(es) %s within it' % ' '.join(sorted(set(prefix for prefix, uri in rebound)))
+    elif 'pruneUnreachable' in plan:
+        reason = 'prunes unreachable components'
+        
+    if reason is not None:
+        print('%s %s, not streamed' % (plan['schema']['name'],reason))
+        return buildSchema(plan,EASchemaFile,outputfile,profiler,backend,checkpoints)
+    
+    tmpfile = '%s.%d.tmp' % (outputfile,os.getpid())
     try:
-        attributeDocStringsDic = dict(config.items('attributeDocStrings'))
-        setCommentsForAttributes(root,attributeDocStringsDic,nameSpaces)
+        with profiler.stage('streamSchema'):
+            with open(tmpfile,'wb') as fh:
+                output = PrettyOutput(fh)
+                schema = SchemaStream(plan,EASchemaFile,nameSpaces,claimed,output)
+                xmlpp.pprint(schema,output,indent=4)
+                output.flush()
+                
+        profiler.record('rules',schema.engine.report())
+        #
+        # Replace the schema file only if it changed.
+        with profiler.stage('writeSchema'):
+            if not (os.path.isfile(outputfile) and filecmp.cmp(tmpfile,outputfile,shallow=False)):
+                os.replace(tmpfile,outputfile)
+            
+    finally:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+            
+    return output.digest.hexdigest()
 
-    except cp.NoSectionError:
-        pass
+def indexFeatureTypes(EASchemaFile,ignoreElementNames):
     #
-    # One-off for issues than cannot be represented in the UML->XML realization
-    try:
-        adjustmentDic = [dict(config.items('adjustment%d' % num))
-                         for num in range(int(config.get('adjustments','number')))]
-        applyAdjustments(root,adjustmentDic,nameSpaces)
+    # First pass of streamSchema(). Returns the namespaces of the whole schema; the names of
+    # the complexTypes that removeGMLAbstractFeatures() flattens, i.e. the first one of each
+    # name that does no more than extend gml:AbstractFeatureType, if it is the type of a
+    # feature element; and the namespaces, other than the schema's, of the elements and
+    # attributes left after cleanup; and the prefixes bound again within the schema.
+    scopes = nsc.NameSpaceScopes()
+    ns = scopes.document
+    root = None
+    depth = cruftDepth = 0
+    firsts = {}
+    features = set()
+    foreign = set()
+    #
+    for event, elem in ET.iterparse(EASchemaFile,('start','end','start-ns','end-ns')):
+        if event == 'start-ns':
+            scopes.startNameSpace(*elem)
+            continue
+        
+        if event == 'end-ns':
+            scopes.endNameSpace()
+            continue
+        
+        if event == 'start':
+            depth += 1
+            if scopes.start(elem):
+                root = elem
+                isCruft = cruftTest(ns)
+                elementTag = '{%s}element' % ns['xs']
+                complexTypeTag = '{%s}complexType' % ns['xs']
+                known = set([ns['xs'],XMLNS])
+                
+            elif cruftDepth == 0 and isCruft(elem):
+                cruftDepth = depth
+                
+            elif cruftDepth == 0:
+                foreign.update(_namespaceOf(name) for name in [elem.tag] + elem.keys()
+                               if name[:1] == '{' and _namespaceOf(name) not in known)
+                if elem.tag == complexTypeTag:
+                    firsts.setdefault(elem.get('name'),elem)
+                
+                elif elem.tag == elementTag and elem.get('substitutionGroup') == 'gml:AbstractFeature' and \
+                     elem.get('name') not in ignoreElementNames and elem.get('type') != None:
+                    features.add(_featureTypeName(elem))
+            continue
+        
+        if depth == cruftDepth:
+            cruftDepth = 0
+            
+        elif firsts.get(elem.get('name')) is elem:
+            firsts[elem.get('name')] = len(elem) > 0 and len(elem[-1]) > 0 and \
+                                       _abstractFeatureContent(elem,ns) is not None
+        #
+        # Top-level elements are not needed once parsed
+        if depth == 2:
+            root.remove(elem)
+        depth -= 1
 
-    except cp.NoSectionError:
-        pass
+    return ns, set(name for name in features if firsts.get(name) is True), foreign, scopes.rebound
+
+XMLNS = 'http://www.w3.org/XML/1998/namespace'
+
+def _namespaceOf(name):
+
+    return name[1:name.index('}')]
+
+def cleanUpElement(element,nameSpaces,claimed,flattened,ignoreElementNames):
+    #
+    # cleanUpTree() for one top-level element of the schema, given the complexTypes to flatten
+    # found by indexFeatureTypes(); 'flattened' holds the names of those already dealt with.
+    # Returns False if nothing is left of the element.
+    if cruftTest(nameSpaces)(element):
+        return False
+    
+    symbols = st.SymbolTable(element,nameSpaces)
+    for child in findCruft(element,nameSpaces):
+        symbols.remove(child)
+    removeAbstractMemberTypes(symbols,nameSpaces)
+    #
+    # removeGMLAbstractFeatures(): the first element of each such type drops its substitution
+    # group, the first complexType of the name is flattened.
+    for x in list(element.iter('{%s}element' % nameSpaces['xs'])):
+        if x.get('substitutionGroup') == 'gml:AbstractFeature' and x.get('name') not in ignoreElementNames and \
+           x.get('type') != None and _featureTypeName(x) in claimed and ('element',_featureTypeName(x)) not in flattened:
+            flattened.add(('element',_featureTypeName(x)))
+            del x.attrib['substitutionGroup']
+            
+    for target in list(element.iter('{%s}complexType' % nameSpaces['xs'])):
+        if target.get('name') in claimed and ('complexType',target.get('name')) not in flattened:
+            flattened.add(('complexType',target.get('name')))
+            complexContent = _abstractFeatureContent(target,nameSpaces)
+            target.remove(complexContent)
+            target.extend(list(list(complexContent).pop()))
+
+    pruneEmptyElements(element)
+    return not _isEmpty(element)
+
+class SchemaStream:
+    #
+    # Second pass of streamSchema(). Reads as the post-processed schema, serialized one top-level
+    # element at a time, for xmlpp.pprint(). What has been pretty-printed is written out before
+    # each read.
+    def __init__(self,plan,EASchemaFile,nameSpaces,claimed,output):
+
+        self.plan = plan
+        self.nameSpaces = nameSpaces
+        self.claimed = claimed
+        self.flattened = set()
+        self.output = output
+        self.engine = RuleEngine(nameSpaces,plan['rules'])
+        self.chunks = self._chunks(EASchemaFile)
+
+    def read(self,size=-1):
+
+        self.output.flush()
+        for chunk in self.chunks:
+            if chunk:
+                return chunk
+        return ''
+
+    def _chunks(self,EASchemaFile):
+
+        plan = self.plan
+        nameSpaces = self.nameSpaces
+        prologueTags = ['{%s}%s' % (nameSpaces['xs'],tag) for tag in ['annotation','import','include']]
+        ns = {}
+        root = footer = None
+        depth = 0
+        #
+        for event, elem in ET.iterparse(EASchemaFile,('start','end','start-ns')):
+            if event == 'start-ns':
+                ns[elem[0]] = elem[1]
+                
+            elif event == 'start':
+                depth += 1
+                if root is None:
+                    root = elem
+                    declareNameSpaces(root,ns,plan.get('imports',{}))
+                    
+            else:
+                depth -= 1
+                if depth != 1:
+                    continue
+                #
+                # The imports and includes are fixed, and the schema element written, once all
+                # of them and the element after them have been read.
+                if footer is None:
+                    if elem.tag in prologueTags:
+                        continue
+                    header, footer = self._begin(root)
+                    yield header
+                    #
+                    # The parser reads ahead, so later elements may already be in the tree.
+                    children = list(root)
+                    for child in children[:children.index(elem)]:
+                        yield self._element(root,child)
+                        
+                yield self._element(root,elem)
+
+        if footer is None:
+            header, footer = self._begin(root)
+            yield header
+            for child in list(root):
+                yield self._element(root,child)
+                
+        yield footer
+
+    def _begin(self,root):
+
+        plan = self.plan
+        if 'imports' in plan:
+            fixImports(root,plan['imports'],self.nameSpaces)
+        if 'includes' in plan:
+            fixIncludes(root,list(plan['includes']),self.nameSpaces)
+        #
+        # For some reason EA does not implement tag "attributeFormDefault" as a attribute
+        # to the root element, need to add it here.
+        #
+        if root.get('attributeFormDefault') == None:
+            root.set('attributeFormDefault','unqualified')
+        #
+        # The schema element on its own, with a marker where its children go
+        top = root.makeelement(root.tag,dict(root.attrib))
+        top.text = '\x00'
+        header, marker, footer = serializeTree(top,plan['schema']['defaultNamespace']).partition('\x00')
+        
+        return header, footer
+    
+    def _element(self,root,element):
+        #
+        # Returns the element, post-processed and serialized, or an empty string; either way it
+        # leaves the tree.
+        root.remove(element)
+        if not cleanUpElement(element,self.nameSpaces,self.claimed,self.flattened,self.plan['ignoreElementNames']):
+            return ''
+        
+        self.engine.apply(element)
+        xmltext = ET.tostring(element,encoding='unicode').replace(' xmlns="%s"' % self.plan['schema']['defaultNamespace'],'',1)
+        return xmltext.replace('" />','"/>')
+
+class PrettyOutput:
+    #
+    # Takes xmlpp.pprint()'s output. flush() collapses the text nodes in what it has been given
+    # since, as prettifySchema() does, and writes it to the file, keeping a digest of it all.
+    def __init__(self,fh):
+
+        self.fh = fh
+        self.digest = hashlib.sha256()
+        self.pending = []
+
+    def write(self,text):
+
+        self.pending.append(text)
+
+    def flush(self):
+
+        data = textnode_re.sub(r'>\g<1></',''.join(self.pending)).encode('UTF-8')
+        self.pending = []
+        self.fh.write(data)
+        self.digest.update(data)
+
+def processProduct(plan,basedir,force=False,profile=None,backend='etree',stream=False,checkpoints=False):
+    #
+    # Worker for runProducts(): diagnostics are captured so that they can be reported in order,
+    # and the manifest entry is handed back to be written by the parent process, along with
+    # the profile, if 'profile' holds a Profiler's (memory, stacks) options. The plan comes
+    # marshalled, as its compiled addendums cannot be pickled, and the tree backend by name.
+    plan = marshal.loads(plan)
+    profiler = pr.NULL if profile is None else pr.Profiler(*profile)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = main(plan,basedir,force,manifest=False,profiler=profiler,backend=tb.BACKENDS[backend],
+                      stream=stream,checkpoints=checkpoints)
+        
+    return output.getvalue(), result, None if profile is None else profiler.products
+
+def includeLevels(plans):
+    #
+    # Group the rule plans so that a schema comes after the ones it includes or imports.
+    levels = dependencyLevels(breakCycles(dependencyGraph(plans)[0]))
+    return [[plans[num] for num in range(len(plans)) if levels[num] == n]
+            for n in sorted(set(levels))]
+
+def localImports(plan):
+    #
+    # The schemas imported from the release directory, by a relative schemaLocation. Those
+    # imported from elsewhere, e.g. GML, are not post-processed here.
+    locations = [value.split()[-1] for value in plan.get('imports',{}).values()]
+    return [x for x in locations if not x.startswith(vs.REMOTE) and not os.path.isabs(x)]
+
+def schemaDependencies(plan):
+
+    return plan.get('includes',[]) + [x for x in localImports(plan) if x not in plan.get('includes',[])]
+
+def dependencyGraph(plans):
     #
-    # One-off python code instructions for UML->XML realization
+    # Returns, for each rule plan, the set of the others whose schemas it includes or imports,
+    # by their position in 'plans', and the (position, schema) of those that none makes.
+    names = dict((plan['schema']['name'],num) for num, plan in enumerate(plans))
+    dependencies, missing = [], []
+    for num, plan in enumerate(plans):
+        dependencies.append(set(names[x] for x in schemaDependencies(plan) if x in names))
+        missing.extend((num,x) for x in schemaDependencies(plan) if x not in names)
+
+    return dependencies, missing
+
+def findCycles(dependencies):
+    #
+    # The strongly connected components, in Tarjan's manner, of more than one schema or of one
+    # that includes itself, each as positions in the order of 'dependencies'.
+    index, lowlink, stack, onStack, cycles = {}, {}, [], set(), []
+    def visit(num):
+        index[num] = lowlink[num] = len(index)
+        stack.append(num)
+        onStack.add(num)
+        for dep in dependencies[num]:
+            if dep not in index:
+                visit(dep)
+                lowlink[num] = min(lowlink[num],lowlink[dep])
+            elif dep in onStack:
+                lowlink[num] = min(lowlink[num],index[dep])
+
+        if lowlink[num] == index[num]:
+            component = []
+            while True:
+                x = stack.pop()
+                onStack.discard(x)
+                component.append(x)
+                if x == num:
+                    break
+            if len(component) > 1 or num in dependencies[num]:
+                cycles.append(sorted(component))
+
+    for num in range(len(dependencies)):
+        if num not in index:
+            visit(num)
+
+    return sorted(cycles)
+
+def breakCycles(dependencies):
+    #
+    # The schemas of a cycle can not come after one another; they are taken in the order given.
+    acyclic = [set(deps) for deps in dependencies]
+    for cycle in findCycles(dependencies):
+        for num in cycle:
+            acyclic[num] -= set(cycle)
+
+    return acyclic
+
+def dependencyLevels(dependencies):
+    #
+    # A schema's level is one more than the highest of those it depends on; 'dependencies'
+    # must be acyclic.
+    levels = {}
+    def level(num):
+        if num not in levels:
+            levels[num] = 1 + max([-1] + [level(x) for x in dependencies[num]])
+        return levels[num]
+
+    return [level(num) for num in range(len(dependencies))]
+
+def criticalPaths(dependencies,costs):
+    #
+    # For each schema, the cost of the longest chain of work from it to the last of the
+    # schemas that depend on it. Those with the longest are best started first.
+    dependents = [[] for num in dependencies]
+    for num, deps in enumerate(dependencies):
+        for x in deps:
+            dependents[x].append(num)
+
+    paths = {}
+    def path(num):
+        if num not in paths:
+            paths[num] = costs[num] + max([0] + [path(x) for x in dependents[num]])
+        return paths[num]
+
+    return [path(num) for num in range(len(dependencies))]
+
+def _workEstimate(plan,basedir):
+    #
+    # The time a schema takes is about in proportion to the size of its EA export
     try:
-        for cmd in [config.get('addendum%d' % num, 'code')
-                    for num in range(int(config.get('addendums','number')))]:
-            exec(cmd)
+        return os.path.getsize(os.path.join(basedir,plan['location']['EADirectory'],plan['schema']['name']))
+    except (TypeError, IOError, OSError):
+        return 0
 
-    except cp.NoSectionError:
-        pass
+def otherPlans(cfgfiles):
     #
-    # For some reason EA does not implement tag "attributeFormDefault" as a attribute
-    # to the root element, need to add it here.
+    # The rule plans of the other products configured alongside the given ones. Those that
+    # can not be read are left out; they are not being post-processed.
+    given = set(os.path.abspath(cfgfile) for cfgfile in cfgfiles)
+    directories = sorted(set(os.path.dirname(cfgfile) for cfgfile in given))
+    plans = []
+    for cfgfile in [x for directory in directories for x in sorted(glob.glob(os.path.join(directory,'*.cfg')))]:
+        if cfgfile in given:
+            continue
+        try:
+            plans.append(cr.loadPlan(cfgfile))
+        except (cr.ConfigurationError, cr.cp.Error):
+            pass
+
+    return plans
+
+def releasedSchemas(cfgfiles,basedir):
     #
-    if root.get('attributeFormDefault') == None:
-        root.set('attributeFormDefault','unqualified')
+    # The schema files post-processed from the configuration files, those that exist
+    schemaFiles = []
+    for plan in [cr.loadPlan(cfgfile) for cfgfile in cfgfiles]:
+        if plan['location'] is not None:
+            schemaFile = os.path.join(basedir,plan['location']['ReleaseDirectory'],plan['schema']['name'])
+            if os.path.isfile(schemaFile):
+                schemaFiles.append(schemaFile)
+                
+    return schemaFiles
+
+def runProducts(cfgfiles,basedir,jobs=1,force=False,profiler=pr.NULL,backend=tb.ETREE,stream=False,
+                checkpoints=False):
     #
-    # Write out the modified EA schema
-    doc = ET.ElementTree(root)
-    doc.write(outputfile,xml_declaration=True,encoding="UTF-8",method="xml")        
-    del doc
-    #
-    # EA does not output the default namespace at the moment.  Will set it here.
-    ET.register_namespace("", DefaultNamespace)
-    #
-    # Rewrite to set default namespace
-    root, nameSpaces = parseAndGetNameSpaces(outputfile)
-    doc = ET.ElementTree(root)    
-    doc.write(outputfile,xml_declaration=True,encoding="UTF-8",method="xml")
-    del doc
-    #
-    # Now prettify the schema file
-    xmltext = open(outputfile,'r').read()        
-    xmlpp.pprint(xmltext.replace('" />','"/>'),open(outputfile,'w'),indent=4)
-    xmltext = open(outputfile,'r').read()
-    #
-    # From stackoverflow 'nbolton'
-    textnode_re = re.compile('>\n\s+([^<>\s].*?)\n\s+</', re.DOTALL)
-    prettyXml = textnode_re.sub('>\g<1></',xmltext)
-    open(outputfile,'w').write(prettyXml)
-    
+    # Post-process the schemas named in the configuration files, up to 'jobs' at a time,
+    # each after those of the others that it includes or imports. All configuration files
+    # are compiled (or their cached rule plans loaded) first, so a malformed rule stops the
+    # run before any schema is touched. A schema is started as soon as those it depends on
+    # are done, those with the longest chain of work after them first, so that the run
+    # takes about as long as that chain. Each worker process has its own ElementTree
+    # namespace registry; diagnostics are printed in the order the configuration files are
+    # given, level by level. A schema whose inputs, the schemas it depends on among them,
+    # have not changed is not processed again (see main()).
+    #
+    plans = [cr.loadPlan(cfgfile) for cfgfile in cfgfiles]
+    others = otherPlans(cfgfiles)
+    dependencies = breakCycles(checkDependencies(plans,others,basedir))
+    levels = dependencyLevels(dependencies)
+    order = sorted(range(len(plans)),key=lambda num: (levels[num],num))
+
+    if jobs < 2 or len(plans) < 2:
+        for num in order:
+            main(plans[num],basedir,force,profiler=profiler,backend=backend,stream=stream,checkpoints=checkpoints)
+        reportStale(plans,others,basedir)
+        return
+
+    priority = criticalPaths(dependencies,[_workEstimate(plan,basedir) for plan in plans])
+    profile = (profiler.memory,profiler.stacks) if isinstance(profiler,pr.Profiler) else None
+    pending, results, printed = {}, {}, 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        while printed < len(order):
+            ready = [num for num in order if num not in results and num not in pending.values()
+                     and dependencies[num] <= set(results)]
+            ready.sort(key=lambda num: -priority[num])
+            for num in ready[:jobs - len(pending)]:
+                pending[executor.submit(processProduct,marshal.dumps(plans[num]),basedir,force,profile,
+                                        backend.name,stream,checkpoints)] = num
+
+            done = concurrent.futures.wait(pending,return_when=concurrent.futures.FIRST_COMPLETED)[0]
+            for future in done:
+                results[pending.pop(future)] = future.result()
+            #
+            # The manifest entry of a schema is written, and its diagnostics printed, once
+            # those of the schemas before it have been.
+            while printed < len(order) and order[printed] in results:
+                output, result, products = results[order[printed]]
+                sys.stdout.write(output)
+                sys.stdout.flush()
+                if result is not None:
+                    bm.updateManifest(*result)
+                if products is not None:
+                    profiler.products.update(products)
+                printed += 1
+
+    reportStale(plans,others,basedir)
+
+def checkDependencies(plans,others,basedir):
+    #
+    # Report the cycles among the schemas, and the schemas included or imported that no
+    # configuration file makes and that are not in the release directory either. Returns the
+    # dependencies of each plan among 'plans', by position.
+    dependencies, missing = dependencyGraph(plans)
+    names = [plan['schema']['name'] for plan in plans]
+    for cycle in findCycles(dependencies):
+        print('Dependency cycle among %s; they are processed in the order given' %
+              ', '.join(names[num] for num in cycle))
+
+    made = set(plan['schema']['name'] for plan in others)
+    for num, name in missing:
+        if name in made or plans[num]['location'] is None:
+            continue
+        if not os.path.isfile(os.path.join(basedir,plans[num]['location']['ReleaseDirectory'],name)):
+            print('%s includes or imports %s, which no configuration file makes and which is not in %s' %
+                  (names[num],name,plans[num]['location']['ReleaseDirectory']))
+
+    return dependencies
+
+def reportStale(plans,others,basedir):
+    #
+    # The products not post-processed that depend, in turn, on those that were, are out of
+    # date once one of the schemas they depend on has changed.
+    allPlans = plans + others
+    dependencies = breakCycles(dependencyGraph(allPlans)[0])
+    levels = dependencyLevels(dependencies)
+    stale = set()
+    for num in sorted(range(len(plans),len(allPlans)),key=lambda num: (levels[num],num)):
+        plan = allPlans[num]
+        if plan['location'] is None or not any(x < len(plans) or x in stale for x in dependencies[num]):
+            continue
+
+        schemaFile = plan['schema']['name']
+        ReleaseFullPath = os.path.join(basedir,plan['location']['ReleaseDirectory'])
+        EASchemaFile = os.path.join(basedir,plan['location']['EADirectory'],schemaFile)
+        if not os.path.isfile(EASchemaFile):
+            continue
+
+        if any(x in stale for x in dependencies[num]) or \
+           not bm.isUpToDate(os.path.join(ReleaseFullPath,bm.MANIFEST),schemaFile,
+                             manifestInputs(plan,EASchemaFile,ReleaseFullPath),
+                             os.path.join(ReleaseFullPath,schemaFile)):
+            stale.add(num)
+            print('%s is out of date with the schemas it depends on; post-process it too' % schemaFile)
 
 if __name__ == '__main__':
     #
-    if len(sys.argv) == 1:
-        print("Usage: %s product" % sys.argv[0])
-    else:
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Post-process Enterprise Architect (EA) schemas.')
+    parser.add_argument('products', nargs='+', metavar='product',
+                        help='name of product configuration file, without the .cfg extension')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of products to process at the same time (default: 1)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='process products even if their schemas are up to date')
+    parser.add_argument('--backend', choices=sorted(tb.BACKENDS), default='etree',
+                        help='XML tree implementation to post-process with (default: etree)')
+    parser.add_argument('--stream', action='store_true',
+                        help='process schemas one top-level element at a time, in bounded memory (ElementTree only)')
+    parser.add_argument('--checkpoints', action='store_true',
+                        help='save the tree after each stage and resume from the last one whose inputs are unchanged')
+    parser.add_argument('--validate', action='store_true',
+                        help='check that the schemas compile, offline, with the imported schemas in the catalog')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='write the time, memory and rule statistics of each stage to FILE as JSON')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='also record peak memory of each stage (slow)')
+    parser.add_argument('--profile-stacks', metavar='FILE',
+                        help='write a cProfile of each product to FILE as collapsed stacks')
+    args = parser.parse_args()
     #
-    # Read configuration files for each schema
-        orig_dir = os.getcwd()
+    # Read configuration files for each schema. Directories in the configuration files are
+    # relative to the parent of the current working directory.
+    cfgfiles = [cfgfile for cfgfile in ['%s.cfg' % product for product in args.products]
+                if os.path.isfile(cfgfile)]
+    
+    profiler = pr.NULL
+    if args.profile or args.profile_stacks:
+        profiler = pr.Profiler(args.profile_memory,args.profile_stacks is not None)
+    
+    try:
+        runProducts(cfgfiles,os.path.dirname(os.getcwd()),args.jobs,args.force,profiler,
+                    tb.BACKENDS[args.backend],args.stream,args.checkpoints)
         
-        for product in sys.argv[1:]:
-            
-            config = cp.ConfigParser()
-            config.optionxform = str
-            cfgfile = '%s.cfg' % product
-            
-            if os.path.isfile(cfgfile):
-                
-                config.read(cfgfile)    
-                os.chdir('..')
-                main(config)
-                os.chdir(orig_dir)
-                
-            del config
+    except cr.ConfigurationError as err:
+        print('Malformed configuration file %s' % err)
+        sys.exit(1)
+
+    if profiler is not pr.NULL:
+        pr.writeReport(profiler.report(),args.profile,args.profile_stacks)
+    #
+    # The schemas include one another, so they are checked once all are written.
+    if args.validate and vs.reportValidation(vs.validateSchemas(releasedSchemas(cfgfiles,os.path.dirname(os.getcwd())))):
+        sys.exit(1)
@@ -9,38 +9,41 @@
 #
 #  1) Provide directory listing of EA schemas for further processing
 #  2) Run postProcessEA.py on each schema selected by user
-#  3) Run comparison tool on changed schema(s) to previous one
+#  3) Compare the new schema(s), component by component, to the staged ones and,
+#     if asked, run a comparison tool on those that differ
 #
-import configparser as cp
+import fnmatch
 import os
 import re
 import subprocess
 import time
-import urllib.error
-import urllib.request as ur
-import xml.etree.ElementTree as ET
 
+import checkVocabularies as cv
+import diffSchemas as ds
 import postProcessEA as pea 
+import validateSchemas as vs
+import watchEA as we
 
-re_range = re.compile(r'(?P<start>\d*)-(?P<end>\d*)')
+re_range = re.compile(r'(?P<start>\d*)-(?P<end>\d*)$')
 
-def listEADirectoryFiles(listingDir='./EA'):
-
-    origWorkingDirectory = os.getcwd()
+def listEADirectoryFiles(listingDir='./EA', selection=None):
+    #
+    # With a selection from the command line, no questions are asked.
     try:
-        os.chdir(listingDir)
+        eaSchemas = [(f, os.stat(os.path.join(listingDir, f)))
+                     for f in sorted(os.listdir(listingDir)) if f.endswith('.xsd')]
         
     except FileNotFoundError as errmsg:
         
         print(errmsg)
         return None
 
-    preamble = ["\tSchemas in Directory: {}\n".format(os.getcwd())]
+    if selection is not None:
+        return selectSchemas(selection, [f[0] for f in eaSchemas])
+    
+    preamble = ["\tSchemas in Directory: {}\n".format(os.path.abspath(listingDir))]
     preamble.append("    Modification Time\t\tLength\tName")
     
-    eaSchemas = [(f, os.stat(f)) for f in os.listdir('.') if f.endswith('.xsd')]
-    os.chdir(origWorkingDirectory)
-
     print('\n'.join(preamble))
 
     for num, f in enumerate(eaSchemas):
@@ -53,101 +56,153 @@ def listEADirectoryFiles(listingDir='./EA'):
     res = input('\nPlease make your selection(s) [<RET> for none]: ').strip()
     if res == '':
         return []
-    #
-    # tedious
-    sequence = []
-    other = []
-    for num in res.split(' '):
-        if num.isdigit():
-            sequence.append(int(num))
-        elif num != '':    
-            other.append(num.strip())
-    
-    
-    res = ''.join(other)
-    other = []
-    for num in res.split(','):
-        if num.isdigit():
-            sequence.append(int(num))
-        elif num != '':    
-            other.append(num.strip())
-
-    res = ''.join(other)
-    other = []
-    for r in re_range.findall(res):
-        try:
-            start = max(1, int(r[0]))
-        except TypeError:
-            start = 1
-            
-        try:
-            end = min(len(eaSchemas), int(r[1]))
-        except TypeError:
-            end = len(eaSchemas)
-
-        sequence.extend(range(start, end+1))
 
+    schemas = selectSchemas(res.replace(',', ' ').split(), [f[0] for f in eaSchemas])
+    
     print('\nFollowing schemas are selected for processing:')
-    schemas = [eaSchemas[x-1][0] for x in set(sequence)]
     for f in schemas:
         print('\t{}'.format(f))
 
     res = input('\nProceed? [y/n]: ')
-    if 'y' == res.lower()[0]:
+    if 'y' == res.lower()[:1]:
         return schemas
     else:
         return []
 
+def selectSchemas(selection, schemas):
+    #
+    # Each entry of the selection is a number or a range of numbers ('2-4', '-3', '5-'), as
+    # listed by listEADirectoryFiles(), or a file name pattern ('taf.xsd', 'taf', 'metar*').
+    # Entries may also be separated by commas.
+    #
+    sequence = []
+    for entry in [e for item in selection for e in item.split(',') if e != '']:
+        if entry.isdigit():
+            sequence.append(int(entry))
+            continue
+        
+        r = re_range.match(entry)
+        if r:
+            start = max(1, int(r.group('start') or 1))
+            end = min(len(schemas), int(r.group('end') or len(schemas)))
+            sequence.extend(range(start, end+1))
+            continue
+
+        matches = [num+1 for num, f in enumerate(schemas)
+                   if fnmatch.fnmatch(f, entry) or fnmatch.fnmatch(f, '{}.xsd'.format(entry))]
+        if len(matches) == 0:
+            print('No schema matches {}'.format(entry))
+        sequence.extend(matches)
+
+    return [schemas[x-1] for x in sorted(set(sequence)) if 0 < x <= len(schemas)]
+
 if __name__ == '__main__':
     
+    import argparse
     import sys
+    
+    parser = argparse.ArgumentParser(description='Post-process EA schemas and compare them to the posted ones.')
+    parser.add_argument('selection', nargs='*',
+                        help='schema numbers, ranges or file name patterns; prompts for them if omitted')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of schemas to post-process at the same time (default: 1)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='post-process schemas even if they are up to date')
+    parser.add_argument('--backend', choices=sorted(pea.tb.BACKENDS), default='etree',
+                        help='XML tree implementation to post-process with (default: etree)')
+    parser.add_argument('--watch', action='store_true',
+                        help='afterwards, post-process the selected schemas again whenever they or their configuration files change')
+    parser.add_argument('--stream', action='store_true',
+                        help='post-process schemas one top-level element at a time, in bounded memory')
+    parser.add_argument('--checkpoints', action='store_true',
+                        help='save each schema after each post-processing stage and resume from the last one whose inputs are unchanged')
+    parser.add_argument('--offline', action='store_true',
+                        help='check vocabularies against the cache of reachable registers only')
+    parser.add_argument('--timeout', type=float, default=10,
+                        help='seconds to wait for a code register to respond (default: 10)')
+    parser.add_argument('--validate', action='store_true',
+                        help='check that the new schemas compile, offline, with the imported schemas in the catalog')
+    parser.add_argument('--staging', metavar='DIR',
+                        help='website staging directory of the release to compare with (default: iwxxm-us/3.0 of the NWS_SchemaWebsite repository)')
+    parser.add_argument('--report', metavar='FILE',
+                        help='write the differences from the staged schemas to FILE, as HTML or JSON')
+    parser.add_argument('--diff-tool', metavar='PROGRAM',
+                        help='file comparison program to run on each schema that differs from the staged one')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='write the time, memory and rule statistics of each post-processing stage to FILE')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='also record peak memory of each stage (slow)')
+    parser.add_argument('--profile-stacks', metavar='FILE',
+                        help='write a cProfile of each schema to FILE as collapsed stacks')
+    args = parser.parse_args()
     #
     # As EA runs on Windows OS, this is how the root directory is determined.
-    HOME = os.environ.get('USERPROFILE')
+    HOME = os.environ.get('USERPROFILE', os.path.expanduser('~'))
     #
     # Starting from the HOME directory, build the paths to the schemas' initial
     # and final locations.
     #
     REPOSITORY = os.path.join(HOME, 'Repositories', 'iwxxm-us-modelling')
-    WEB_STAGING = os.path.join(HOME, 'Repositories', 'NWS_SchemaWebsite', 'iwxxm-us', '3.0')
+    WEB_STAGING = args.staging or os.path.join(HOME, 'Repositories', 'NWS_SchemaWebsite', 'iwxxm-us', '3.0')
+
+    schemaFiles = listEADirectoryFiles(os.path.join(REPOSITORY, 'EA'),
+                                       args.selection if args.selection else None) or []
     #
-    # Many file comparison apps out there. Pick one that is available to you.
-    # Should accept two filenames as command-line arguments.  This program
-    # allows me to resolve the differences and save the changed file.
+    # Get all vocabulary entries in the schemas and verify that the code register(s) exists. (Requires
+    # internet access, unless every register has been found recently.)
     #
-    diffTool = os.path.join(os.environ.get('LOCALAPPDATA'), 'Programs',
-                            'Oxygen XML Developer 27', 'diffFiles.exe')
-
-    os.chdir(REPOSITORY)
-    schemaFiles = listEADirectoryFiles()
-    for schemaFile in schemaFiles:
-        #
-        # Get all vocabulary entries in schema and verify that the code register(s) exists. (Requires
-        # internet access.)
-        #
-        tree = ET.parse(os.path.join('EA', schemaFile))
-        for element in tree.findall('.//vocabulary'):
-            try:
-                response = ur.urlopen(element.text)
-                if response.status != 200:
-                    print('{} not reachable ({}). Please investigate.'.format(element.text,
-                                                                              response.status))
-
-            except urllib.error.URLError as err_msg:
-                print('{} resulted in {}. Please investigate.'.format(element.text, err_msg))
-                
-        cfgFile = os.path.join('py', schemaFile.replace('.xsd', '.cfg'))
-        config = cp.ConfigParser()
-        config.optionxform = str
-        config.read(cfgFile)    
+    vocabularies = cv.getVocabularies([os.path.join(REPOSITORY, 'EA', schemaFile)
+                                       for schemaFile in schemaFiles])
+    cv.reportVocabularies(cv.checkVocabularies(vocabularies, timeout=args.timeout,
+                                               offline=args.offline))
+    #
+    # Post-process the selected schemas, several at a time if asked.
+    profiler = pea.pr.NULL
+    if args.profile or args.profile_stacks:
+        profiler = pea.pr.Profiler(args.profile_memory, args.profile_stacks is not None)
+    try:
+        pea.runProducts([os.path.join(REPOSITORY, 'py', schemaFile.replace('.xsd', '.cfg'))
+                         for schemaFile in schemaFiles], REPOSITORY, args.jobs, args.force, profiler,
+                        pea.tb.BACKENDS[args.backend], args.stream, args.checkpoints)
+        
+    except pea.cr.ConfigurationError as err:
+        print('Malformed configuration file {}'.format(err))
+        sys.exit(1)
 
-        pea.main(config)
+    if profiler is not pea.pr.NULL:
+        pea.pr.writeReport(profiler.report(), args.profile, args.profile_stacks)
+    #
+    # Check that the new schemas compile, without the network.
+    if args.validate:
+        vs.reportValidation(vs.validateSchemas([os.path.join(REPOSITORY, 'schemas', schemaFile)
+                                                for schemaFile in schemaFiles
+                                                if os.path.isfile(os.path.join(REPOSITORY, 'schemas', schemaFile))]))
+    #
+    # Compare the new schemas to the staged ones, all at once.
+    results = ds.diffSchemas([(os.path.join(WEB_STAGING, schemaFile), os.path.join(REPOSITORY, 'schemas', schemaFile))
+                              for schemaFile in schemaFiles
+                              if os.path.isfile(os.path.join(REPOSITORY, 'schemas', schemaFile))])
+    ds.reportDifferences(results)
+    if args.report:
+        ds.writeReport(results, args.report)
+    #
+    # Many file comparison apps out there. One that accepts two filenames as command-line
+    # arguments permits resolution of differences and writing changed schema to the website
+    # staging area.
+    #
+    for schemaFile, result in results.items():
 
+        if args.diff_tool is None or not (result['added'] or result['removed'] or result['changed']):
+            continue
+        
         diff_args = [' ', os.path.join(WEB_STAGING, schemaFile),
                      os.path.join(REPOSITORY, 'schemas', schemaFile)]
-        #
-        # Tool permits comparison, resolution of differences and writing changed schema to
-        # the website staging area.
-        #
+        
         print(f"Comparing latest {schemaFile} (L) to the newly created one (R)...", flush=True)
-        result = subprocess.run(diff_args, executable=diffTool)
+        subprocess.run(diff_args, executable=args.diff_tool)
+    #
+    # Stay and post-process the selected schemas again as EA writes them.
+    if args.watch:
+        we.Watcher([os.path.join(REPOSITORY, 'py', schemaFile.replace('.xsd', '.cfg')) for schemaFile in schemaFiles],
+                   REPOSITORY, pea.tb.BACKENDS[args.backend], args.stream, args.validate,
+                   args.checkpoints).run()
@@ -0,0 +1,194 @@
+#
+# Name: profileEA.py
+#
+# Purpose: To record where postProcessEA.py spends its time and memory.
+#
+# postProcessEA.main() reports each stage of its work to a profiler. The default one,
+# NULL, does nothing. A Profiler records, for each product and stage, the wall-clock and
+# CPU time, the number of elements in the schema before and after, and optionally the
+# peak memory allocated (tracemalloc) and a cProfile of the product as collapsed stacks,
+# the input format of flamegraph.pl and speedscope. Rule statistics from applyRules() are
+# added to the product's record. The report is a JSON document:
+#
+#   {"version": 1,
+#    "products": {"taf.xsd": {"wall": 0.41, "cpu": 0.40, "peakMemory": 18300412,
+#                             "stages": [{"name": "parseAndGetNameSpaces", "depth": 0,
+#                                         "wall": 0.05, "cpu": 0.05, "peakMemory": 9822152,
+#                                         "elementsBefore": 0, "elementsAfter": 20931}, ...],
+#                             "rules": {"dataTypes": {"matched": 12, "unmatched": 0}, ...}}}}
+#
+import contextlib
+import cProfile
+import json
+import pstats
+import time
+import tracemalloc
+
+VERSION = 1
+
+class NullProfiler:
+    #
+    # Stands in for a Profiler when none is wanted.
+    def product(self, name):
+        return contextlib.nullcontext()
+
+    def stage(self, name, root=None):
+        return contextlib.nullcontext()
+
+    def record(self, key, value):
+        pass
+
+NULL = NullProfiler()
+
+def countElements(root):
+
+    return sum(1 for element in root.iter())
+
+class Profiler:
+
+    def __init__(self, memory=False, stacks=False, elements=True):
+
+        self.memory = memory
+        self.stacks = stacks
+        self.elements = elements
+        self.products = {}
+        self.current = None
+        self.open = []
+
+    def _peak(self):
+        #
+        # Credit the peak since the last reset to every open stage and start again, so that
+        # each stage's peak covers only its own duration.
+        if not self.memory:
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for frame in self.open:
+            frame['peakMemory'] = max(frame['peakMemory'], peak)
+        tracemalloc.reset_peak()
+
+    @contextlib.contextmanager
+    def product(self, name):
+
+        record = {'stages': [], 'rules': {}}
+        self.products[name] = self.current = record
+        started = not tracemalloc.is_tracing() if self.memory else False
+        if started:
+            tracemalloc.start()
+
+        profile = cProfile.Profile() if self.stacks else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        frame = {'peakMemory': 0}
+        self._peak()
+        self.open.append(frame)
+        try:
+            if profile is not None:
+                profile.enable()
+            yield record
+
+        finally:
+            if profile is not None:
+                profile.disable()
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = time.process_time() - cpu
+            self._peak()
+            self.open.pop()
+            if self.memory:
+                record['peakMemory'] = frame['peakMemory']
+            if started:
+                tracemalloc.stop()
+            if profile is not None:
+                record['stacks'] = collapsedStacks(profile)
+            self.current = None
+
+    @contextlib.contextmanager
+    def stage(self, name, root=None):
+        #
+        # Stages nest. Elements are counted, unless told not to, if the schema's root element
+        # is given.
+        if self.current is None:
+            yield
+            return
+
+        record = {'name': name, 'depth': len(self.open) - 1}
+        if self.elements and root is not None:
+            record['elementsBefore'] = countElements(root)
+        self.current['stages'].append(record)
+        self._peak()
+        frame = {'peakMemory': 0}
+        self.open.append(frame)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+
+        finally:
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = time.process_time() - cpu
+            self._peak()
+            self.open.pop()
+            if self.memory:
+                record['peakMemory'] = frame['peakMemory']
+            if self.elements and root is not None:
+                record['elementsAfter'] = countElements(root)
+
+    def record(self, key, value):
+
+        if self.current is not None:
+            self.current[key] = value
+
+    def report(self):
+
+        return {'version': VERSION, 'products': self.products}
+
+def collapsedStacks(profile, minimum=1e-6):
+    #
+    # cProfile keeps only caller/callee pairs, not whole stacks. Stacks are rebuilt from the
+    # entry points down, sharing out each function's time among its callees in proportion to
+    # the time spent in each. Returns {"caller;callee;...": seconds spent in the last one}.
+    stats = pstats.Stats(profile).stats
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    def label(func):
+        fname, line, name = func
+        return '%s (%s:%d)' % (name, fname.replace('\\', '/').split('/')[-1], line) if line else name
+
+    stacks = {}
+    def walk(func, path, share):
+        cc, nc, tt, ct, callers = stats[func]
+        if ct <= 0:
+            return
+        stack = path + [label(func)]
+        key = ';'.join(stack)
+        stacks[key] = stacks.get(key, 0) + share * tt / ct
+        for callee, edgeTime in callees.get(func, []):
+            part = share * edgeTime / ct
+            if part >= minimum and label(callee) not in stack:
+                walk(callee, stack, part)
+
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        if not callers:
+            walk(func, [], ct)
+
+    return dict((stack, seconds) for stack, seconds in stacks.items() if seconds >= minimum)
+
+def writeReport(report, reportFile, stacksFile=None):
+    #
+    # The collapsed stacks go to their own file, one "stack microseconds" line each, below
+    # a frame naming the product.
+    products = {}
+    lines = []
+    for name, record in report['products'].items():
+        record = dict(record)
+        for stack, seconds in sorted(record.pop('stacks', {}).items()):
+            lines.append('%s;%s %d\n' % (name, stack, round(1e6 * seconds)))
+        products[name] = record
+
+    if reportFile:
+        with open(reportFile, 'w') as fh:
+            json.dump({'version': report['version'], 'products': products}, fh, indent=1)
+
+    if stacksFile:
+        with open(stacksFile, 'w') as fh:
+            fh.writelines(lines)
@@ -0,0 +1,128 @@
+#
+# Name: reachability.py
+#
+# Purpose: To find the top-level components of a schema that nothing in use refers to.
+#
+# A component is reachable if it can be got to, by way of type=, base=, itemType=,
+# memberTypes=, ref= and substitutionGroup= references, from a global element or from one of
+# the names given as roots. The references are followed through the schemas that the schema
+# includes, and those that they include, as released; their global elements are roots too.
+# Only the schema's own components can be unreachable. Each component and each reference is
+# visited once, so the time taken is linear in the size of the schemas.
+#
+import fnmatch
+import os
+import xml.etree.ElementTree as ET
+
+import nameSpaceScopes as nsc
+
+XSD = 'http://www.w3.org/2001/XMLSchema'
+#
+# Components of the same name in different symbol spaces are different components
+SPACES = {'element': 'element', 'complexType': 'type', 'simpleType': 'type', 'attribute': 'attribute',
+          'group': 'group', 'attributeGroup': 'attributeGroup'}
+REFERENCES = {'type': 'type', 'base': 'type', 'itemType': 'type', 'memberTypes': 'type',
+              'substitutionGroup': 'element'}
+
+class ComponentGraph:
+
+    def __init__(self, xs=XSD):
+
+        self.xs = '{%s}' % xs
+        self.edges = {}
+        self.names = {}
+        self.own = []
+
+    def add(self, root, nameSpaces, own=False):
+        #
+        # Adds the schema's top-level components and their references
+        targetNamespace = root.get('targetNamespace')
+        for component in root:
+            if not isinstance(component.tag, str) or not component.tag.startswith(self.xs):
+                continue
+
+            space = SPACES.get(component.tag[len(self.xs):])
+            name = component.get('name')
+            if space is None or name is None:
+                continue
+
+            key = (space, name if targetNamespace is None else '{%s}%s' % (targetNamespace, name))
+            self.names.setdefault(name, []).append(key)
+            self.edges.setdefault(key, []).extend(self._references(component, nameSpaces))
+            if own:
+                self.own.append((key, component))
+
+    def _references(self, component, nameSpaces):
+
+        for element in component.iter():
+            if not isinstance(element.tag, str):
+                continue
+
+            for attribute, space in REFERENCES.items():
+                for value in (element.get(attribute) or '').split():
+                    try:
+                        yield space, nsc.resolveQName(value, nameSpaces)
+                    except KeyError:
+                        pass
+
+            if element.get('ref') is not None and element.tag.startswith(self.xs):
+                space = SPACES.get(element.tag[len(self.xs):])
+                try:
+                    if space is not None:
+                        yield space, nsc.resolveQName(element.get('ref'), nameSpaces)
+                except KeyError:
+                    pass
+
+    def unreachable(self, names=()):
+        #
+        # The schema's own components that cannot be got to, in document order. 'names' are
+        # the names, or fnmatch patterns, of the components to start from besides the global
+        # elements.
+        pending = [key for key in self.edges if key[0] == 'element']
+        for pattern in names:
+            for name in fnmatch.filter(self.names, pattern):
+                pending.extend(self.names[name])
+
+        reached = set(pending)
+        while pending:
+            for key in self.edges.get(pending.pop(), ()):
+                if key not in reached:
+                    reached.add(key)
+                    pending.append(key)
+
+        return [component for key, component in self.own if key not in reached]
+
+def readSchema(fname):
+    #
+    # The schema's root and the namespaces bound on it; those bound within it, e.g. on a
+    # component, are left out.
+    nameSpaces = {}
+    root = None
+    parser = ET.iterparse(fname, events=('start-ns', 'start'))
+    for event, item in parser:
+        if event == 'start-ns' and root is None:
+            nameSpaces[item[0]] = item[1]
+        elif event == 'start' and root is None:
+            root = item
+
+    return parser.root, nameSpaces
+
+def addIncludes(graph, includes, directory):
+    #
+    # Adds the included schemas, found in 'directory', and those they include
+    pending = [os.path.join(directory, x) for x in includes]
+    seen = set()
+    while pending:
+        fname = os.path.abspath(pending.pop(0))
+        if fname in seen:
+            continue
+
+        seen.add(fname)
+        if not os.path.isfile(fname):
+            print('Included schema %s not found; its references are not followed' % os.path.relpath(fname))
+            continue
+
+        root, nameSpaces = readSchema(fname)
+        graph.add(root, nameSpaces)
+        pending.extend(os.path.join(os.path.dirname(fname), x.get('schemaLocation'))
+                       for x in root.findall('{%s}include' % XSD) if x.get('schemaLocation'))
@@ -0,0 +1,130 @@
+#
+# Name: symbolTable.py
+#
+# Purpose: To look up the named components of a schema, and what refers to them, without
+#          searching the tree.
+#
+# A SymbolTable is built in one traversal of the schema. It holds
+#
+#   - the top-level components -- elements, complexTypes, simpleTypes, attributes, groups
+#     and attributeGroups -- by kind and name;
+#   - for each value of a type=, ref=, base= or substitutionGroup= attribute, the elements
+#     that have it;
+#   - the parent of every element.
+#
+# It stays right only if the tree is changed through it: remove(), append(), extend() and
+# set(), or forget() for elements the caller has detached. Addendums may use it as 'symbols'.
+#
+COMPONENTS = ['element', 'complexType', 'simpleType', 'attribute', 'group', 'attributeGroup']
+REFERENCES = ['type', 'ref', 'base', 'substitutionGroup']
+
+class SymbolTable:
+
+    def __init__(self, root, nameSpaces):
+
+        self.root = root
+        self.xs = '{%s}' % nameSpaces['xs']
+        self.components = {}
+        self.references = {}
+        self.parents = {}
+        self._index(root, None)
+
+    def _index(self, element, parent):
+
+        stack = [(element, parent)]
+        while stack:
+            element, parent = stack.pop()
+            if parent is not None:
+                self.parents[element] = parent
+            if parent is self.root:
+                self._indexComponent(element)
+            for attribute in REFERENCES:
+                if element.get(attribute) is not None:
+                    self.references.setdefault((attribute, element.get(attribute)), {})[element] = None
+
+            stack.extend((child, element) for child in reversed(element))
+
+    def _indexComponent(self, element):
+
+        key = self._componentKey(element)
+        if key is not None:
+            self.components.setdefault(key, {})[element] = None
+
+    def _componentKey(self, element):
+
+        if not isinstance(element.tag, str) or not element.tag.startswith(self.xs) or element.get('name') is None:
+            return None
+
+        kind = element.tag[len(self.xs):]
+        return (kind, element.get('name')) if kind in COMPONENTS else None
+
+    def forget(self, element):
+        #
+        # Drop the element, and all within it, from the table
+        stack = [element]
+        while stack:
+            element = stack.pop()
+            if self.parents.pop(element, None) is self.root:
+                self.components.get(self._componentKey(element), {}).pop(element, None)
+            for attribute in REFERENCES:
+                if element.get(attribute) is not None:
+                    self.references.get((attribute, element.get(attribute)), {}).pop(element, None)
+
+            stack.extend(element)
+
+    def find(self, kind, name):
+        #
+        # The first top-level component of the kind and name, or None
+        for element in self.components.get((kind, name), {}):
+            return element
+
+        return None
+
+    def referrers(self, attribute, value):
+        #
+        # The elements whose 'attribute' is 'value'
+        return list(self.references.get((attribute, value), {}))
+
+    def parent(self, element):
+        #
+        # KeyError for the root
+        return self.parents[element]
+
+    __getitem__ = parent
+
+    def remove(self, element):
+
+        self.parents[element].remove(element)
+        self.forget(element)
+
+    def append(self, parent, element):
+        #
+        # An element moved from elsewhere in the tree is first detached from there.
+        if element in self.parents:
+            self.remove(element)
+
+        parent.append(element)
+        self._index(element, parent)
+
+    def extend(self, parent, elements):
+
+        for element in list(elements):
+            self.append(parent, element)
+
+    def set(self, element, attribute, value):
+        #
+        # Set the attribute, or delete it if 'value' is None
+        if self.parents.get(element) is self.root and attribute == 'name':
+            self.components.get(self._componentKey(element), {}).pop(element, None)
+        if attribute in REFERENCES and element.get(attribute) is not None:
+            self.references.get((attribute, element.get(attribute)), {}).pop(element, None)
+
+        if value is None:
+            element.attrib.pop(attribute, None)
+        else:
+            element.attrib[attribute] = value
+
+        if self.parents.get(element) is self.root and attribute == 'name':
+            self._indexComponent(element)
+        if attribute in REFERENCES and value is not None:
+            self.references.setdefault((attribute, value), {})[element] = None
@@ -0,0 +1,156 @@
+#
+# Name: treeBackend.py
+#
+# Purpose: To let postProcessEA.py work on either an ElementTree or an lxml tree.
+#
+# The post-processing itself only uses the API the two have in common; parents, named
+# components and references are looked up in the symbol table (see symbolTable.py) with
+# either. What differs is kept here:
+#
+#   - parsing. lxml is told to drop comments and processing instructions, as ElementTree does.
+#   - the namespace declarations of the schema element. ElementTree knows nothing of
+#     them, so they are kept as literal 'xmlns:prefix' attributes and written out as
+#     such. lxml will not accept such attributes, so they are kept as attributes in a
+#     private namespace instead.
+#   - serialization, with the schema namespace as the default namespace.
+#   - snapshots of the tree, for checkpointEA.py: a flat, marshalled list of ElementTree's
+#     elements, which is quicker to make and read back than a pickle; lxml's own
+#     serialization, which keeps its namespace declarations.
+#
+# Both backends produce the same bytes. Addendums should use the backend's ET module
+# and declareNamespace()/undeclareNamespace() to stay independent of the backend.
+#
+import marshal
+import re
+import xml.etree.ElementTree as ET
+import zlib
+
+from lxml import etree
+
+class ElementTreeBackend:
+
+    name = 'etree'
+    ET = ET
+
+    def iterparse(self, fname, events):
+
+        return ET.iterparse(fname, events)
+
+    def declareNamespace(self, root, prefix, uri):
+
+        root.set('xmlns:%s' % prefix, uri)
+
+    def undeclareNamespace(self, root, prefix):
+
+        return root.attrib.pop('xmlns:%s' % prefix)
+
+    def serialize(self, root, DefaultNamespace):
+        #
+        # EA does not output the default namespace at the moment.  Will set it here.
+        ET.register_namespace("", DefaultNamespace)
+        #
+        # Namespace declarations follow the root element's other attributes
+        for key in [key for key in root.keys() if key.startswith('xmlns:')]:
+            root.set(key, root.attrib.pop(key))
+
+        return ET.tostring(root, encoding="UTF-8", xml_declaration=True, method="xml").decode('UTF-8')
+
+    def snapshot(self, root):
+        #
+        # (tag, attributes, text, tail, number of children) of each element, in document order
+        items = []
+        stack = [root]
+        while stack:
+            element = stack.pop()
+            items.append((element.tag, dict(element.attrib), element.text, element.tail, len(element)))
+            stack.extend(reversed(element))
+
+        return zlib.compress(marshal.dumps(items), 1)
+
+    def restore(self, data):
+
+        items = iter(marshal.loads(zlib.decompress(data)))
+        tag, attrib, text, tail, count = next(items)
+        root = ET.Element(tag, attrib)
+        root.text, root.tail = text, tail
+        stack = [(root, count)]
+        while stack:
+            parent, count = stack[-1]
+            if len(parent) == count:
+                stack.pop()
+                continue
+
+            tag, attrib, text, tail, count = next(items)
+            element = ET.SubElement(parent, tag, attrib)
+            element.text, element.tail = text, tail
+            stack.append((element, count))
+
+        return root
+
+class LxmlBackend(ElementTreeBackend):
+
+    name = 'lxml'
+    ET = etree
+    DECLARATIONS = 'urn:x-postProcessEA:xmlns'
+
+    def iterparse(self, fname, events):
+        #
+        # ElementTree drops comments and processing instructions; so must lxml.
+        return etree.iterparse(fname, events, remove_comments=True, remove_pis=True)
+
+    def declareNamespace(self, root, prefix, uri):
+
+        root.set('{%s}%s' % (self.DECLARATIONS, prefix), uri)
+
+    def undeclareNamespace(self, root, prefix):
+
+        return root.attrib.pop('{%s}%s' % (self.DECLARATIONS, prefix))
+
+    def serialize(self, root, DefaultNamespace):
+        #
+        # The schema's elements are moved under a new root element declaring the default
+        # namespace, so that lxml writes no prefixes, and moved back once written out: the
+        # tree is left as it was given, as ElementTreeBackend leaves it. The namespace
+        # declarations are added after the other attributes, where ElementTreeBackend puts them.
+        top = etree.Element(root.tag, nsmap={None: DefaultNamespace})
+        declarations = []
+        for key, value in root.items():
+            if key.startswith('{%s}' % self.DECLARATIONS):
+                declarations.append(' xmlns:%s="%s"' % (key[len(self.DECLARATIONS) + 2:],
+                                                        _escapeAttribute(value)))
+            else:
+                top.set(key, value)
+
+        top.text = root.text
+        children = list(root)
+        top.extend(children)
+        try:
+            #
+            # Prefixes bound within the schema have been rewritten as the schema element binds
+            # them (see nameSpaceScopes.py); their declarations go.
+            etree.cleanup_namespaces(top)
+            xmltext = etree.tostring(top, encoding="UTF-8", xml_declaration=True).decode('UTF-8')
+
+        finally:
+            root.extend(children)
+
+        end = _startTagEnd_re.search(xmltext, xmltext.index('?>') + 2).start()
+
+        return xmltext[:end] + ''.join(declarations) + xmltext[end:]
+
+    def snapshot(self, root):
+
+        return zlib.compress(etree.tostring(root), 1)
+
+    def restore(self, data):
+
+        return etree.fromstring(zlib.decompress(data), etree.XMLParser(huge_tree=True))
+
+_startTagEnd_re = re.compile('/?>')
+
+def _escapeAttribute(value):
+
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+BACKENDS = {'etree': ElementTreeBackend(), 'lxml': LxmlBackend()}
+ETREE = BACKENDS['etree']
@@ -0,0 +1,267 @@
+#
+# Name: validateMessages.py
+#
+# Purpose: To validate IWXXM-US messages -- METAR/SPECI, TAF, SIGMET, AIRMET -- in bulk
+#          against the post-processed schemas, without going to the network.
+#
+# The schemas, by default those in schemas/, are compiled once, together, into one schema
+# set, by validateSchemas.py; what they import is taken from the local copies of its catalog.
+# Messages are read from instance files and from archives of messages one after another,
+# each beginning with its XML declaration; bulletin headings and control characters after
+# a message's last element are ignored. The parent process only finds where each message
+# begins; batches of messages are read and validated by a pool of worker processes, each
+# with the compiled schema set, forked from the parent where possible, and a parser of its
+# own that it uses for every message. The results come back in the order of the messages,
+# one for each:
+#
+#   {"file": "taf.txt", "message": 3, "line": 118, "valid": false,
+#    "errors": [{"line": 131, "column": 0, "message": "Element '...': ..."}]}
+#
+# Lines count from the beginning of the file, not the message.
+#
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import time
+
+from lxml import etree
+
+import validateSchemas as vs
+
+FORK = 'fork' in multiprocessing.get_all_start_methods()
+DEFAULT_SCHEMAS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schemas')
+DECLARATION = b'<?xml'
+BATCH = 256
+CHUNK = 1 << 20
+
+def compileSchemaSet(schemaFiles, catalog=None):
+    #
+    # Returns the schema set and the errors of compiling it, once each; the schema set is None
+    # if it does not compile.
+    schema, errors = vs.compileSchemaSet(schemaFiles, catalog)
+    return schema, list(dict.fromkeys(error for schemaErrors in errors.values() for error in schemaErrors))
+
+def messageFiles(paths):
+    #
+    # The files named and the *.xml and *.txt files in the directories named, recursively
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for fname in sorted(filenames):
+                    if os.path.splitext(fname)[1].lower() in ['.xml', '.txt']:
+                        yield os.path.join(dirpath, fname)
+        else:
+            yield path
+
+def findMessages(fname):
+    #
+    # Yields (offset, length, line) of each message in the file, reading it a chunk at a time.
+    # A file without XML declarations is one message; what precedes the first declaration is
+    # not a message unless it has markup.
+    offset, line, markup = 0, 1, False
+    #
+    # 'data' is the file from position 'base'. Up to data[searched], the newlines have been
+    # counted, lineSearched being the line there, and no declaration begins but the message's.
+    data, base, searched, lineSearched = b'', 0, 0, 1
+    with open(fname, 'rb') as fh:
+        while True:
+            chunk = fh.read(CHUNK)
+            data = data + chunk
+            while True:
+                pos = data.find(DECLARATION, max(searched, offset - base + 1))
+                if pos == -1:
+                    break
+
+                lineSearched = lineSearched + data.count(b'\n', searched, pos)
+                if offset > 0 or markup or b'<' in data[max(searched, offset - base):pos]:
+                    yield offset, base + pos - offset, line
+                offset, line, markup = base + pos, lineSearched, True
+                searched = pos
+
+            if not chunk:
+                break
+            #
+            # A declaration may straddle the chunks: its beginning is kept for the next.
+            keep = max(searched, len(data) - len(DECLARATION) + 1)
+            lineSearched = lineSearched + data.count(b'\n', searched, keep)
+            markup = markup or b'<' in data[max(searched, offset - base):keep]
+            data, base, searched = data[keep:], base + keep, 0
+
+    if base + len(data) > offset and (offset > 0 or markup or b'<' in data):
+        yield offset, base + len(data) - offset, line
+
+def findBatches(paths, batchSize=BATCH):
+    #
+    # Yields (file, [(number, offset, length, line), ...]): up to batchSize messages of a file,
+    # numbered from 1 within it
+    for fname in messageFiles(paths):
+        batch = []
+        for number, (offset, length, line) in enumerate(findMessages(fname), 1):
+            batch.append((number, offset, length, line))
+            if len(batch) == batchSize:
+                yield fname, batch
+                batch = []
+        if batch:
+            yield fname, batch
+
+def validateMessage(data, line, schema, parser):
+    #
+    # Returns whether the message, which begins at 'line', is valid, and the errors found
+    try:
+        document = etree.fromstring(_trimmed(data), parser)
+
+    except etree.XMLSyntaxError as err:
+        return False, [_error(entry, line) for entry in parser.error_log] or \
+            [{'line': line + (err.lineno or 1) - 1, 'column': err.offset or 0, 'message': str(err)}]
+
+    if schema.validate(document):
+        return True, []
+
+    return False, [_error(entry, line) for entry in schema.error_log]
+
+def _error(entry, line):
+
+    return {'line': line + entry.line - 1, 'column': entry.column, 'message': entry.message.strip()}
+
+def _trimmed(data):
+    #
+    # The message without what follows its last element
+    end = data.rfind(b'>')
+    return data[:end + 1] if end != -1 else data
+
+def newParser():
+    #
+    # Reused for every message a process validates; nothing is fetched, nor entities expanded.
+    return etree.XMLParser(no_network=True, resolve_entities=False)
+
+class SchemaSetError(Exception):
+
+    def __init__(self, errors):
+
+        Exception.__init__(self, '\n'.join(errors))
+        self.errors = errors
+#
+# What a worker process validates with: the schema set, compiled before the pool is forked
+# or, where processes can not be forked, by each worker as it starts, and its parser
+_worker = {}
+
+def _startWorker(schemaFiles, catalogFile):
+
+    if 'schema' not in _worker:
+        _worker['schema'] = compileSchemaSet(schemaFiles, vs.Catalog(catalogFile))[0]
+    _worker['parser'] = newParser()
+
+def _validateBatch(task):
+    #
+    # Reads the batch's messages, all at once, and returns their results
+    fname, batch = task
+    first = batch[0][1]
+    with open(fname, 'rb') as fh:
+        fh.seek(first)
+        data = fh.read(batch[-1][1] + batch[-1][2] - first)
+
+    results = []
+    for number, offset, length, line in batch:
+        valid, errors = validateMessage(data[offset - first:offset - first + length], line,
+                                        _worker['schema'], _worker['parser'])
+        results.append({'file': fname, 'message': number, 'line': line, 'valid': valid, 'errors': errors,
+                        'bytes': length})
+
+    return results
+
+def validateMessages(paths, schemaFiles, catalogFile=vs.DEFAULT_CATALOG, jobs=1, batchSize=BATCH):
+    #
+    # Yields the result of each message, as described above, in order, with its size in
+    # bytes. SchemaSetError if the schema set does not compile.
+    schema, errors = compileSchemaSet(schemaFiles, vs.Catalog(catalogFile))
+    if schema is None:
+        raise SchemaSetError(errors)
+
+    _worker.clear()
+    _worker['schema'] = schema
+    try:
+        if jobs <= 1:
+            _startWorker(schemaFiles, catalogFile)
+            for task in findBatches(paths, batchSize):
+                for result in _validateBatch(task):
+                    yield result
+            return
+
+        if not FORK:
+            del _worker['schema']
+        context = multiprocessing.get_context('fork' if FORK else None)
+        with context.Pool(jobs, _startWorker, (schemaFiles, catalogFile)) as pool:
+            for results in pool.imap(_validateBatch, findBatches(paths, batchSize)):
+                for result in results:
+                    yield result
+
+    finally:
+        _worker.clear()
+
+def reportMessages(results, report=None, quiet=False):
+    #
+    # Prints the invalid messages' errors, writes each result to 'report', a file object, as a
+    # line of JSON, and returns the totals and throughput.
+    summary = {'messages': 0, 'valid': 0, 'invalid': 0, 'bytes': 0}
+    started = time.perf_counter()
+    for result in results:
+        summary['messages'] += 1
+        summary['bytes'] += result['bytes']
+        if result['valid']:
+            summary['valid'] += 1
+        else:
+            summary['invalid'] += 1
+            if not quiet:
+                print('{}: message {} at line {} is not valid:'.format(result['file'], result['message'], result['line']))
+                for error in result['errors']:
+                    print('    line {}, column {}: {}'.format(error['line'], error['column'], error['message']))
+
+        if report is not None:
+            report.write(json.dumps(result) + '\n')
+
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    summary['messagesPerSecond'] = round(summary['messages'] / elapsed, 1)
+    summary['megabytesPerSecond'] = round(summary['bytes'] / elapsed / 1e6, 2)
+    return summary
+
+if __name__ == '__main__':
+
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Validate IWXXM-US messages against the post-processed schemas, offline.')
+    parser.add_argument('messages', nargs='+',
+                        help='message files, archives of messages one after another, or directories of them')
+    parser.add_argument('--schemas', nargs='+',
+                        help='schemas to validate against (default: those in %s)' % DEFAULT_SCHEMAS)
+    parser.add_argument('--catalog', default=vs.DEFAULT_CATALOG,
+                        help='XML catalog of the imported schemas\' local copies (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes (default: %(default)s)')
+    parser.add_argument('--batch', type=int, default=BATCH,
+                        help='number of messages each worker takes at a time (default: %(default)s)')
+    parser.add_argument('--report', metavar='FILE',
+                        help='write the result of each message to FILE, one JSON object a line')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not list the invalid messages\' errors')
+    args = parser.parse_args()
+
+    schemaFiles = args.schemas or sorted(glob.glob(os.path.join(DEFAULT_SCHEMAS, '*.xsd')))
+    try:
+        with contextlib.ExitStack() as stack:
+            report = stack.enter_context(open(args.report, 'w')) if args.report else None
+            summary = reportMessages(validateMessages(args.messages, schemaFiles, args.catalog, args.jobs, args.batch),
+                                     report, args.quiet)
+
+    except SchemaSetError as err:
+        print('The schemas do not compile:')
+        for error in err.errors:
+            print('    {}'.format(error))
+        sys.exit(2)
+
+    print('{messages} messages, {valid} valid, {invalid} not; {messagesPerSecond} messages, '
+          '{megabytesPerSecond} MB a second'.format(**summary))
+    sys.exit(1 if summary['invalid'] else 0)
@@ -0,0 +1,307 @@
+#
+# Name: validateSchemas.py
+#
+# Purpose: To check that the post-processed schemas compile, without going to the network.
+#
+# The schemas are compiled together, as one schema set, with lxml's XMLSchema, so that what
+# they import is parsed and compiled once however many of them import it; each error is given
+# back to the schema it is in. The schemas they import (GML, AIXM and theirs in turn) are not
+# fetched but looked up in an OASIS XML catalog, by default catalog/catalog.xml, which maps
+# their URLs to copies kept under catalog/. The copies are not in git; mirrorSchemas() makes
+# them, online, once. A schema that is not in the catalog, or whose copy has not been made,
+# makes the compilation fail, naming it and what to do. The Catalog keeps the bytes of the
+# copies it has read, for the schema sets compiled after the first, e.g. by watchEA.py.
+#
+import os
+import urllib.parse
+import urllib.request
+
+from lxml import etree
+
+XSD_NS = 'http://www.w3.org/2001/XMLSchema'
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'catalog', 'catalog.xml')
+REMOTE = ('http://', 'https://', 'ftp://')
+SCHEMASET = 'urn:x-validateSchemas:'
+
+class Catalog:
+    #
+    # The <uri>, <system>, <rewriteURI>, <rewriteSystem> and <nextCatalog> entries of an OASIS
+    # XML catalog, and the content of the copies read through it so far.
+    def __init__(self, catalogFile=DEFAULT_CATALOG):
+
+        self.catalogFile = os.path.abspath(catalogFile)
+        self.uris = {}
+        self.rewrites = []
+        self.contents = {}
+        self._read(self.catalogFile)
+        self.rewrites.sort(key=lambda rewrite: -len(rewrite[0]))
+
+    def _read(self, catalogFile):
+
+        base = os.path.dirname(catalogFile)
+        try:
+            root = etree.parse(catalogFile).getroot()
+        except (IOError, OSError, etree.XMLSyntaxError) as err:
+            print('Catalog {} not read: {}'.format(catalogFile, err))
+            return
+
+        for element in root.iter():
+            tag = etree.QName(element).localname if isinstance(element.tag, str) else None
+            if tag in ['uri', 'system']:
+                self.uris[element.get('name' if tag == 'uri' else 'systemId')] = \
+                    os.path.join(base, element.get('uri'))
+            elif tag in ['rewriteURI', 'rewriteSystem']:
+                self.rewrites.append((element.get('uriStartString' if tag == 'rewriteURI' else 'systemIdStartString'),
+                                      os.path.join(base, element.get('rewritePrefix'))))
+            elif tag == 'nextCatalog':
+                self._read(os.path.join(base, element.get('catalog')))
+
+    def lookup(self, url):
+        #
+        # The local copy for the URL, or None if the catalog has none
+        try:
+            return self.uris[url]
+        except KeyError:
+            pass
+
+        for start, prefix in self.rewrites:
+            if url.startswith(start):
+                return os.path.normpath(prefix + url[len(start):])
+
+        return None
+
+    def content(self, url):
+        #
+        # The bytes of the local copy, or None if there is none
+        path = self.lookup(url)
+        if path is None:
+            return None
+
+        if path not in self.contents:
+            try:
+                with open(path, 'rb') as fh:
+                    self.contents[path] = fh.read()
+            except (IOError, OSError):
+                self.contents[path] = None
+
+        return self.contents[path]
+
+    def explain(self, url):
+        #
+        # Why the URL has no local copy, and what to do about it
+        path = self.lookup(url)
+        if path is None:
+            return '%s: not in the catalog; add an entry for it to %s' % (url, self.catalogFile)
+
+        return '%s: its copy, %s, has not been made; run "python validateSchemas.py --mirror" once, online' % \
+            (url, path)
+
+class CatalogResolver(etree.Resolver):
+    #
+    # Hands libxml2 the catalog's copies of remote schemas. Each keeps its URL as its base, so
+    # that the schemas it includes and imports by relative location are looked up as well.
+    # Also hands it the schemas, 'drivers', that a schema set is made of.
+    def __init__(self, catalog, drivers=None):
+
+        self.catalog = catalog
+        self.drivers = drivers or {}
+        self.missing = []
+
+    def resolve(self, url, pubid, context):
+
+        if url in self.drivers:
+            return self.resolve_string(self.drivers[url], context, base_url=url)
+
+        if not url.startswith(REMOTE):
+            return None
+
+        data = self.catalog.content(url)
+        if data is None:
+            self.missing.append(url)
+            return None
+
+        return self.resolve_string(data, context, base_url=url)
+
+def fileURL(schemaFile):
+    #
+    # As libxml2 names the file in its errors
+    return urllib.parse.urljoin('file:', urllib.request.pathname2url(os.path.abspath(schemaFile)))
+
+def compileSchemaSet(schemaFiles, catalog=None):
+    #
+    # Returns the schema set, None if it does not compile, and {schema file: errors}, the
+    # errors as 'file:line: message'. The schemas of each target namespace are included in one
+    # schema, and these imported by the one compiled. Errors in none of the schemas -- in
+    # what they import, or a copy missing -- are given to each schema that imports remote
+    # schemas, itself or through the others.
+    if catalog is None:
+        catalog = Catalog()
+
+    errors = dict((schemaFile, []) for schemaFile in schemaFiles)
+    missing = dict((schemaFile, []) for schemaFile in schemaFiles)
+    byNamespace, schemaURLs, references = {}, {}, {}
+    for schemaFile in errors:
+        try:
+            root = etree.parse(schemaFile).getroot()
+        except (IOError, OSError, etree.XMLSyntaxError) as err:
+            errors[schemaFile].append('%s: %s' % (schemaFile, err))
+            continue
+
+        byNamespace.setdefault(root.get('targetNamespace', ''), []).append(schemaFile)
+        schemaURLs[fileURL(schemaFile)] = schemaFile
+        references[schemaFile] = [urllib.parse.urljoin(fileURL(schemaFile), x.get('schemaLocation'))
+                                  for x in root.iter('{%s}import' % XSD_NS, '{%s}include' % XSD_NS,
+                                                     '{%s}redefine' % XSD_NS) if x.get('schemaLocation')]
+        #
+        # Of the imports of a namespace, libxml2 only follows the first in the set, so the
+        # copies of the others are looked for here.
+        missing[schemaFile] = [url for url in references[schemaFile]
+                               if url.startswith(REMOTE) and catalog.content(url) is None]
+
+    if len(byNamespace) == 0:
+        return None, errors
+
+    drivers = {}
+    top = etree.Element('{%s}schema' % XSD_NS)
+    for num, (targetNamespace, files) in enumerate(sorted(byNamespace.items())):
+        driver = etree.Element('{%s}schema' % XSD_NS)
+        if targetNamespace:
+            driver.set('targetNamespace', targetNamespace)
+        for schemaFile in files:
+            etree.SubElement(driver, '{%s}include' % XSD_NS, schemaLocation=fileURL(schemaFile))
+
+        url = '%s%d' % (SCHEMASET, num)
+        drivers[url] = etree.tostring(driver)
+        importElement = etree.SubElement(top, '{%s}import' % XSD_NS, schemaLocation=url)
+        if targetNamespace:
+            importElement.set('namespace', targetNamespace)
+
+    parser = etree.XMLParser(no_network=True)
+    resolver = CatalogResolver(catalog, drivers)
+    parser.resolvers.add(resolver)
+    elsewhere = []
+    try:
+        schema = etree.XMLSchema(etree.fromstring(etree.tostring(top), parser, base_url=SCHEMASET))
+
+    except (etree.XMLSyntaxError, etree.XMLSchemaParseError) as err:
+        schema = None
+        #
+        # libxml2's own account of a copy missing, in the schema set's driver, adds nothing
+        for entry in err.error_log:
+            error = '%s:%s: %s' % (schemaURLs.get(entry.filename, entry.filename), entry.line, entry.message.strip())
+            if entry.filename in schemaURLs:
+                errors[schemaURLs[entry.filename]].append(error)
+            elif entry.filename != '<string>':
+                elsewhere.append(error)
+
+        if not any(errors.values()) and len(elsewhere) == 0 and len(resolver.missing) == 0:
+            elsewhere.append(str(err))
+    #
+    # The schemas that import remote schemas, themselves or through others of the set
+    remote = set(schemaFile for schemaFile, urls in references.items() if any(url.startswith(REMOTE) for url in urls))
+    while True:
+        more = set(schemaFile for schemaFile, urls in references.items()
+                   if any(schemaURLs.get(url) in remote for url in urls)) - remote
+        if len(more) == 0:
+            break
+        remote |= more
+
+    for schemaFile in [x for x in errors if x in remote] or list(schemaURLs.values()):
+        urls = sorted(set(missing[schemaFile] + resolver.missing))
+        errors[schemaFile][:0] = [catalog.explain(url) for url in urls] + elsewhere
+
+    return (None if any(errors.values()) else schema), errors
+
+def validateSchemas(schemaFiles, catalog=None):
+    #
+    # Returns {schema file: errors}
+    return compileSchemaSet(schemaFiles, catalog)[1]
+
+def reportValidation(results):
+    #
+    # Print the errors of the schemas that do not compile and return how many there are.
+    failed = 0
+    for schemaFile, errors in results.items():
+        if len(errors) == 0:
+            print('{} compiles'.format(os.path.basename(schemaFile)))
+            continue
+
+        failed += 1
+        print('{} does not compile:'.format(os.path.basename(schemaFile)))
+        for error in errors:
+            print('    {}'.format(error))
+
+    return failed
+
+def importedURLs(schemaFiles):
+    #
+    # The remote schemas the schemas import, in order of first appearance
+    urls = {}
+    for schemaFile in schemaFiles:
+        for element in etree.parse(schemaFile).getroot().iter('{%s}import' % XSD_NS):
+            if (element.get('schemaLocation') or '').startswith(REMOTE):
+                urls.setdefault(element.get('schemaLocation'), schemaFile)
+
+    return list(urls)
+
+def mirrorSchemas(urls, catalog, timeout=30):
+    #
+    # Online: copy the schemas at the URLs, and those they include and import, to where the
+    # catalog looks for them. Copies already made are kept. Returns the number of failures.
+    failures = 0
+    pending = list(reversed(urls))
+    seen = set()
+    while pending:
+        url = pending.pop()
+        if url in seen:
+            continue
+        seen.add(url)
+
+        path = catalog.lookup(url)
+        if path is None:
+            print('{} is not in the catalog'.format(url))
+            failures += 1
+            continue
+
+        try:
+            if not os.path.isfile(path):
+                print('Copying {}'.format(url), flush=True)
+                with urllib.request.urlopen(url, timeout=timeout) as response:
+                    data = response.read()
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(path, 'wb') as fh:
+                    fh.write(data)
+
+            root = etree.parse(path).getroot()
+
+        except (IOError, OSError, etree.XMLSyntaxError) as err:
+            print('{} could not be copied: {}'.format(url, err))
+            failures += 1
+            continue
+
+        for element in root.iter('{%s}import' % XSD_NS, '{%s}include' % XSD_NS, '{%s}redefine' % XSD_NS):
+            if element.get('schemaLocation'):
+                pending.append(urllib.parse.urljoin(url, element.get('schemaLocation')))
+
+    return failures
+
+if __name__ == '__main__':
+
+    import argparse
+    import glob
+    import sys
+
+    parser = argparse.ArgumentParser(description='Check that schemas compile, using local copies of the schemas they import.')
+    parser.add_argument('schemas', nargs='*', help='schema files (default: those in ../schemas)')
+    parser.add_argument('--catalog', default=DEFAULT_CATALOG, help='XML catalog (default: %(default)s)')
+    parser.add_argument('--mirror', action='store_true',
+                        help='first copy the imported schemas missing from the catalog directory (online)')
+    args = parser.parse_args()
+
+    schemaFiles = args.schemas or sorted(glob.glob(os.path.join(os.path.dirname(DEFAULT_CATALOG), '..', 'schemas', '*.xsd')))
+    catalog = Catalog(args.catalog)
+    if args.mirror and mirrorSchemas(importedURLs(schemaFiles), catalog):
+        sys.exit(1)
+
+    sys.exit(1 if reportValidation(validateSchemas(schemaFiles, catalog)) else 0)
@@ -0,0 +1,182 @@
+#
+# Name: watchEA.py
+#
+# Purpose: To post-process schemas again as soon as what they are made from changes.
+#
+# The EA schemas and the configuration files of the products are polled for changes.
+# Once a burst of writes has settled (EA writes a schema in more than one go), the
+# products affected, and those that include their schemas, are post-processed again
+# in this process, so that Python starts, and the rule plans are compiled, only once.
+# Configuration files are compiled again only when they change; the local copies of
+# the imported schemas read for --validate are kept between runs. A product that cannot be
+# post-processed, say because its EA schema is only half written, is reported and tried
+# again on its next change; the others, and the watching, carry on.
+#
+import os
+import time
+import traceback
+
+import compileRules as cr
+import postProcessEA as pea
+import treeBackend as tb
+import validateSchemas as vs
+
+def snapshot(paths):
+    #
+    # {path: (modification time, size)} of those that exist
+    stamps = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps[path] = (stat.st_mtime_ns, stat.st_size)
+        except (IOError, OSError):
+            pass
+
+    return stamps
+
+class Watcher:
+
+    def __init__(self, cfgfiles, basedir, backend=tb.ETREE, stream=False, validate=False, checkpoints=False):
+
+        self.cfgfiles = list(cfgfiles)
+        self.basedir = basedir
+        self.backend = backend
+        self.stream = stream
+        self.checkpoints = checkpoints
+        self.catalog = vs.Catalog() if validate else None
+        self.plans = {}
+        for cfgfile in self.cfgfiles:
+            self.loadPlan(cfgfile)
+
+    def loadPlan(self, cfgfile):
+        #
+        # A malformed configuration file leaves the product out until it is mended.
+        try:
+            self.plans[cfgfile] = cr.loadPlan(cfgfile)
+        except (cr.ConfigurationError, cr.cp.Error) as err:
+            print('Malformed configuration file %s' % err)
+            self.plans.pop(cfgfile, None)
+        except (IOError, OSError) as err:
+            print('Configuration file %s not read: %s' % (cfgfile, err))
+            self.plans.pop(cfgfile, None)
+
+    def _path(self, plan, directory):
+
+        if plan['location'] is None:
+            return None
+        return os.path.join(self.basedir, plan['location'][directory], plan['schema']['name'])
+
+    def inputs(self):
+        #
+        # {file watched: configuration file of the product it belongs to}
+        inputs = dict((os.path.abspath(cfgfile), cfgfile) for cfgfile in self.cfgfiles)
+        for cfgfile, plan in self.plans.items():
+            if self._path(plan, 'EADirectory') is not None:
+                inputs[os.path.abspath(self._path(plan, 'EADirectory'))] = cfgfile
+
+        return inputs
+
+    def affected(self, cfgfiles):
+        #
+        # The products, and those that include or import their schemas, in the order to process them
+        names = dict((plan['schema']['name'], cfgfile) for cfgfile, plan in self.plans.items())
+        affected = set(cfgfile for cfgfile in cfgfiles if cfgfile in self.plans)
+        pending = list(affected)
+        while pending:
+            name = self.plans[pending.pop()]['schema']['name']
+            for cfgfile, plan in self.plans.items():
+                if cfgfile not in affected and name in pea.schemaDependencies(plan):
+                    affected.add(cfgfile)
+                    pending.append(cfgfile)
+
+        levels = pea.includeLevels([self.plans[cfgfile] for cfgfile in self.cfgfiles if cfgfile in affected])
+        return [names[plan['schema']['name']] for plans in levels for plan in plans]
+
+    def process(self, changed):
+        #
+        # 'changed' are the files watched that changed
+        inputs = self.inputs()
+        cfgfiles = set(inputs[path] for path in changed if path in inputs)
+        for cfgfile in cfgfiles:
+            if os.path.abspath(cfgfile) in changed:
+                self.loadPlan(cfgfile)
+
+        schemaFiles = []
+        for cfgfile in self.affected(cfgfiles):
+            try:
+                if pea.main(self.plans[cfgfile], self.basedir, backend=self.backend, stream=self.stream,
+                            checkpoints=self.checkpoints) is not None:
+                    schemaFiles.append(self._path(self.plans[cfgfile], 'ReleaseDirectory'))
+            #
+            # Whatever the EA schema, the rules or the addendums raise, e.g. ET.ParseError for
+            # a schema EA is still writing, is reported; the product is tried again when it
+            # next changes.
+            except Exception as err:
+                print('%s not post-processed: %s' % (self.plans[cfgfile]['schema']['name'],
+                                                     ''.join(traceback.format_exception_only(err.__class__, err)).strip()))
+
+        if len(schemaFiles):
+            print('Post-processed %s' % ' '.join(os.path.basename(schemaFile) for schemaFile in schemaFiles))
+        if self.catalog is not None and len(schemaFiles):
+            vs.reportValidation(vs.validateSchemas(schemaFiles, self.catalog))
+
+    def run(self, interval=0.2, settle=0.3):
+        #
+        # Polls every 'interval' seconds; a change is acted upon once nothing more has changed
+        # for 'settle' seconds. Stops on Ctrl-C.
+        print('Watching %d product(s) for changes; Ctrl-C to stop.' % len(self.cfgfiles), flush=True)
+        stamps = snapshot(self.inputs())
+        try:
+            while True:
+                time.sleep(interval)
+                current = snapshot(self.inputs())
+                if current == stamps:
+                    continue
+
+                while True:
+                    time.sleep(settle)
+                    later = snapshot(self.inputs())
+                    if later == current:
+                        break
+                    current = later
+
+                changed = set(path for path in set(stamps) | set(current) if stamps.get(path) != current.get(path))
+                started = time.perf_counter()
+                self.process(changed)
+                print('Done in %.2f s; watching.' % (time.perf_counter() - started), flush=True)
+                #
+                # A configuration file read again may name another EA schema.
+                stamps = snapshot(self.inputs())
+
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Post-process EA schemas whenever they, or their configuration files, change.')
+    parser.add_argument('products', nargs='+', metavar='product',
+                        help='name of product configuration file, without the .cfg extension')
+    parser.add_argument('--backend', choices=sorted(tb.BACKENDS), default='etree',
+                        help='XML tree implementation to post-process with (default: etree)')
+    parser.add_argument('--stream', action='store_true',
+                        help='process schemas one top-level element at a time, in bounded memory')
+    parser.add_argument('--checkpoints', action='store_true',
+                        help='save each schema after each stage and resume from the last one whose inputs are unchanged')
+    parser.add_argument('--validate', action='store_true',
+                        help='check that the schemas compile, offline, with the imported schemas in the catalog')
+    parser.add_argument('--interval', type=float, default=0.2, help='seconds between polls (default: 0.2)')
+    parser.add_argument('--settle', type=float, default=0.3,
+                        help='seconds without further changes before processing (default: 0.3)')
+    args = parser.parse_args()
+    #
+    # As for postProcessEA.py, directories in the configuration files are relative to the
+    # parent of the current working directory.
+    cfgfiles = [cfgfile for cfgfile in ['%s.cfg' % product for product in args.products]
+                if os.path.isfile(cfgfile)]
+
+    watcher = Watcher(cfgfiles, os.path.dirname(os.getcwd()), tb.BACKENDS[args.backend], args.stream, args.validate,
+                      args.checkpoints)
+    watcher.process(set(watcher.inputs()))
+    watcher.run(args.interval, args.settle)
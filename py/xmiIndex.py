@@ -0,0 +1,239 @@
+#
+# Name: xmiIndex.py
+#
+# Purpose: To look things up in the EA model, as exported to XMI 1.1 (IWXXM-US-3.0.xml),
+#          without searching the export by hand, and to check the configuration files
+#          against it.
+#
+# The export is read once, as a stream of records (see xmiStream.py), into an index of its
+# packages, classes, data types, attributes and associations, with their stereotypes,
+# documentation and tagged values, keyed by xmi.id and looked up by name and stereotype.
+# loadIndex() keeps the index in the __pycache__ directory next to the export, as
+# compileRules.loadPlan() does with rule plans (see cachedFile.py), so the export is only
+# read again when it changes.
+#
+import os
+
+import cachedFile as cf
+import xmiStream as xs
+
+INDEX_VERSION = 1
+DEFAULT_XMI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'IWXXM-US-3.0.xml')
+KINDS = ['package', 'class', 'datatype', 'attribute', 'association']
+
+def _record(record, tags, stereotype, **fields):
+
+    if stereotype is None:
+        stereotype = tags.get('stereotype')
+
+    indexed = {'name': record.name, 'stereotype': stereotype,
+               'documentation': tags.get('documentation', tags.get('description')), 'tags': tags}
+    indexed.update(fields)
+    return indexed
+
+def buildIndex(xmiFile):
+    #
+    # One pass over the export's records (see xmiStream.py). The tagged values and stereotype
+    # of a model element come before it, and are set aside until it does.
+    index = dict((kind, {}) for kind in KINDS)
+    index['generalizations'] = []
+    tags, stereotypes, attributes, ends = {}, {}, {}, {}
+    #
+    for record in xs.records(xmiFile):
+        if isinstance(record, xs.TaggedValue):
+            tags.setdefault(record.owner, {}).setdefault(record.tag, record.value)
+            continue
+
+        if isinstance(record, xs.StereotypeRef):
+            stereotypes.setdefault(record.owner, record.name)
+            continue
+
+        if isinstance(record, xs.AssociationEnd):
+            ends.setdefault(record.association, []).append({'name': record.name, 'type': record.type,
+                                                            'multiplicity': record.multiplicity,
+                                                            'aggregation': record.aggregation,
+                                                            'navigable': record.navigable})
+            continue
+
+        if isinstance(record, xs.Generalization):
+            index['generalizations'].append((record.subtype, record.supertype))
+            continue
+
+        recordTags = tags.pop(record.xmiId, {})
+        stereotype = stereotypes.pop(record.xmiId, None)
+        if isinstance(record, xs.Package):
+            index['package'][record.xmiId] = _record(record, recordTags, stereotype, parent=record.parent)
+
+        elif isinstance(record, xs.Class):
+            index['class'][record.xmiId] = _record(record, recordTags, stereotype, package=record.package,
+                                                   abstract=record.abstract,
+                                                   attributes=attributes.pop(record.xmiId, []))
+
+        elif isinstance(record, xs.Attribute):
+            index['attribute'][record.xmiId] = _record(record, recordTags, stereotype, owner=record.owner,
+                                                       type=record.type, typeName=recordTags.get('type'),
+                                                       multiplicity='%s..%s' % (recordTags.get('lowerBound', '1'),
+                                                                                recordTags.get('upperBound', '1')))
+            attributes.setdefault(record.owner, []).append(record.xmiId)
+
+        elif isinstance(record, xs.DataType):
+            index['datatype'][record.xmiId] = _record(record, recordTags, stereotype)
+
+        elif isinstance(record, xs.Association):
+            index['association'][record.xmiId] = _record(record, recordTags, stereotype,
+                                                         ends=ends.pop(record.xmiId, []))
+    #
+    # Look-up tables: by name (association ends by their role names) and by stereotype
+    names, stereotypes = {}, {}
+    for kind in KINDS:
+        for xmiId, record in index[kind].items():
+            if record['name']:
+                names.setdefault(record['name'], []).append((kind, xmiId))
+            if record['stereotype']:
+                stereotypes.setdefault(record['stereotype'], []).append((kind, xmiId))
+
+    for xmiId, record in index['association'].items():
+        for end in record['ends']:
+            if end['name'] and end['name'] != record['name']:
+                names.setdefault(end['name'], []).append(('association', xmiId))
+
+    index['names'] = names
+    index['stereotypes'] = stereotypes
+    return index
+
+def loadIndex(xmiFile=DEFAULT_XMI):
+    #
+    # The index, read again only if the export has changed
+    return cf.loadCached(xmiFile, cf.cachePath(xmiFile, 'index'), INDEX_VERSION, buildIndex)
+
+def lookup(index, xmiId):
+    #
+    # Returns (kind, record) of the model element with that xmi.id, or (None, None)
+    for kind in KINDS:
+        if xmiId in index[kind]:
+            return kind, index[kind][xmiId]
+
+    return None, None
+
+def query(index, name=None, stereotype=None, kind=None):
+    #
+    # Returns [(kind, xmi.id, record)] of the model elements with all of the given name,
+    # stereotype and kind.
+    if name is not None:
+        found = index['names'].get(name, [])
+    elif stereotype is not None:
+        found = index['stereotypes'].get(stereotype, [])
+    else:
+        found = [(k, xmiId) for k in KINDS for xmiId in index[k]]
+
+    results = []
+    for k, xmiId in found:
+        record = index[k][xmiId]
+        if (kind is None or k == kind) and (stereotype is None or record['stereotype'] == stereotype):
+            results.append((k, xmiId, record))
+
+    return results
+
+def propertyNames(index):
+    #
+    # Names of the classes' attributes and of the association roles: the elements of the schemas
+    return set(record['name'] for record in index['attribute'].values()) | \
+        set(end['name'] for record in index['association'].values() for end in record['ends'] if end['name'])
+
+def typeNames(index):
+
+    return set(record['name'] for kind in ['class', 'datatype'] for record in index[kind].values() if record['name'])
+
+def _typeName(schemaType):
+    #
+    # 'iwxxm-us:SectorType' is the schema type of class Sector
+    name = schemaType.rpartition(':')[2]
+    return name[:-len('Type')] if name.endswith('Type') else name
+
+def checkPlan(index, plan):
+    #
+    # Returns [(section, entry, problem)] for the [codeLists], [dataTypes], [setNilAttribute] and
+    # [attributeDocStrings] entries of a rule plan that have no counterpart in the model. Types
+    # of the imported schemas, e.g. gml:, are not the model's to check.
+    properties, types = propertyNames(index), typeNames(index)
+    imported = lambda schemaType: schemaType.partition(':')[0] in plan.get('imports', {})
+    rules = plan['rules']
+    problems = []
+    for name, codeListType in rules.get('codeLists', {}).items():
+        if name not in properties:
+            problems.append(('codeLists', name, 'no attribute or association role of that name'))
+        if _typeName(codeListType) not in types and not imported(codeListType):
+            problems.append(('codeLists', name, 'no class %s for %s' % (_typeName(codeListType), codeListType)))
+
+    for schemaType in rules.get('dataTypes', {}):
+        if _typeName(schemaType) not in types and not imported(schemaType):
+            problems.append(('dataTypes', schemaType, 'no class or data type %s' % _typeName(schemaType)))
+
+    for name in rules.get('setNilAttribute', []):
+        if name not in properties:
+            problems.append(('setNilAttribute', name, 'no attribute or association role of that name'))
+
+    for name in rules.get('attributeDocStrings', {}):
+        if name not in properties:
+            problems.append(('attributeDocStrings', name, 'no attribute or association role of that name'))
+
+    return problems
+
+def _describe(index, kind, xmiId, record):
+
+    owner = ''
+    if kind == 'attribute':
+        owner = ' of %s' % index['class'].get(record['owner'], {}).get('name')
+    elif kind == 'class':
+        owner = ' in %s' % index['package'].get(record['package'], {}).get('name')
+
+    return '{:<12}{:<40}{:<16}{}{}'.format(kind, record['name'] or '', record['stereotype'] or '', xmiId, owner)
+
+if __name__ == '__main__':
+
+    import argparse
+    import sys
+
+    import compileRules as cr
+
+    parser = argparse.ArgumentParser(description='Look up elements of the EA model in its XMI export.')
+    parser.add_argument('--xmi', default=DEFAULT_XMI, help='XMI export of the model (default: %(default)s)')
+    parser.add_argument('--name', help='model elements of this name')
+    parser.add_argument('--stereotype', help='model elements of this stereotype')
+    parser.add_argument('--kind', choices=KINDS, help='model elements of this kind')
+    parser.add_argument('--id', help='the model element with this xmi.id, in full')
+    parser.add_argument('--check', nargs='+', metavar='CFG',
+                        help='report configuration file entries with no counterpart in the model')
+    args = parser.parse_args()
+
+    index = loadIndex(args.xmi)
+    if args.id:
+        kind, record = lookup(index, args.id)
+        if kind is None:
+            print('No model element with xmi.id %s' % args.id)
+            sys.exit(1)
+        print(_describe(index, kind, args.id, record))
+        for key, value in sorted(record.items()):
+            if key != 'tags':
+                print('  %s: %s' % (key, value))
+        for key, value in sorted(record['tags'].items()):
+            print('  tag %s: %s' % (key, value))
+
+    elif args.check:
+        problems = 0
+        for cfgfile in args.check:
+            try:
+                plan = cr.loadPlan(cfgfile)
+            except cr.ConfigurationError as err:
+                print('Malformed configuration file %s' % err)
+                problems += 1
+                continue
+
+            for section, entry, problem in checkPlan(index, plan):
+                print('%s [%s] %s: %s' % (cfgfile, section, entry, problem))
+                problems += 1
+        sys.exit(1 if problems else 0)
+
+    else:
+        for kind, xmiId, record in query(index, args.name, args.stereotype, args.kind):
+            print(_describe(index, kind, xmiId, record))
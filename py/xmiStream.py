@@ -0,0 +1,253 @@
+#
+# Name: xmiStream.py
+#
+# Purpose: To read the EA model's XMI 1.1 export as a stream of small records, in memory
+#          that grows with the depth of the export's nesting, not with its size.
+#
+# The export is parsed incrementally; each element is dropped from the tree as soon as it
+# ends, so that no more than the elements enclosing the one being read are ever held. The
+# parser decodes the export (EA writes windows-1252) once; the records hold only strings.
+# A record is yielded as its element ends, after those of the tagged values and stereotypes
+# of its own, which name it by xmi.id as their owner. Attributes have no xmi.id of their own
+# in EA's exports; they are known by their ea_guid tagged value, so the records of an
+# attribute's tagged values and stereotype are held back until it has been read. The same
+# goes for association ends, known by their association's xmi.id and their ea_end tagged
+# value ('source' or 'target'). The tagged values that EA writes after the model, those of
+# the UML profile (e.g. an application schema's targetNamespace, a code list's vocabulary),
+# name their owner by their modelElement attribute.
+#
+import sys
+import xml.etree.ElementTree as ET
+
+UML = '{omg.org/UML1.3}'
+ASSOCIATION = UML + 'Association'
+ASSOCIATIONEND = UML + 'AssociationEnd'
+ATTRIBUTE = UML + 'Attribute'
+CLASS = UML + 'Class'
+CLASSIFIER = UML + 'Classifier'
+DATATYPE = UML + 'DataType'
+GENERALIZATION = UML + 'Generalization'
+MODELELEMENT_STEREOTYPE = UML + 'ModelElement.stereotype'
+MODELELEMENT_TAGGEDVALUE = UML + 'ModelElement.taggedValue'
+PACKAGE = UML + 'Package'
+STEREOTYPE = UML + 'Stereotype'
+STRUCTURALFEATURE_TYPE = UML + 'StructuralFeature.type'
+STUB = 'EAStub'
+TAGGEDVALUE = UML + 'TaggedValue'
+
+class Record:
+
+    __slots__ = ()
+
+    def __repr__(self):
+
+        return '%s(%s)' % (type(self).__name__, ', '.join('%s=%r' % (name, getattr(self, name))
+                                                          for name in self.__slots__))
+
+class Package(Record):
+
+    __slots__ = ('xmiId', 'name', 'parent')
+
+    def __init__(self, xmiId, name, parent):
+
+        self.xmiId, self.name, self.parent = xmiId, name, parent
+
+class Class(Record):
+
+    __slots__ = ('xmiId', 'name', 'package', 'abstract')
+
+    def __init__(self, xmiId, name, package, abstract):
+
+        self.xmiId, self.name, self.package, self.abstract = xmiId, name, package, abstract
+
+class DataType(Record):
+
+    __slots__ = ('xmiId', 'name')
+
+    def __init__(self, xmiId, name):
+
+        self.xmiId, self.name = xmiId, name
+
+class Stub(Record):
+    #
+    # EA's stand-in for a model element outside the export, e.g. a class of another model
+    __slots__ = ('xmiId', 'name', 'umlType')
+
+    def __init__(self, xmiId, name, umlType):
+
+        self.xmiId, self.name, self.umlType = xmiId, name, umlType
+
+class Attribute(Record):
+
+    __slots__ = ('xmiId', 'name', 'owner', 'type')
+
+    def __init__(self, xmiId, name, owner, type):
+
+        self.xmiId, self.name, self.owner, self.type = xmiId, name, owner, type
+
+class Association(Record):
+
+    __slots__ = ('xmiId', 'name')
+
+    def __init__(self, xmiId, name):
+
+        self.xmiId, self.name = xmiId, name
+
+class AssociationEnd(Record):
+
+    __slots__ = ('xmiId', 'association', 'name', 'type', 'multiplicity', 'aggregation', 'navigable')
+
+    def __init__(self, xmiId, association, name, type, multiplicity, aggregation, navigable):
+
+        self.xmiId, self.association, self.name, self.type = xmiId, association, name, type
+        self.multiplicity, self.aggregation, self.navigable = multiplicity, aggregation, navigable
+
+class Generalization(Record):
+
+    __slots__ = ('subtype', 'supertype')
+
+    def __init__(self, subtype, supertype):
+
+        self.subtype, self.supertype = subtype, supertype
+
+class TaggedValue(Record):
+
+    __slots__ = ('owner', 'tag', 'value')
+
+    def __init__(self, owner, tag, value):
+
+        self.owner, self.tag, self.value = owner, tag, value
+
+class StereotypeRef(Record):
+    #
+    # A model element's stereotype, by name or by the xmi.id of its definition
+    __slots__ = ('owner', 'name', 'idref')
+
+    def __init__(self, owner, name, idref):
+
+        self.owner, self.name, self.idref = owner, name, idref
+
+KINDS = dict((record.__name__, record) for record in [Package, Class, DataType, Stub, Attribute, Association,
+                                                       AssociationEnd, Generalization, TaggedValue, StereotypeRef])
+
+def elements(xmiFile):
+    #
+    # Yields (element, the elements enclosing it, outermost first) as each element ends. The
+    # element's children have been dropped by then, and it is dropped once the consumer is done.
+    ancestors = []
+    for event, elem in ET.iterparse(xmiFile, ('start', 'end')):
+        if event == 'start':
+            ancestors.append(elem)
+            continue
+
+        ancestors.pop()
+        yield elem, ancestors
+        #
+        # The parser may have attached the following siblings already; only this one goes.
+        if ancestors:
+            ancestors[-1].remove(elem)
+        elem.clear()
+
+def records(xmiFile):
+    #
+    # Yields the records of the export, as described above.
+    pending, guid, end, classifier = [], None, None, None
+    for elem, ancestors in elements(xmiFile):
+        tag = elem.tag
+        parent = ancestors[-1].tag if ancestors else None
+        owner = ancestors[-2] if len(ancestors) > 1 else None
+        #
+        # What is read of an attribute or association end before it ends: neither nests.
+        if owner is not None and owner.tag in (ATTRIBUTE, ASSOCIATIONEND):
+            if tag == TAGGEDVALUE and parent == MODELELEMENT_TAGGEDVALUE:
+                pending.append(TaggedValue(None, _intern(elem.get('tag')), elem.get('value')))
+                if elem.get('tag') == 'ea_guid' and guid is None:
+                    guid = elem.get('value')
+                elif elem.get('tag') == 'ea_end' and end is None:
+                    end = elem.get('value')
+            elif tag == STEREOTYPE and parent == MODELELEMENT_STEREOTYPE:
+                pending.append(StereotypeRef(None, elem.get('name'), elem.get('xmi.idref')))
+            elif tag == CLASSIFIER and parent == STRUCTURALFEATURE_TYPE:
+                classifier = elem.get('xmi.idref')
+
+        elif tag == TAGGEDVALUE and parent == MODELELEMENT_TAGGEDVALUE:
+            yield TaggedValue(_ownerId(owner), _intern(elem.get('tag')), elem.get('value'))
+
+        elif tag == STEREOTYPE and parent == MODELELEMENT_STEREOTYPE:
+            yield StereotypeRef(_ownerId(owner), elem.get('name'), elem.get('xmi.idref'))
+
+        elif tag == ATTRIBUTE:
+            #
+            # An attribute without an ea_guid is known by its class and name. Only the
+            # attributes of classes are of interest.
+            xmiId = guid or '%s.%s' % (_ownerId(owner), elem.get('name'))
+            if owner is not None and owner.tag == CLASS:
+                for record in pending:
+                    record.owner = xmiId
+                    yield record
+                yield Attribute(xmiId, elem.get('name'), owner.get('xmi.id'), classifier)
+            pending, guid, classifier = [], None, None
+
+        elif tag == TAGGEDVALUE and elem.get('modelElement') is not None:
+            yield TaggedValue(elem.get('modelElement'), _intern(elem.get('tag')), elem.get('value'))
+
+        elif tag == ASSOCIATIONEND:
+            if owner is not None and owner.tag == ASSOCIATION:
+                xmiId = '%s.%s' % (owner.get('xmi.id'), end or elem.get('name'))
+                for record in pending:
+                    record.owner = xmiId
+                    yield record
+                yield AssociationEnd(xmiId, owner.get('xmi.id'), elem.get('name'), elem.get('type'),
+                                     elem.get('multiplicity'), elem.get('aggregation'),
+                                     elem.get('isNavigable') == 'true')
+            pending, end = [], None
+
+        elif tag == CLASS:
+            packageIds = [x.get('xmi.id') for x in ancestors if x.tag == PACKAGE]
+            yield Class(elem.get('xmi.id'), elem.get('name'),
+                        elem.get('namespace') or (packageIds[-1] if packageIds else None),
+                        elem.get('isAbstract') == 'true')
+
+        elif tag == PACKAGE:
+            packageIds = [x.get('xmi.id') for x in ancestors if x.tag == PACKAGE]
+            yield Package(elem.get('xmi.id'), elem.get('name'), packageIds[-1] if packageIds else None)
+
+        elif tag == DATATYPE:
+            yield DataType(elem.get('xmi.id'), elem.get('name'))
+
+        elif tag == STUB:
+            yield Stub(elem.get('xmi.id'), elem.get('name'), elem.get('UMLType'))
+
+        elif tag == ASSOCIATION:
+            yield Association(elem.get('xmi.id'), elem.get('name'))
+
+        elif tag == GENERALIZATION:
+            yield Generalization(elem.get('subtype'), elem.get('supertype'))
+
+def _intern(tag):
+    #
+    # The same few tags name thousands of tagged values
+    return tag if tag is None else sys.intern(tag)
+
+def _ownerId(owner):
+
+    return None if owner is None else owner.get('xmi.id')
+
+if __name__ == '__main__':
+
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='List the records of the EA model\'s XMI export, one per line.')
+    parser.add_argument('xmi', nargs='?', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                                'IWXXM-US-3.0.xml'),
+                        help='XMI export of the model (default: %(default)s)')
+    parser.add_argument('--kind', nargs='+', choices=sorted(KINDS), help='only records of these kinds')
+    args = parser.parse_args()
+
+    kinds = tuple(KINDS[kind] for kind in args.kind) if args.kind else Record
+    for record in records(args.xmi):
+        if isinstance(record, kinds):
+            print('\t'.join([type(record).__name__] + ['' if getattr(record, name) is None else
+                                                       str(getattr(record, name)).replace('\n', '\\n')
+                                                       for name in record.__slots__]))
@@ -30,56 +30,82 @@ CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
 ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
 POSSIBILITY OF SUCH DAMAGE."""
 
+import io as _io
 import sys as _sys
 import re as _re
 
+_elem_start_re = _re.compile(r"(\<\W{0,1}\w+:\w+) ?")
+_elem_finished_re = _re.compile(r"([?|\]\]/]*\>)")
+#should not have *
+_attrs_re = _re.compile(r"(\S*?\=\".*?\")")
+
+_CHUNK_SIZE = 1 << 16
+
 def _usage(this_file):
     return """SYNOPSIS: pretty print an XML document
-USAGE: python %s <filename> \n""" % this_file
+USAGE: python %s <filename>|- [<output filename>] \n""" % this_file
 
 def _pprint_line(indent_level, line, width=100, output=_sys.stdout):
     if line.strip():
-        start = ""
-        number_chars = 0
-        for l in range(indent_level):
-            start = start + " "
-            number_chars = number_chars + 1
-        try:
-            elem_start = _re.findall("(\<\W{0,1}\w+:\w+) ?", line)[0]
-            elem_finished = _re.findall("([?|\]\]/]*\>)", line)[0] 
-            #should not have *
-            attrs = _re.findall("(\S*?\=\".*?\")", line)
-            output.write(start + elem_start)
-            number_chars = len(start + elem_start)
-            for attr in attrs:
-                if (attrs.index(attr) + 1) == len(attrs):
-                    number_chars = number_chars + len(elem_finished)
-                if (number_chars + len(attr) + 1) > width:
-                    output.write("\n")
-                    for i in range(len(start + elem_start) + 1):
-                        output.write(" ")
-                    number_chars = len(start + elem_start) + 1 
-                else:
-                    output.write(" ")
-                    number_chars = number_chars + 1
-                output.write(attr)
-                number_chars = number_chars + len(attr)
-            output.write(elem_finished + "\n")
-        except IndexError:
+        start = " " * indent_level
+        elem_start = _elem_start_re.search(line)
+        elem_finished = _elem_finished_re.search(line)
+        if elem_start is None or elem_finished is None:
             #give up pretty print this line
             output.write(start + line + "\n")
+            return
+
+        elem_start = start + elem_start.group(1)
+        elem_finished = elem_finished.group(1)
+        attrs = _attrs_re.findall(line)
+        #the closing characters only count against the width when the
+        #attribute is the last one on the line
+        last = len(attrs) - 1
+        if last > 0 and attrs[last] in attrs[:last]:
+            last = -1
+        pieces = [elem_start]
+        number_chars = len(elem_start)
+        for pos, attr in enumerate(attrs):
+            if pos == last:
+                number_chars = number_chars + len(elem_finished)
+            if (number_chars + len(attr) + 1) > width:
+                pieces.append("\n" + " " * (len(elem_start) + 1))
+                number_chars = len(elem_start) + 1
+            else:
+                pieces.append(" ")
+                number_chars = number_chars + 1
+            pieces.append(attr)
+            number_chars = number_chars + len(attr)
+        pieces.append(elem_finished + "\n")
+        output.write("".join(pieces))
                 
 
 def _pprint_elem_content(indent_level, line, output=_sys.stdout):
     if line.strip():
-        for l in range(indent_level):
-            output.write(" ")
-        output.write(line + "\n")
-
-def _get_next_elem(data):
-    start_pos = data.find("<")
-    end_pos = data.find(">") + 1
+        output.write(" " * indent_level + line + "\n")
+
+def _get_elem_end(data, start_pos):
+    """Returns the end of the element starting at start_pos and the text up
+    to its first '>', or -1 if the element is not yet complete in data"""
+    end_pos = data.find(">", start_pos) + 1
+    if end_pos == 0:
+        return -1, ""
     retval = data[start_pos:end_pos]
+
+    if retval.find("<!") > -1:
+        if retval.find("<![CDATA[") > -1:
+            end_pos = data.find("]]>", start_pos)
+            if end_pos > -1:
+                end_pos = end_pos + len("]]>")
+
+    elif retval.find("<?") > -1:
+        end_pos = data.find("?>", start_pos)
+        if end_pos > -1:
+            end_pos = end_pos + len("?>")
+
+    return end_pos, retval
+
+def _get_next_elem(retval):
     stopper = retval.rfind("/") 
     if stopper < retval.rfind("\""):
         stopper = -1
@@ -87,64 +113,72 @@ def _get_next_elem(data):
 
     ignore_excl = retval.find("<!") > -1
     ignore_question =  retval.find("<?") > -1
-
-    if ignore_excl:
-        cdata = retval.find("<![CDATA[") > -1
-        if cdata:
-            end_pos = data.find("]]>")
-            if end_pos > -1:
-                end_pos = end_pos + len("]]>")
-
-    elif ignore_question:
-        end_pos = data.find("?>") + len("?>")
     ignore = ignore_excl or ignore_question
     
     no_indent = ignore or single
 
-    #print retval, end_pos, start_pos, stopper > -1, no_indent
-    return start_pos, \
-           end_pos, \
-           stopper > -1, \
+    return stopper > -1, \
            no_indent
 
+def _read_chunks(xml, size=_CHUNK_SIZE):
+    if hasattr(xml, "read"):
+        while True:
+            chunk = xml.read(size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        yield xml
+
+def _iter_elems(chunks):
+    """Yields (content, elem, is_stop, no_indent) for every element in the
+    document. Only the part of the document not yet consumed is buffered."""
+    data = ""
+    pos = search_pos = 0
+    for chunk in chunks:
+        if pos:
+            data = data[pos:]
+            search_pos = search_pos - pos
+            pos = 0
+        data = data + chunk
+        while True:
+            start_pos = data.find("<", search_pos)
+            if start_pos == -1:
+                search_pos = len(data)
+                break
+            search_pos = start_pos
+            end_pos, retval = _get_elem_end(data, start_pos)
+            if end_pos == -1:
+                break
+            is_stop, no_indent = _get_next_elem(retval)
+            yield data[pos:start_pos], data[start_pos:end_pos], is_stop, no_indent
+            pos = search_pos = end_pos
+
 def get_pprint(xml, indent=4, width=80):
     """Returns the pretty printed xml """
-    class out:
-        output = ""
+    output = _io.StringIO()
+    pprint(xml, output=output, indent=indent, width=width)
 
-        def write(self, string): 
-            self.output += string
-    out = out()
-    pprint(xml, output=out, indent=indent, width=width)
-
-    return out.output
+    return output.getvalue()
 
 
 def pprint(xml, output=_sys.stdout, indent=4, width=80):
     """Pretty print xml. 
+    xml may be a string or a file object; file objects are streamed.
     Use output to select output stream. Default is sys.stdout
     Use indent to select indentation level. Default is 4   """
-    data = xml
     indent_level = 0
-    start_pos, end_pos, is_stop, no_indent  = _get_next_elem(data)
-    while ((start_pos > -1 and end_pos > -1)):
-        _pprint_elem_content(indent_level, data[:start_pos].strip(), 
+    for content, elem, is_stop, no_indent in _iter_elems(_read_chunks(xml)):
+        _pprint_elem_content(indent_level, content.strip(), 
                              output=output)
-        data = data[start_pos:]
         if is_stop and not no_indent:
             indent_level = indent_level - indent
         _pprint_line(indent_level, 
-                     data[:end_pos - start_pos], 
+                     elem, 
                      width=width,
                      output=output)
-        data = data[end_pos - start_pos:]
         if not is_stop and not no_indent :
             indent_level = indent_level + indent
-
-        if not data:
-            break
-        else:
-            start_pos, end_pos, is_stop, no_indent  = _get_next_elem(data)
     
 
 if __name__ == "__main__":
@@ -156,6 +190,13 @@ if __name__ == "__main__":
         _sys.exit(1)
     else:
         filename = _sys.argv[1]
-        fh = open(filename)
+        if filename == "-":
+            fh = _sys.stdin
+        else:
+            fh = open(filename)
 
-    pprint(fh.read(), output=_sys.stdout, indent=4, width=80)
+    if len(_sys.argv) > 2:
+        with open(_sys.argv[2], "w") as out:
+            pprint(fh, output=out, indent=4, width=80)
+    else:
+        pprint(fh, output=_sys.stdout, indent=4, width=80)
@@ -0,0 +1,48 @@
+#
+# The modules in py/ import one another by name, as the scripts there are run from py/.
+#
+import os
+import sys
+
+PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'py')
+if PY not in sys.path:
+    sys.path.insert(0, PY)
+
+import glob
+import shutil
+
+import pytest
+
+REPOSITORY = os.path.dirname(PY)
+
+@pytest.fixture(scope='session')
+def EASchemas(tmp_path_factory):
+    #
+    # The EA schemas of all products, generated from the XMI export of the model
+    import generateEA
+
+    directory = tmp_path_factory.mktemp('EA')
+    generateEA.writeSchemas(generateEA.generateSchemas(generateEA.readModel(os.path.join(REPOSITORY, 'IWXXM-US-3.0.xml'))),
+                            str(directory))
+    return str(directory)
+
+@pytest.fixture
+def products(tmp_path, EASchemas):
+    #
+    # A copy of the repository's layout, EA/, py/ with the configuration files and an empty
+    # schemas/; returns its directory and the configuration files
+    shutil.copytree(EASchemas, str(tmp_path / 'EA'))
+    (tmp_path / 'py').mkdir()
+    (tmp_path / 'schemas').mkdir()
+    cfgfiles = []
+    for cfgfile in sorted(glob.glob(os.path.join(PY, '*.cfg'))):
+        shutil.copy(cfgfile, str(tmp_path / 'py'))
+        cfgfiles.append(str(tmp_path / 'py' / os.path.basename(cfgfile)))
+
+    return str(tmp_path), cfgfiles
+
+def released(basedir):
+    #
+    # {schema: content} of the post-processed schemas
+    return dict((os.path.basename(fname), open(fname, 'rb').read())
+                for fname in glob.glob(os.path.join(basedir, 'schemas', '*.xsd')))
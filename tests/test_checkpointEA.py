@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+import checkpointEA as ck
+import compileRules as cr
+import postProcessEA as pea
+import treeBackend as tb
+
+from conftest import PY
+
+def checkpointed(plan, EASchemaFile, backend, directory):
+
+    checkpoints = ck.Checkpoints(plan, EASchemaFile, 'digest', pea.codeDigest(), backend, directory)
+    return pea.processSchema(plan, EASchemaFile, backend=backend, checkpoints=checkpoints), checkpoints.resumed
+
+@pytest.mark.parametrize('backend', sorted(tb.BACKENDS))
+def test_resumed_schemas_are_the_same(backend, EASchemas, tmp_path, capsys):
+
+    backend = tb.BACKENDS[backend]
+    plan = cr.loadPlan(os.path.join(PY, 'taf.cfg'))
+    EASchemaFile = os.path.join(EASchemas, 'taf.xsd')
+    directory = str(tmp_path)
+    reference = pea.processSchema(plan, EASchemaFile, backend=backend)
+
+    assert checkpointed(plan, EASchemaFile, backend, directory) == (reference, -1)
+    assert checkpointed(plan, EASchemaFile, backend, directory) == (reference, ck.STAGES.index('applyRules'))
+    assert 'taf.xsd resumed after applyRules' in capsys.readouterr().out
+    #
+    # A change to the rules makes the checkpoints from applyRules on out of date
+    changed = dict(plan, rules=dict(plan['rules'], setNilAttribute=['icingIntensity']))
+    data, resumed = checkpointed(changed, EASchemaFile, backend, directory)
+    assert resumed == ck.STAGES.index('cleanUpTree')
+    assert data == pea.processSchema(changed, EASchemaFile, backend=backend) != reference
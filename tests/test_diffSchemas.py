@@ -0,0 +1,74 @@
+import diffSchemas as ds
+
+OLD = '''<?xml version="1.0" encoding="UTF-8"?>
+<schema xmlns="http://www.w3.org/2001/XMLSchema" xmlns:t="urn:t" targetNamespace="urn:t">
+    <element name="Kept" type="t:KeptType"/>
+    <complexType name="KeptType">
+        <sequence>
+            <element name="a" type="string"/>
+        </sequence>
+    </complexType>
+    <complexType name="ChangedType">
+        <sequence>
+            <element name="b" type="string"/>
+            <element name="c" type="string"/>
+        </sequence>
+    </complexType>
+    <simpleType name="RemovedType"><restriction base="string"/></simpleType>
+</schema>
+'''
+
+NEW = '''<?xml version="1.0" encoding="UTF-8"?>
+<schema targetNamespace="urn:t" xmlns="http://www.w3.org/2001/XMLSchema" xmlns:t="urn:t">
+    <element type="t:KeptType" name="Kept"/>
+    <complexType name="KeptType" xmlns:g="urn:g">
+        <sequence>
+            <element    name="a"   type="string"/>
+        </sequence>
+    </complexType>
+    <complexType name="ChangedType">
+        <sequence>
+            <element name="b" type="int"/>
+            <element name="d" type="string"/>
+        </sequence>
+    </complexType>
+    <element name="Added" type="t:KeptType"/>
+</schema>
+'''
+
+def test_diffSchemas(tmp_path, capsys):
+
+    (tmp_path / 'old.xsd').write_text(OLD)
+    (tmp_path / 'new.xsd').write_text(NEW)
+    results = ds.diffSchemas([(str(tmp_path / 'old.xsd'), str(tmp_path / 'new.xsd'))])
+    #
+    # Attribute order, whitespace and a namespace bound within a component alone make no
+    # difference to the schema element or the component.
+    result = results['new.xsd']
+    assert result['added'] == [['element', 'Added']]
+    assert result['removed'] == [['simpleType', 'RemovedType']]
+    assert result['unchanged'] == 3
+    assert result['changed'] == [{'kind': 'complexType', 'name': 'ChangedType',
+                                  'differences': ['sequence/element[@name="b"] @type: "string" -> "int"',
+                                                  'sequence/element[@name="d"]: added',
+                                                  'sequence/element[@name="c"]: removed']}]
+
+    assert ds.reportDifferences(results) == 1
+    assert capsys.readouterr().out.splitlines() == [
+        'new.xsd: 1 added, 1 removed, 1 changed, 3 unchanged',
+        '  + element Added',
+        '  - simpleType RemovedType',
+        '  ~ complexType ChangedType',
+        '      sequence/element[@name="b"] @type: "string" -> "int"',
+        '      sequence/element[@name="d"]: added',
+        '      sequence/element[@name="c"]: removed']
+
+def test_malformed_schema_is_reported(tmp_path, capsys):
+
+    (tmp_path / 'old.xsd').write_text(OLD[:150])
+    (tmp_path / 'new.xsd').write_text(NEW)
+    results = ds.diffSchemas([(str(tmp_path / 'old.xsd'), str(tmp_path / 'new.xsd'))])
+    assert results['new.xsd']['error'].startswith('%s: ' % (tmp_path / 'old.xsd'))
+    assert ds.reportDifferences(results) == 1
+    assert capsys.readouterr().out.startswith('new.xsd: not compared, %s: ' % (tmp_path / 'old.xsd'))
+    assert 'Not compared' in ds.htmlReport(results)
@@ -0,0 +1,59 @@
+import os
+import shutil
+
+import compileRules as cr
+import matrixEA as me
+import postProcessEA as pea
+
+from conftest import released
+
+def release(basedir, name, cfgfiles):
+    #
+    # A release of its own, with copies of the configuration files
+    cfgDirectory = os.path.join(basedir, name, 'cfg')
+    os.makedirs(cfgDirectory)
+    for cfgfile in cfgfiles:
+        shutil.copy(cfgfile, cfgDirectory)
+
+    return os.path.join(basedir, 'EA'), cfgDirectory, os.path.join(basedir, name, 'schemas')
+
+def editConfig(cfgfile, sections):
+
+    config = cr.readConfig(cfgfile)
+    for section, options in sections.items():
+        if not config.has_section(section):
+            config.add_section(section)
+        for option, value in options.items():
+            config.set(section, option, value)
+    with open(cfgfile, 'w') as fh:
+        config.write(fh)
+
+def test_matrix_makes_the_same_schemas(products):
+
+    basedir, cfgfiles = products
+    pea.runProducts(cfgfiles, basedir)
+    reference = released(basedir)
+
+    releases = [release(basedir, name, cfgfiles) for name in ['a', 'b']]
+    me.runMatrix(releases, jobs=2)
+    for EADirectory, cfgDirectory, ReleaseDirectory in releases:
+        assert released(os.path.dirname(ReleaseDirectory)) == reference
+
+def test_same_rules_with_other_includes_are_not_shared(products):
+    #
+    # taf.xsd prunes unreachable components; in release b, the common.xsd it includes refers
+    # to one of them, which must then stay.
+    basedir, cfgfiles = products
+    a, b = [release(basedir, name, cfgfiles) for name in ['a', 'b']]
+    for EADirectory, cfgDirectory, ReleaseDirectory in [a, b]:
+        editConfig(os.path.join(cfgDirectory, 'taf.cfg'), {'pruneUnreachable': {'mode': 'remove'}})
+
+    common = os.path.join(b[1], 'common.cfg')
+    number = int(cr.readConfig(common).get('addendums', 'number'))
+    editConfig(common, {'addendums': {'number': str(number + 1)},
+                        'addendum%d' % number: {'code': "ET.SubElement(root, '{' + nameSpaces['xs'] + '}element', "
+                                                        "name='Extra', type='iwxxm-us:TAFAmendmentLimitationsPropertyType')"}})
+
+    me.runMatrix([a, b], ['common', 'taf'])
+    assert b'"TAFAmendmentLimitationsPropertyType"' not in released(os.path.dirname(a[2]))['taf.xsd']
+    assert b'"TAFAmendmentLimitationsPropertyType"' in released(os.path.dirname(b[2]))['taf.xsd']
@@ -0,0 +1,46 @@
+import pytest
+from lxml import etree
+
+import nameSpaceScopes as nsc
+import postProcessEA as pea
+import treeBackend as tb
+
+XS = 'http://www.w3.org/2001/XMLSchema'
+
+SCHEMA = '''<?xml version="1.0" encoding="UTF-8"?>
+<xs:schema xmlns:xs="%s" xmlns:gml="urn:gml" xmlns:t="urn:t" targetNamespace="urn:t">
+    <xs:complexType name="A" xmlns:gml="urn:other">
+        <xs:sequence>
+            <xs:element ref="gml:Foo"/>
+            <xs:element name="b" type="t:B" substitutionGroup="gml:Bar"/>
+        </xs:sequence>
+    </xs:complexType>
+    <xs:complexType name="C" xmlns:g="urn:gml">
+        <xs:complexContent><xs:extension base="g:AbstractType"/></xs:complexContent>
+    </xs:complexType>
+    <xs:element name="D" type="gml:CodeType"/>
+</xs:schema>''' % XS
+
+@pytest.mark.parametrize('backend', sorted(tb.BACKENDS))
+def test_prefixes_bound_within_the_schema(backend, tmp_path, capsys):
+
+    schemaFile = tmp_path / 'rebound.xsd'
+    schemaFile.write_text(SCHEMA)
+    root, declared, nameSpaces = pea.parseSchema(str(schemaFile), tb.BACKENDS[backend], {})
+    assert 'Prefix "gml" bound to urn:other within rebound.xsd' in capsys.readouterr().out
+    #
+    # Every QName resolves, against the one prefix map, to the namespace it had where it was
+    resolve = lambda value: nsc.resolveQName(value, nameSpaces)
+    assert resolve(root.find('.//{%s}element[@name="b"]' % XS).get('substitutionGroup')) == '{urn:other}Bar'
+    assert resolve([x for x in root.iter('{%s}element' % XS) if x.get('ref')][0].get('ref')) == '{urn:other}Foo'
+    assert resolve(root.find('.//{%s}element[@name="b"]' % XS).get('type')) == '{urn:t}B'
+    assert resolve(root.find('.//{%s}extension' % XS).get('base')) == '{urn:gml}AbstractType'
+    assert resolve(root.find('{%s}element' % XS).get('type')) == '{urn:gml}CodeType'
+    assert nameSpaces['gml'] == 'urn:gml'
+    #
+    # and the prefixes it was rewritten to are declared in the schema written out
+    written = etree.fromstring(pea.serializeTree(root, XS, tb.BACKENDS[backend]).encode('UTF-8'))
+    for element in written.iter('{%s}element' % XS):
+        for value in [element.get(x) for x in ['ref', 'type', 'substitutionGroup'] if element.get(x)]:
+            prefix, localName = value.split(':')
+            assert resolve(value) == '{%s}%s' % (element.nsmap[prefix], localName)
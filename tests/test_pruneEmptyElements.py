@@ -0,0 +1,37 @@
+import pytest
+
+import postProcessEA as pea
+import symbolTable as st
+import treeBackend as tb
+
+XS = 'http://www.w3.org/2001/XMLSchema'
+
+SCHEMA = '''<xs:schema xmlns:xs="%s">
+    <xs:complexType name="A">
+        <xs:sequence>
+            <xs:annotation><xs:documentation>  </xs:documentation></xs:annotation>
+        </xs:sequence>
+    </xs:complexType>
+    <xs:element name="b" type="xs:string"/>
+    <xs:annotation><xs:appinfo>kept</xs:appinfo></xs:annotation>
+</xs:schema>''' % XS
+
+@pytest.mark.parametrize('backend', sorted(tb.BACKENDS))
+def test_pruneEmptyElements(backend):
+    #
+    # Elements emptied by the removal of their children go in the same sweep
+    ET = tb.BACKENDS[backend].ET
+    root = ET.fromstring(SCHEMA)
+    symbols = st.SymbolTable(root, {'xs': XS})
+    pea.pruneEmptyElements(root, symbols)
+
+    sequence = root.find('xs:complexType/xs:sequence', {'xs': XS})
+    assert sequence is None
+    assert [x.get('name') for x in root if x.get('name')] == ['A', 'b']
+    assert root.find('xs:annotation/xs:appinfo', {'xs': XS}).text == 'kept'
+    assert root.find('xs:element', {'xs': XS}).get('type') == 'string'
+    #
+    # The symbol table has been kept up to date
+    assert symbols.referrers('type', 'string') == [root.find('xs:element', {'xs': XS})]
+    assert symbols.referrers('type', 'xs:string') == []
+    assert all(element in symbols.parents for element in root.iter() if element is not root)
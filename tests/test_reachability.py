@@ -0,0 +1,120 @@
+import pytest
+
+import postProcessEA as pea
+import treeBackend as tb
+
+XS = 'http://www.w3.org/2001/XMLSchema'
+NAMESPACES = {'xs': XS, 't': 'urn:t'}
+
+SCHEMA = '''<xs:schema xmlns:xs="%s" xmlns:t="urn:t" targetNamespace="urn:t">
+    <xs:include schemaLocation="included.xsd"/>
+    <xs:element name="Report" type="t:ReportType"/>
+    <xs:complexType name="ReportType">
+        <xs:complexContent>
+            <xs:extension base="t:BaseType">
+                <xs:sequence>
+                    <xs:element name="codes" type="t:CodesType"/>
+                    <xs:group ref="t:Extra"/>
+                </xs:sequence>
+                <xs:attributeGroup ref="t:Attributes"/>
+            </xs:extension>
+        </xs:complexContent>
+    </xs:complexType>
+    <xs:complexType name="BaseType"/>
+    <xs:simpleType name="CodesType"><xs:list itemType="t:CodeType"/></xs:simpleType>
+    <xs:simpleType name="CodeType"><xs:union memberTypes="t:ACodeType t:BCodeType"/></xs:simpleType>
+    <xs:simpleType name="ACodeType"><xs:restriction base="xs:string"/></xs:simpleType>
+    <xs:simpleType name="BCodeType"><xs:restriction base="xs:string"/></xs:simpleType>
+    <xs:group name="Extra"><xs:sequence/></xs:group>
+    <xs:attributeGroup name="Attributes"><xs:attribute ref="t:flag"/></xs:attributeGroup>
+    <xs:attribute name="flag" type="xs:boolean"/>
+    <xs:complexType name="Report"/>
+    <xs:complexType name="OrphanType"><xs:sequence><xs:element name="o" type="t:OrphanCodeType"/></xs:sequence></xs:complexType>
+    <xs:simpleType name="OrphanCodeType"><xs:restriction base="xs:string"/></xs:simpleType>
+    <xs:complexType name="UsedByIncludedType"/>
+    <xs:complexType name="UsedByIncludedInTurnType"/>
+    <xs:complexType name="KeptPropertyType"/>
+    <xs:complexType name="AbstractFeatureType"/>
+    <xs:attribute name="unused" type="xs:string"/>
+</xs:schema>''' % XS
+
+INCLUDED = '''<schema xmlns="%s" xmlns:t="urn:t" targetNamespace="urn:t">
+    <include schemaLocation="more/includedInTurn.xsd"/>
+    <element name="Included" type="t:IncludedType"/>
+    <complexType name="IncludedType"><sequence><element name="i" type="t:UsedByIncludedType"/></sequence></complexType>
+</schema>''' % XS
+
+INCLUDED_IN_TURN = '''<xs:schema xmlns:xs="%s" xmlns:u="urn:t" targetNamespace="urn:t">
+    <xs:element name="Other" type="u:UsedByIncludedInTurnType"/>
+</xs:schema>''' % XS
+
+def plan(mode, keep=()):
+
+    return {'includes': ['included.xsd'], 'ignoreElementNames': 'AbstractFeatureType, Another',
+            'pruneUnreachable': {'mode': mode, 'keep': list(keep)}}
+
+@pytest.fixture
+def releaseDirectory(tmp_path):
+
+    (tmp_path / 'more').mkdir()
+    (tmp_path / 'included.xsd').write_text(INCLUDED)
+    (tmp_path / 'more' / 'includedInTurn.xsd').write_text(INCLUDED_IN_TURN)
+    return str(tmp_path)
+
+def names(root):
+
+    return [(x.tag.split('}')[1], x.get('name')) for x in root if x.get('name')]
+
+@pytest.mark.parametrize('backend', sorted(tb.BACKENDS))
+def test_unreachable_components_are_removed(backend, releaseDirectory, capsys):
+
+    root = tb.BACKENDS[backend].ET.fromstring(SCHEMA)
+    before = names(root)
+    assert pea.pruneUnreachable(root, NAMESPACES, plan('remove', ['Kept*']), releaseDirectory) == 4
+    assert capsys.readouterr().out == ('pruneUnreachable: Removed unreachable component(s): complexType Report, '
+                                       'complexType OrphanType, simpleType OrphanCodeType, attribute unused\n')
+    assert names(root) == [x for x in before if x not in [('complexType', 'Report'), ('complexType', 'OrphanType'),
+                                                          ('simpleType', 'OrphanCodeType'), ('attribute', 'unused')]]
+
+def test_unreachable_components_are_reported(releaseDirectory, capsys):
+    #
+    # Without the included schemas, what only they refer to is unreachable too
+    root = tb.ETREE.ET.fromstring(SCHEMA)
+    before = names(root)
+    assert pea.pruneUnreachable(root, NAMESPACES, plan('report'), None) == 7
+    assert capsys.readouterr().out == ('pruneUnreachable: Unreachable component(s) in schema: complexType Report, '
+                                       'complexType OrphanType, simpleType OrphanCodeType, '
+                                       'complexType UsedByIncludedType, complexType UsedByIncludedInTurnType, '
+                                       'complexType KeptPropertyType, attribute unused\n')
+    assert names(root) == before
+
+def test_missing_included_schema_is_named(tmp_path, capsys):
+
+    root = tb.ETREE.ET.fromstring(SCHEMA)
+    pea.pruneUnreachable(root, NAMESPACES, plan('report'), str(tmp_path))
+    assert 'Included schema' in capsys.readouterr().out
+
+def test_pruneUnreachable_section(tmp_path):
+
+    import compileRules as cr
+
+    cfgfile = tmp_path / 'tiny.cfg'
+    cfgfile.write_text('[schema]\nname=tiny.xsd\ndefaultNamespace=%s\n\n[pruneUnreachable]\nkeep=*PropertyType, CodeType\n' % XS)
+    assert cr.compileConfig(cr.readConfig(str(cfgfile)))['pruneUnreachable'] == \
+        {'mode': 'report', 'keep': ['*PropertyType', 'CodeType']}
+
+    cfgfile.write_text('[schema]\nname=tiny.xsd\ndefaultNamespace=%s\n\n[pruneUnreachable]\nmode=sometimes\n' % XS)
+    with pytest.raises(cr.ConfigurationError, match='mode must be report or remove'):
+        cr.compileConfig(cr.readConfig(str(cfgfile)))
+
+def test_only_the_schema_elements_namespaces_are_read(tmp_path):
+
+    import reachability as ra
+
+    fname = tmp_path / 'scoped.xsd'
+    fname.write_text('<xs:schema xmlns:xs="%s" xmlns:t="urn:t" targetNamespace="urn:t">'
+                     '<xs:element name="A" xmlns:u="urn:u" xmlns:t="urn:other" type="u:AType"/>'
+                     '</xs:schema>' % XS)
+    root, nameSpaces = ra.readSchema(str(fname))
+    assert nameSpaces == {'xs': XS, 't': 'urn:t'}
+    assert root.get('targetNamespace') == 'urn:t'
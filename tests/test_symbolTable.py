@@ -0,0 +1,66 @@
+import glob
+import os
+
+import pytest
+
+import postProcessEA as pea
+import symbolTable as st
+import treeBackend as tb
+
+from conftest import released
+
+XS = 'http://www.w3.org/2001/XMLSchema'
+
+SCHEMA = '''<xs:schema xmlns:xs="%s" xmlns:t="urn:t" targetNamespace="urn:t">
+    <xs:element name="A" type="t:AType" substitutionGroup="t:Base"/>
+    <xs:complexType name="AType">
+        <xs:complexContent>
+            <xs:extension base="t:BaseType">
+                <xs:sequence><xs:element name="b" type="t:BType"/></xs:sequence>
+            </xs:extension>
+        </xs:complexContent>
+    </xs:complexType>
+    <xs:simpleType name="BType"><xs:restriction base="xs:string"/></xs:simpleType>
+</xs:schema>''' % XS
+
+@pytest.mark.parametrize('backend', sorted(tb.BACKENDS))
+def test_symbol_table_follows_changes(backend):
+
+    ET = tb.BACKENDS[backend].ET
+    root = ET.fromstring(SCHEMA)
+    symbols = st.SymbolTable(root, {'xs': XS, 't': 'urn:t'})
+    AType, BType = symbols.find('complexType', 'AType'), symbols.find('simpleType', 'BType')
+    assert symbols.find('element', 'A').get('type') == 't:AType'
+    assert [x.get('name') for x in symbols.referrers('type', 't:BType')] == ['b']
+    assert symbols.parent(AType) is root
+    #
+    # Renaming, retyping, moving and removing
+    b = symbols.referrers('type', 't:BType')[0]
+    symbols.set(b, 'type', 't:CType')
+    symbols.set(BType, 'name', 'CType')
+    assert symbols.referrers('type', 't:BType') == [] and symbols.referrers('type', 't:CType') == [b]
+    assert symbols.find('simpleType', 'BType') is None and symbols.find('simpleType', 'CType') is BType
+
+    symbols.append(root, b)
+    assert symbols.parent(b) is root and symbols.find('element', 'b') is b
+
+    symbols.remove(AType)
+    assert symbols.find('complexType', 'AType') is None
+    assert symbols.referrers('base', 't:BaseType') == []
+    with pytest.raises(KeyError):
+        symbols.parent(root)
+
+@pytest.mark.parametrize('mode', [{'backend': tb.BACKENDS['lxml']}, {'stream': True}, {'jobs': 3}],
+                         ids=['lxml', 'stream', 'jobs'])
+def test_same_schemas_whatever_the_mode(products, mode):
+    #
+    # The schemas made with ElementTree, one product at a time, are the reference
+    basedir, cfgfiles = products
+    pea.runProducts(cfgfiles, basedir)
+    reference = released(basedir)
+    assert sorted(reference) == ['airmet.xsd', 'common.xsd', 'iwxxm-us.xsd', 'metarSpeci.xsd', 'sigmet.xsd', 'taf.xsd']
+
+    for fname in glob.glob(os.path.join(basedir, 'schemas', '*')) + glob.glob(os.path.join(basedir, 'schemas', '.*')):
+        os.remove(fname)
+    pea.runProducts(cfgfiles, basedir, **mode)
+    assert released(basedir) == reference
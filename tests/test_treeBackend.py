@@ -0,0 +1,28 @@
+import pytest
+
+import treeBackend as tb
+
+XS = 'http://www.w3.org/2001/XMLSchema'
+
+SCHEMA = '''<xs:schema xmlns:xs="%s" xmlns:t="urn:t" targetNamespace="urn:t">
+    <xs:element name="A" type="t:AType"/>
+    <xs:complexType name="AType">
+        <xs:sequence><xs:element name="b" type="xs:string"/></xs:sequence>
+    </xs:complexType>
+</xs:schema>''' % XS
+
+def elements(root):
+
+    return [(x.tag, dict(x.attrib), x.text, x.tail) for x in root.iter()]
+
+@pytest.mark.parametrize('backend', sorted(tb.BACKENDS))
+def test_serializing_leaves_the_tree_alone(backend):
+
+    backend = tb.BACKENDS[backend]
+    root = backend.ET.fromstring(SCHEMA)
+    backend.declareNamespace(root, 't', 'urn:t')
+    before = elements(root)
+    xmltext = backend.serialize(root, XS)
+    assert elements(root) == before
+    assert backend.serialize(root, XS) == xmltext
+    assert '<element name="A" type="t:AType"' in xmltext
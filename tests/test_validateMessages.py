@@ -0,0 +1,56 @@
+import io
+import json
+
+import validateMessages as vm
+
+SCHEMA = b'''<?xml version="1.0" encoding="UTF-8"?>
+<schema xmlns="http://www.w3.org/2001/XMLSchema" targetNamespace="urn:x-test" elementFormDefault="qualified">
+  <element name="report">
+    <complexType>
+      <sequence>
+        <element name="value" type="int"/>
+      </sequence>
+    </complexType>
+  </element>
+</schema>
+'''
+CATALOG = b'<catalog xmlns="urn:oasis:names:tc:entity:xmlns:xml:catalog"/>\n'
+#
+# A bulletin heading, then two messages, each followed by a control character
+ARCHIVE = b'''SAUS70 KWBC 181200
+<?xml version="1.0" encoding="UTF-8"?>
+<report xmlns="urn:x-test">
+  <value>12</value>
+</report>
+\x03
+<?xml version="1.0" encoding="UTF-8"?>
+<report xmlns="urn:x-test">
+  <value>twelve</value>
+</report>
+\x03
+'''
+
+def test_archive(tmp_path, capsys):
+
+    (tmp_path / 'test.xsd').write_bytes(SCHEMA)
+    (tmp_path / 'catalog.xml').write_bytes(CATALOG)
+    archive = tmp_path / 'archive.txt'
+    archive.write_bytes(ARCHIVE)
+
+    report = io.StringIO()
+    results = vm.validateMessages([str(archive)], [str(tmp_path / 'test.xsd')], str(tmp_path / 'catalog.xml'),
+                                  jobs=2, batchSize=1)
+    summary = vm.reportMessages(results, report)
+
+    results = [json.loads(line) for line in report.getvalue().splitlines()]
+    assert [(x['file'], x['message'], x['line'], x['valid']) for x in results] == \
+        [(str(archive), 1, 2, True), (str(archive), 2, 7, False)]
+    assert results[0]['errors'] == []
+    [error] = results[1]['errors']
+    assert error['line'] == 9 and 'twelve' in error['message']
+
+    assert (summary['messages'], summary['valid'], summary['invalid'], summary['bytes']) == \
+        (2, 1, 1, len(ARCHIVE) - len(b'SAUS70 KWBC 181200\n'))
+    assert capsys.readouterr().out.splitlines() == [
+        '{}: message 2 at line 7 is not valid:'.format(archive),
+        '    line 9, column {}: {}'.format(error['column'], error['message'])]
@@ -0,0 +1,97 @@
+import validateSchemas as vs
+
+CATALOG = '''<catalog xmlns="urn:oasis:names:tc:entity:xmlns:xml:catalog">
+  <rewriteURI uriStartString="http://schemas.example.org/" rewritePrefix="copies/"/>
+</catalog>
+'''
+#
+# A remote schema, which includes another by relative location, and the local copies of both
+BASE = '''<schema xmlns="http://www.w3.org/2001/XMLSchema" targetNamespace="urn:x-base">
+  <include schemaLocation="more.xsd"/>
+  <simpleType name="CodeType"><restriction base="string"/></simpleType>
+</schema>
+'''
+MORE = '''<schema xmlns="http://www.w3.org/2001/XMLSchema" targetNamespace="urn:x-base">
+  <simpleType name="MeasureType"><restriction base="double"/></simpleType>
+</schema>
+'''
+SCHEMA = '''<schema xmlns="http://www.w3.org/2001/XMLSchema" xmlns:b="urn:x-base" targetNamespace="urn:x-{name}">
+  <import namespace="urn:x-base" schemaLocation="http://schemas.example.org/{location}"/>
+  <element name="{name}" type="b:{type}"/>
+</schema>
+'''
+
+def products(tmp_path, schemas, copies=('base.xsd', 'more.xsd')):
+
+    (tmp_path / 'catalog.xml').write_text(CATALOG)
+    (tmp_path / 'copies').mkdir()
+    for name in copies:
+        (tmp_path / 'copies' / name).write_text({'base.xsd': BASE, 'more.xsd': MORE}[name])
+
+    schemaFiles = []
+    for name, location, schemaType in schemas:
+        (tmp_path / ('%s.xsd' % name)).write_text(SCHEMA.format(name=name, location=location, type=schemaType))
+        schemaFiles.append(str(tmp_path / ('%s.xsd' % name)))
+
+    return schemaFiles, vs.Catalog(str(tmp_path / 'catalog.xml'))
+
+def test_imports_are_compiled_once(tmp_path, monkeypatch):
+
+    schemaFiles, catalog = products(tmp_path, [('taf', 'base.xsd', 'CodeType'), ('metar', 'base.xsd', 'MeasureType')])
+    resolved = []
+    resolve = vs.CatalogResolver.resolve
+
+    def counted(self, url, pubid, context):
+        resolved.append(url)
+        return resolve(self, url, pubid, context)
+
+    monkeypatch.setattr(vs.CatalogResolver, 'resolve', counted)
+    schema, errors = vs.compileSchemaSet(schemaFiles, catalog)
+    assert schema is not None
+    assert errors == {schemaFiles[0]: [], schemaFiles[1]: []}
+    assert sorted(url for url in resolved if url.startswith('http:')) == \
+        ['http://schemas.example.org/base.xsd', 'http://schemas.example.org/more.xsd']
+
+def test_errors_are_the_schemas_they_are_in(tmp_path, capsys):
+
+    schemaFiles, catalog = products(tmp_path, [('taf', 'base.xsd', 'CodeType'), ('metar', 'base.xsd', 'NoSuchType')])
+    results = vs.validateSchemas(schemaFiles, catalog)
+    assert results[schemaFiles[0]] == []
+    [error] = results[schemaFiles[1]]
+    assert error.startswith('%s:3: ' % schemaFiles[1]) and '{urn:x-base}NoSuchType' in error
+
+    assert vs.reportValidation(results) == 1
+    assert capsys.readouterr().out.splitlines() == ['taf.xsd compiles', 'metar.xsd does not compile:',
+                                                    '    %s' % error]
+
+def test_missing_copy(tmp_path):
+
+    schemaFiles, catalog = products(tmp_path, [('taf', 'base.xsd', 'CodeType')], copies=['base.xsd'])
+    #
+    # A schema that only includes one that imports the schema whose copy is missing
+    (tmp_path / 'all.xsd').write_text('<schema xmlns="http://www.w3.org/2001/XMLSchema" targetNamespace="urn:x-taf">'
+                                      '<include schemaLocation="taf.xsd"/></schema>')
+    schemaFiles.append(str(tmp_path / 'all.xsd'))
+    schema, errors = vs.compileSchemaSet(schemaFiles, catalog)
+    assert schema is None
+    for schemaFile in schemaFiles:
+        assert errors[schemaFile][0] == catalog.explain('http://schemas.example.org/more.xsd')
+
+def test_schema_not_in_catalog(tmp_path):
+
+    schemaFiles, catalog = products(tmp_path, [('taf', 'base.xsd', 'CodeType')])
+    (tmp_path / 'sigmet.xsd').write_text(SCHEMA.format(name='sigmet', location='base.xsd', type='CodeType')
+                                         .replace('schemas.example.org', 'example.com'))
+    schemaFiles.append(str(tmp_path / 'sigmet.xsd'))
+    schema, errors = vs.compileSchemaSet(schemaFiles, catalog)
+    assert schema is None
+    assert catalog.explain('http://example.com/base.xsd') in errors[schemaFiles[1]]
+
+def test_unreadable_schema(tmp_path):
+
+    schemaFiles, catalog = products(tmp_path, [('taf', 'base.xsd', 'CodeType')])
+    (tmp_path / 'broken.xsd').write_text('<schema')
+    schema, errors = vs.compileSchemaSet(schemaFiles + [str(tmp_path / 'broken.xsd')], catalog)
+    assert schema is None
+    assert errors[schemaFiles[0]] == []
+    assert errors[str(tmp_path / 'broken.xsd')][0].startswith('%s: ' % (tmp_path / 'broken.xsd'))
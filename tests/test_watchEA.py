@@ -0,0 +1,43 @@
+import os
+
+import watchEA
+
+CONFIG = '''[location]
+EADirectory=EA
+ReleaseDirectory=schemas
+
+[schema]
+name=tiny.xsd
+defaultNamespace=http://www.w3.org/2001/XMLSchema
+'''
+
+SCHEMA = '''<?xml version="1.0" encoding="UTF-8"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" xmlns:t="urn:tiny" targetNamespace="urn:tiny" elementFormDefault="qualified">
+	<xs:element name="Tiny" type="t:TinyType"/>
+	<xs:complexType name="TinyType">
+		<xs:sequence>
+			<xs:element name="size" type="xs:string"/>
+		</xs:sequence>
+	</xs:complexType>
+</xs:schema>
+'''
+
+def test_watcher_survives_a_half_written_schema(tmp_path, capsys):
+
+    for directory in ['EA', 'schemas', 'py']:
+        (tmp_path / directory).mkdir()
+    cfgfile = tmp_path / 'py' / 'tiny.cfg'
+    cfgfile.write_text(CONFIG)
+    EASchemaFile = tmp_path / 'EA' / 'tiny.xsd'
+    EASchemaFile.write_text(SCHEMA[:200])
+
+    watcher = watchEA.Watcher([str(cfgfile)], str(tmp_path))
+    watcher.process(set(watcher.inputs()))
+    assert 'tiny.xsd not post-processed: xml.etree.ElementTree.ParseError' in capsys.readouterr().out
+    assert not (tmp_path / 'schemas' / 'tiny.xsd').exists()
+    #
+    # Once EA has finished writing it, the schema is post-processed
+    EASchemaFile.write_text(SCHEMA)
+    watcher.process(set([os.path.abspath(str(EASchemaFile))]))
+    assert 'Post-processed tiny.xsd' in capsys.readouterr().out
+    assert b'name="TinyType"' in (tmp_path / 'schemas' / 'tiny.xsd').read_bytes()
@@ -0,0 +1,117 @@
+import glob
+import os
+import shutil
+
+import pytest
+
+import cachedFile as cf
+import compileRules as cr
+import xmiIndex as xi
+
+from conftest import PY, REPOSITORY
+
+@pytest.fixture(scope='module')
+def export(tmp_path_factory):
+    #
+    # A copy of the XMI export, so that its index is cached away from the repository
+    directory = tmp_path_factory.mktemp('xmi')
+    shutil.copy(os.path.join(REPOSITORY, 'IWXXM-US-3.0.xml'), str(directory))
+    return str(directory / 'IWXXM-US-3.0.xml')
+
+@pytest.fixture(scope='module')
+def index(export):
+
+    return xi.loadIndex(export)
+
+def test_query_by_name(index):
+
+    found = xi.query(index, name='sector')
+    assert sorted(index['class'][record['owner']]['name'] for kind, xmiId, record in found) == \
+        ['ConvectiveCloudLocation', 'ObservedLightning']
+    assert all(kind == 'attribute' and record['typeName'] == 'Sector' for kind, xmiId, record in found)
+
+    [(kind, xmiId, record)] = xi.query(index, name='Sector')
+    assert (kind, record['stereotype']) == ('class', 'DataType')
+    assert xi.query(index, name='Sector', kind='attribute') == []
+
+def test_query_by_stereotype(index):
+
+    names = [record['name'] for kind, xmiId, record in xi.query(index, stereotype='CodeList', kind='class')]
+    assert 'LightningType' in names and 'FlightInformationRegions' in names
+    assert xi.query(index, name='sector', stereotype='CodeList') == []
+
+def test_lookup(index):
+
+    [(kind, xmiId, record)] = xi.query(index, name='Sector')
+    assert xi.lookup(index, xmiId) == (kind, record)
+    assert xi.lookup(index, 'EAID_no_such_element') == (None, None)
+
+def test_names(index):
+
+    assert 'sector' in xi.propertyNames(index)
+    assert 'Sector' in xi.typeNames(index) and 'sector' not in xi.typeNames(index)
+
+def test_check_plan(index):
+
+    plan = {'imports': {'gml': 'http://www.opengis.net/gml/3.2 gml.xsd'},
+            'rules': {'codeLists': {'sector': 'iwxxm-us:SectorType', 'noSuchRole': 'iwxxm-us:LightningTypeType',
+                                    'lightningType': 'iwxxm-us:NoSuchType'},
+                      'dataTypes': {'gml:MeasureType': 'gml:AngleType', 'iwxxm-us:NoSuchType': 'gml:AngleType'},
+                      'setNilAttribute': ['sector', 'noSuchRole'],
+                      'attributeDocStrings': {'sector': 'Arcs', 'noSuchRole': 'Nothing'}}}
+
+    assert sorted(xi.checkPlan(index, plan)) == [
+        ('attributeDocStrings', 'noSuchRole', 'no attribute or association role of that name'),
+        ('codeLists', 'lightningType', 'no attribute or association role of that name'),
+        ('codeLists', 'lightningType', 'no class NoSuch for iwxxm-us:NoSuchType'),
+        ('codeLists', 'noSuchRole', 'no attribute or association role of that name'),
+        ('dataTypes', 'iwxxm-us:NoSuchType', 'no class or data type NoSuch'),
+        ('setNilAttribute', 'noSuchRole', 'no attribute or association role of that name')]
+
+def test_check_shipped_configurations(index, tmp_path):
+
+    problems = []
+    for cfgfile in sorted(glob.glob(os.path.join(PY, '*.cfg'))):
+        shutil.copy(cfgfile, str(tmp_path))
+        plan = cr.loadPlan(str(tmp_path / os.path.basename(cfgfile)))
+        problems.extend((os.path.basename(cfgfile),) + problem for problem in xi.checkPlan(index, plan))
+
+    assert problems == [('airmet.cfg', 'dataTypes', 'TM_PrimitiveType', 'no class or data type TM_Primitive'),
+                        ('airmet.cfg', 'dataTypes', 'AirspaceLayerType', 'no class or data type AirspaceLayer')]
+
+def test_index_is_cached(export, index, monkeypatch):
+
+    assert os.path.isfile(cf.cachePath(export, 'index'))
+
+    def build(xmiFile):
+        raise AssertionError('the export was read again')
+
+    monkeypatch.setattr(xi, 'buildIndex', build)
+    assert xi.loadIndex(export) == index
+    #
+    # A new modification time, but the same content
+    stat = os.stat(export)
+    os.utime(export, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert xi.loadIndex(export) == index
+
+def test_changed_file_is_built_again(tmp_path):
+
+    source = tmp_path / 'source.txt'
+    cacheFile = cf.cachePath(str(source), 'upper')
+    built = []
+
+    def build(fname):
+        built.append(fname)
+        with open(fname) as fh:
+            return fh.read().upper()
+
+    source.write_text('one')
+    assert cf.loadCached(str(source), cacheFile, 1, build) == 'ONE'
+    assert cf.loadCached(str(source), cacheFile, 1, build) == 'ONE'
+    assert len(built) == 1
+
+    source.write_text('three')
+    assert cf.loadCached(str(source), cacheFile, 1, build) == 'THREE'
+    assert cf.loadCached(str(source), cacheFile, 2, build) == 'THREE'
+    assert len(built) == 3
+    assert os.listdir(os.path.dirname(cacheFile)) == ['source.txt.upper']
@@ -0,0 +1,47 @@
+import io
+
+import xmlpp
+
+SCHEMA = ('<?xml version="1.0"?><xs:schema xmlns:xs="u"><xs:element name="a" type="xs:string"/>'
+          '<xs:complexType name="T"><xs:sequence><xs:element ref="x:b"/></xs:sequence></xs:complexType>'
+          '<xs:annotation><xs:documentation>Some text</xs:documentation></xs:annotation></xs:schema>')
+
+PRETTY = '''<?xml version="1.0"?>
+<xs:schema xmlns:xs="u">
+    <xs:element name="a" type="xs:string"/>
+    <xs:complexType name="T">
+        <xs:sequence>
+            <xs:element ref="x:b"/>
+        </xs:sequence>
+    </xs:complexType>
+    <xs:annotation>
+        <xs:documentation>
+            Some text
+        </xs:documentation>
+    </xs:annotation>
+</xs:schema>
+'''
+
+def test_pprint():
+
+    assert xmlpp.get_pprint(SCHEMA, indent=4) == PRETTY
+
+class ShortReads(io.StringIO):
+    #
+    # Gives at most 'size' characters a read, whatever is asked for
+    def __init__(self, text, size):
+
+        io.StringIO.__init__(self, text)
+        self.size = size
+
+    def read(self, size=-1):
+
+        return io.StringIO.read(self, self.size)
+
+def test_pprint_streamed_in_any_size_of_chunk():
+    #
+    # Elements and text split across chunks come out the same
+    for size in [1, 2, 7, 64, len(SCHEMA)]:
+        output = io.StringIO()
+        xmlpp.pprint(ShortReads(SCHEMA, size), output, indent=4)
+        assert output.getvalue() == PRETTY